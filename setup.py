@@ -53,7 +53,7 @@ if __name__ == '__main__':  # pragma: no cover
         author=vars.get('author'),
         author_email=vars.get('email'),
         url=vars.get('url'),
-        packages=['wsm'],
+        packages=['wsm', 'wsm.core'],
         package_data={'wsm': ['README.md']},
         scripts=['scripts/wasta-snap-manager'],
         data_files=[
@@ -0,0 +1,50 @@
+""" Measure how long the command line takes to import, and check it doesn't load GTK. """
+# Usage: python3 tests/benchmarks/import_time.py [module] [runs]
+
+import subprocess
+import sys
+
+from pathlib import Path
+
+
+ROOT = Path(__file__).parents[2]
+
+
+def import_times(module):
+    """Return {module: (self us, cumulative us)} from python -X importtime."""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        cwd=ROOT,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True,
+    )
+    times = {}
+    for line in proc.stderr.decode().splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+def main():
+    module = sys.argv[1] if len(sys.argv) > 1 else 'wsm.core.cmdline'
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    totals = []
+    for i in range(runs):
+        times = import_times(module)
+        totals.append(times[module][1])
+    # Slowest imports of the last run.
+    print(f"Slowest imports under {module}:")
+    for name, (self_us, cumulative_us) in sorted(times.items(), key=lambda t: -t[1][0])[:10]:
+        print(f"  {self_us / 1000:8.2f} ms  {name}")
+    print(f"{module}: {min(totals) / 1000:.2f} ms (best of {runs})")
+    gui_modules = [n for n in times if n.split('.')[0] == 'gi' or n == 'wsm.wsmapp']
+    if gui_modules:
+        print(f"WARNING: GUI modules imported: {gui_modules}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,37 @@
+""" Compare per-request latency of snapd queries with and without a shared client. """
+# Usage: python3 tests/benchmarks/snapd_latency.py [requests]
+
+import sys
+import time
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[2]))
+from wsm import snapd
+
+
+def new_session_request():
+    # Previous behavior: a new session (and socket) for each request.
+    with snapd.Snap() as snap:
+        snap.system_info()
+
+def shared_client_request():
+    snapd.get_client().system_info()
+
+def time_requests(count, request):
+    start = time.perf_counter()
+    for i in range(count):
+        request()
+    return (time.perf_counter() - start) / count
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    before = time_requests(count, new_session_request)
+    after = time_requests(count, shared_client_request)
+    print(f"new session per request:  {before * 1000:.2f} ms/request")
+    print(f"shared keep-alive client: {after * 1000:.2f} ms/request")
+    snapd.close_client()
+
+
+if __name__ == '__main__':
+    main()
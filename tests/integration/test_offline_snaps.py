@@ -10,7 +10,7 @@ from gi.repository import Gtk
 
 from pathlib import Path
 
-from wsm import util
+from wsm.core import util
 from wsm import wsmapp
 from wsm import wsmwindow
 
@@ -0,0 +1,119 @@
+import io
+import tempfile
+import unittest
+
+from pathlib import Path
+
+from wsm import assertions
+
+
+SAMPLE = b"""type: account-key
+authority-id: canonical
+revision: 2
+public-key-sha3-384: BWDEoaqyr25nF5SNCvEv2v7QnM9QsfCc0PBMYD_i2NGSQ32EF2d4D0hqUel3m8ul
+account-id: canonical
+name: store
+since: 2016-04-01T00:00:00.0Z
+body-length: 10
+sign-key-sha3-384: -CvQKAwRQ5h3Ffn10FILJoEZUXOv6km9FwA80-Rcj-f-6jadQ89VRswHNiEB9Lxk
+
+0123
+
+6789
+
+AcbBXAQAAQoABgUCV7UYzwAKCRDUpVvql9g3IK7uH/4udqNOurx5WYVknzXdwekp0ovHCQJ0iBPw
+zzzzzzzzzzzzzzzzzzzzzzzz
+
+type: snap-declaration
+authority-id: canonical
+series: 16
+snap-id: mVyGrEwiqSi5PugCwyH7WgpoQLemtTd6
+plugs:
+  desktop:
+    allow-auto-connection: true
+publisher-id: canonical
+snap-name: hello
+timestamp: 2020-01-01T00:00:00.0Z
+sign-key-sha3-384: BWDEoaqyr25nF5SNCvEv2v7QnM9QsfCc0PBMYD_i2NGSQ32EF2d4D0hqUel3m8ul
+
+AcLBUgQAAQoABgUCXifRhgAAvR0QAK4mIpSdpDwPVfRZ4kPXNX4ABhTxVJVqRI4VM3XdcAp4rCNU
+yyyyyyyyyyyyyyyyyyyyyyyy
+
+type: snap-revision
+authority-id: canonical
+snap-sha3-384: Kl6zRxvmUXeKwNEaTNbn4Wz8hiqY_MjiMn1uU3P3ceR-U3CDPuEQRUKZDKD99Bvj
+developer-id: canonical
+snap-id: mVyGrEwiqSi5PugCwyH7WgpoQLemtTd6
+snap-revision: 29
+snap-size: 20480
+timestamp: 2020-01-01T00:00:00.0Z
+sign-key-sha3-384: BWDEoaqyr25nF5SNCvEv2v7QnM9QsfCc0PBMYD_i2NGSQ32EF2d4D0hqUel3m8ul
+
+AcLBUgQAAQoABgUCXifRhgAAvR0QAK4mIpSdpDwPVfRZ4kPXNX4ABhTxVJVqRI4VM3XdcAp4rCNU
+xxxxxxxxxxxxxxxxxxxxxxxx
+"""
+
+
+class All(unittest.TestCase):
+    def setUp(self):
+        self.assertions = assertions.parse_stream(SAMPLE)
+
+    def tearDown(self):
+        pass
+
+    def test_parse_stream(self):
+        types = [a.type for a in self.assertions]
+        self.assertEqual(types, ['account-key', 'snap-declaration', 'snap-revision'])
+
+    def test_body_with_blank_lines_is_not_split(self):
+        self.assertTrue(self.assertions[0].raw.endswith(b'zzzzzzzzzzzzzzzzzzzzzzzz'))
+        self.assertEqual(self.assertions[0].revision, 2)
+
+    def test_primary_key(self):
+        declaration = self.assertions[1]
+        self.assertEqual(declaration.primary_key(), ('16', 'mVyGrEwiqSi5PugCwyH7WgpoQLemtTd6'))
+        self.assertEqual(declaration.headers.get('snap-name'), 'hello')
+
+    def test_primary_headers(self):
+        declaration = self.assertions[1]
+        self.assertEqual(
+            declaration.primary_headers(),
+            {'series': '16', 'snap-id': 'mVyGrEwiqSi5PugCwyH7WgpoQLemtTd6'},
+        )
+
+    def test_encode_stream_round_trip(self):
+        data = assertions.encode_stream(self.assertions)
+        keys = [a.key() for a in assertions.parse_stream(data)]
+        self.assertEqual(keys, [a.key() for a in self.assertions])
+
+    def test_read_file(self):
+        with tempfile.TemporaryDirectory() as d:
+            assert_file = Path(d, 'hello_29.assert')
+            assert_file.write_bytes(SAMPLE)
+            self.assertEqual(len(assertions.read_file(assert_file)), 3)
+
+    def test_iter_headers(self):
+        headers = list(assertions.iter_headers(io.BytesIO(SAMPLE)))
+        self.assertEqual([h['type'] for h in headers], [a.type for a in self.assertions])
+        self.assertEqual(headers, [a.headers for a in self.assertions])
+
+    def test_iter_headers_not_terminated(self):
+        with self.assertRaises(ValueError):
+            list(assertions.iter_headers(io.BytesIO(b'type: account\nrevision: 1\n')))
+
+    def test_read_snap_info(self):
+        with tempfile.TemporaryDirectory() as d:
+            assert_file = Path(d, 'renamed_1.assert')
+            assert_file.write_bytes(SAMPLE)
+            info = assertions.read_snap_info(assert_file)
+        self.assertEqual(info.name, 'hello')
+        self.assertEqual(info.revision, 29)
+        self.assertEqual(info.size, 20480)
+        self.assertEqual(info.snap_id, 'mVyGrEwiqSi5PugCwyH7WgpoQLemtTd6')
+        self.assertEqual(info.publisher_id, 'canonical')
+        self.assertTrue(info.sha3_384.startswith('Kl6zRxvm'))
+        self.assertTrue(info.complete)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+
+from pathlib import Path
+
+from wsm import cache
+
+
+class All(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tempdir.name)
+        self.db_path = self.dir / 'snap-metadata.sqlite'
+        self.snapfile = self.dir / 'hello_1.snap'
+        self.snapfile.write_bytes(b'not really a snap')
+        self.yaml_dict = {'name': 'hello', 'base': 'core18', 'architectures': ['amd64']}
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_put_get(self):
+        with cache.MetadataCache(self.db_path) as c:
+            self.assertIsNone(c.get(self.snapfile))
+            c.put(self.snapfile, self.yaml_dict)
+            self.assertEqual(c.get(self.snapfile), self.yaml_dict)
+
+    def test_persistent(self):
+        with cache.MetadataCache(self.db_path) as c:
+            c.put(self.snapfile, self.yaml_dict)
+        with cache.MetadataCache(self.db_path) as c:
+            self.assertEqual(c.get(self.snapfile), self.yaml_dict)
+
+    def test_modified_file_is_miss(self):
+        with cache.MetadataCache(self.db_path) as c:
+            c.put(self.snapfile, self.yaml_dict)
+            self.snapfile.write_bytes(b'a different snap')
+            self.assertIsNone(c.get(self.snapfile))
+
+    def test_lru_eviction(self):
+        files = []
+        for i in range(3):
+            f = self.dir / f"hello_{i}.snap"
+            f.write_bytes(bytes(i + 1))
+            files.append(f)
+        with cache.MetadataCache(self.db_path, max_entries=2) as c:
+            c.put(files[0], {'n': 0})
+            c.put(files[1], {'n': 1})
+            c.get(files[0])
+            c.put(files[2], {'n': 2})
+            self.assertIsNone(c.get(files[1]))
+            self.assertEqual(c.get(files[0]), {'n': 0})
+
+    def test_digest(self):
+        with cache.MetadataCache(self.db_path) as c:
+            self.assertIsNone(c.get_digest(self.snapfile))
+            c.put_digest(self.snapfile, 'abc')
+            self.assertEqual(c.get_digest(self.snapfile), 'abc')
+            self.snapfile.write_bytes(b'a different snap')
+            self.assertIsNone(c.get_digest(self.snapfile))
+
+    def test_schema_version_reset(self):
+        with cache.MetadataCache(self.db_path) as c:
+            c.put(self.snapfile, self.yaml_dict)
+            c.db.execute('PRAGMA user_version = 0')
+        with cache.MetadataCache(self.db_path) as c:
+            self.assertIsNone(c.get(self.snapfile))
+
+
+if __name__ == '__main__':
+    unittest.main()
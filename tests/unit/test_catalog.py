@@ -0,0 +1,98 @@
+import tempfile
+import unittest
+
+from pathlib import Path
+
+from wsm import catalog
+
+
+class All(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.wasta_offline = Path(self.tempdir.name) / 'wasta-offline'
+        self.snaps_dir = self.wasta_offline / 'local-cache' / 'snaps'
+        files = {
+            '.': ['core_9', 'core_10', 'hello_1'],
+            'amd64': ['atom_248', 'core18_1000'],
+            'all': ['fonts_3'],
+            'arm64': ['atom_300'],
+        }
+        for folder, stems in files.items():
+            d = self.snaps_dir / folder
+            d.mkdir(parents=True, exist_ok=True)
+            for stem in stems:
+                (d / f"{stem}.snap").touch()
+                (d / f"{stem}.assert").touch()
+        # A snap without an assert file is ignored.
+        (self.snaps_dir / 'orphan_1.snap').touch()
+        self.catalog = catalog.OfflineCatalog(self.wasta_offline, arch='amd64')
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_get_assert_file(self):
+        snap_file = self.snaps_dir / 'amd64' / 'atom_248.snap'
+        assert_file = self.snaps_dir / 'amd64' / 'atom_248.assert'
+        self.assertEqual(catalog.get_assert_file(snap_file), assert_file)
+        self.assertEqual(catalog.get_assert_file(str(snap_file)), assert_file)
+
+    def test_names(self):
+        self.assertEqual(self.catalog.names(), ['atom', 'core', 'core18', 'fonts', 'hello'])
+
+    def test_latest_is_numeric(self):
+        self.assertEqual(self.catalog.revisions('core'), [9, 10])
+        self.assertEqual(self.catalog.latest('core').revision, 10)
+        self.assertIsNone(self.catalog.latest('kiwi'))
+
+    def test_other_arch_ignored(self):
+        self.assertEqual(self.catalog.latest('atom').file_path, str(self.snaps_dir / 'amd64' / 'atom_248.snap'))
+
+    def test_by_arch(self):
+        self.assertEqual([r.name for r in self.catalog.by_arch['all']], ['fonts'])
+
+    def test_updatable(self):
+        installed = [
+            {'name': 'core', 'revision': '9'},
+            {'name': 'atom', 'revision': '248'},
+            {'name': 'hello', 'revision': 'x1'},
+        ]
+        updatable = self.catalog.updatable(installed)
+        self.assertEqual([(r.name, r.revision) for r in updatable], [('core', 10)])
+
+    def test_installable(self):
+        installed = [{'name': 'core', 'revision': '10'}]
+        installable = self.catalog.installable(installed)
+        self.assertEqual([r.name for r in installable], ['atom', 'core18', 'fonts', 'hello'])
+
+    def test_name_from_assertion(self):
+        # The file name doesn't match the snap's real name and revision.
+        d = self.wasta_offline / 'local-cache' / 'snaps' / 'amd64'
+        (d / 'hello-world_v2.snap').touch()
+        (d / 'hello-world_v2.assert').write_bytes(
+            b"type: snap-declaration\n"
+            b"snap-id: buPKUD3TKqCOgLEjjHx5kSiCpIs5cMuQ\n"
+            b"snap-name: hello-world\n"
+            b"publisher-id: canonical\n"
+            b"\n"
+            b"AcLBUgQAAQoABgUCXifRhgAAvR0QAK4mIpSdpDwPVfRZ4kPXNX4ABhTxVJVqRI4VM3XdcAp4rCNU\n"
+            b"\n"
+            b"type: snap-revision\n"
+            b"snap-id: buPKUD3TKqCOgLEjjHx5kSiCpIs5cMuQ\n"
+            b"snap-revision: 29\n"
+            b"snap-size: 20480\n"
+            b"\n"
+            b"AcLBUgQAAQoABgUCXifRhgAAvR0QAK4mIpSdpDwPVfRZ4kPXNX4ABhTxVJVqRI4VM3XdcAp4rCNU\n"
+        )
+        offline_catalog = catalog.OfflineCatalog(self.wasta_offline, arch='amd64')
+        latest = offline_catalog.latest('hello-world')
+        self.assertEqual(latest.revision, 29)
+        self.assertEqual(latest.info.size, 20480)
+
+    def test_is_current(self):
+        self.assertTrue(self.catalog.is_current())
+        (self.snaps_dir / 'amd64' / 'new_1.snap').touch()
+        self.assertFalse(self.catalog.is_current())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+
+from wsm.core import cmdline
+
+
+class All(unittest.TestCase):
+    def setUp(self):
+        self.prog = '/usr/bin/wasta-snap-manager'
+
+    def tearDown(self):
+        pass
+
+    def test_parse_args_gui(self):
+        opts, args, unknown = cmdline.parse_args([self.prog, '-d'])
+        self.assertEqual(opts, {'debug': True})
+        self.assertEqual(args, [self.prog])
+
+    def test_parse_args_install(self):
+        argv = [self.prog, '-s', '/media/user/wasta-offline', 'atom', 'vlc']
+        opts, args, unknown = cmdline.parse_args(argv)
+        self.assertEqual(opts, {'snaps-dir': '/media/user/wasta-offline'})
+        self.assertEqual(args, [self.prog, 'atom', 'vlc'])
+
+    def test_parse_args_gtk_options(self):
+        argv = [self.prog, '-d', '--gapplication-service']
+        opts, args, unknown = cmdline.parse_args(argv)
+        self.assertEqual(opts, {'debug': True})
+        self.assertEqual(unknown, ['--gapplication-service'])
+        self.assertIsNone(cmdline.main(argv))
+
+    def test_parse_args_online(self):
+        opts, args, unknown = cmdline.parse_args([self.prog, '--online', '--debug'])
+        self.assertEqual(opts, {'debug': True, 'online': True})
+
+    def test_parse_args_export(self):
+        argv = [self.prog, '--export-to', '/media/user/wasta-offline', 'atom']
+        opts, args, unknown = cmdline.parse_args(argv)
+        self.assertEqual(opts, {'export-to': '/media/user/wasta-offline'})
+        self.assertEqual(args, [self.prog, 'atom'])
+        self.assertIn('export-to', cmdline.CLI_OPTIONS)
+
+
+if __name__ == '__main__':
+    unittest.main()
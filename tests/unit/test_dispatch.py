@@ -0,0 +1,58 @@
+import unittest
+
+from wsm import dispatch
+
+
+class Widget():
+    def __init__(self):
+        self.calls = []
+
+    def set_visible(self, visible):
+        self.calls.append(('visible', visible))
+
+    def set_text(self, text):
+        self.calls.append(('text', text))
+
+
+class All(unittest.TestCase):
+    def setUp(self):
+        self.scheduled = []
+        self.ui = dispatch.UIDispatcher(schedule=self.scheduled.append)
+        self.widget = Widget()
+
+    def tearDown(self):
+        pass
+
+    def test_one_flush_per_batch(self):
+        self.ui.show(self.widget)
+        self.ui.set_text(self.widget, 'a')
+        self.assertEqual(len(self.scheduled), 1)
+        self.assertEqual(self.ui.depth, 2)
+        self.scheduled.pop()()
+        self.assertEqual(self.widget.calls, [('visible', True), ('text', 'a')])
+        self.assertEqual(self.ui.depth, 0)
+        self.ui.hide(self.widget)
+        self.assertEqual(len(self.scheduled), 1)
+
+    def test_merge(self):
+        self.ui.show(self.widget)
+        self.ui.set_text(self.widget, '10%')
+        self.ui.set_text(self.widget, '20%')
+        self.ui.hide(self.widget)
+        self.ui.flush()
+        self.assertEqual(self.widget.calls, [('text', '20%'), ('visible', False)])
+        stats = self.ui.stats()
+        self.assertEqual(stats['queued'], 4)
+        self.assertEqual(stats['merged'], 2)
+        self.assertEqual(stats['applied'], 2)
+        self.assertEqual(stats['max_depth'], 2)
+
+    def test_unkeyed_calls_kept(self):
+        self.ui.call(self.widget.set_text, 'a')
+        self.ui.call(self.widget.set_text, 'b')
+        self.ui.flush()
+        self.assertEqual(self.widget.calls, [('text', 'a'), ('text', 'b')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import tempfile
+import unittest
+
+from pathlib import Path
+
+from wsm import assertions
+from wsm.core import export
+
+
+DECLARATION = b"""type: snap-declaration
+authority-id: canonical
+series: 16
+snap-id: mVyGrEwiqSi5PugCwyH7WgpoQLemtTd6
+publisher-id: canonical
+snap-name: hello
+sign-key-sha3-384: BWDEoaqyr25nF5SNCvEv2v7QnM9QsfCc0PBMYD_i2NGSQ32EF2d4D0hqUel3m8ul
+
+AcLBUgQAAQoABgUCXifRhgAAvR0QAK4mIpSdpDwPVfRZ4kPXNX4ABhTxVJVqRI4VM3XdcAp4rCNU
+"""
+
+REVISION = b"""type: snap-revision
+authority-id: canonical
+snap-sha3-384: Kl6zRxvmUXeKwNEaTNbn4Wz8hiqY_MjiMn1uU3P3ceR-U3CDPuEQRUKZDKD99Bvj
+developer-id: canonical
+snap-id: mVyGrEwiqSi5PugCwyH7WgpoQLemtTd6
+snap-revision: 29
+snap-size: 20480
+sign-key-sha3-384: BWDEoaqyr25nF5SNCvEv2v7QnM9QsfCc0PBMYD_i2NGSQ32EF2d4D0hqUel3m8ul
+
+AcLBUgQAAQoABgUCXifRhgAAvR0QAK4mIpSdpDwPVfRZ4kPXNX4ABhTxVJVqRI4VM3XdcAp4rCNU
+"""
+
+ACCOUNT = b"""type: account
+authority-id: canonical
+account-id: canonical
+username: canonical
+sign-key-sha3-384: -CvQKAwRQ5h3Ffn10FILJoEZUXOv6km9FwA80-Rcj-f-6jadQ89VRswHNiEB9Lxk
+
+AcbBXAQAAQoABgUCV7UYzwAKCRDUpVvql9g3IK7uH/4udqNOurx5WYVknzXdwekp0ovHCQJ0iBPw
+"""
+
+
+class FakeClient():
+    def __init__(self):
+        self.db = {
+            'snap-declaration': assertions.parse_stream(DECLARATION),
+            'snap-revision': assertions.parse_stream(REVISION),
+            'account': assertions.parse_stream(ACCOUNT),
+        }
+
+    def get_assertions(self, assert_type, **headers):
+        return [
+            a for a in self.db.get(assert_type, [])
+            if all(a.headers.get(k) == v for k, v in headers.items())
+        ]
+
+
+class All(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.client = FakeClient()
+        self.snap = {'name': 'hello', 'id': 'mVyGrEwiqSi5PugCwyH7WgpoQLemtTd6', 'revision': '29'}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_clone_file(self):
+        src = self.dir / 'hello_29.snap'
+        src.write_bytes(b'hsqs' * 1000)
+        dst = self.dir / 'export' / 'hello_29.snap'
+        dst.parent.mkdir()
+        method = export.clone_file(src, dst)
+        self.assertIn(method, ('reflink', 'copy_file_range', 'copy'))
+        self.assertEqual(dst.read_bytes(), src.read_bytes())
+        self.assertEqual(dst.stat().st_nlink, 1)
+        self.assertFalse(dst.with_name('.hello_29.snap.tmp').exists())
+
+    def test_assertion_stream(self):
+        stream = export.get_assertion_stream(self.client, self.snap)
+        types = [a.type for a in assertions.parse_stream(stream)]
+        self.assertEqual(types, ['account', 'snap-declaration', 'snap-revision'])
+        assert_file = self.dir / 'hello_29.assert'
+        assert_file.write_bytes(stream)
+        info = assertions.read_snap_info(assert_file)
+        self.assertEqual((info.name, info.revision, info.publisher), ('hello', 29, 'canonical'))
+
+    def test_assertion_stream_other_revision(self):
+        self.snap['revision'] = '30'
+        self.assertIsNone(export.get_assertion_stream(self.client, self.snap))
+
+    def test_make_dirs(self):
+        arch_dir = self.dir / 'wasta-offline' / 'local-cache' / 'snaps' / 'amd64'
+        export.make_dirs(arch_dir, None)
+        self.assertTrue(arch_dir.is_dir())
+
+    def test_summary(self):
+        stats = export.ExportStats()
+        stats.copied, stats.skipped, stats.bytes, stats.elapsed = 2, 1, 2048, 2.0
+        self.assertIn('Exported 2 snaps', stats.summary())
+        self.assertIn('/s', stats.summary())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,210 @@
+import hashlib
+import tempfile
+import threading
+import unittest
+
+from pathlib import Path
+
+from wsm.core import pipeline
+from wsm.core import verify
+
+
+def write_snap(snap_file, data, digest=None):
+    snap_file.write_bytes(data)
+    if digest is None:
+        digest = verify.encode_digest(hashlib.sha3_384(data).digest())
+    snap_file.with_suffix('.assert').write_text(
+        "type: snap-revision\n"
+        f"snap-sha3-384: {digest}\n"
+        f"snap-size: {len(data)}\n"
+        "\n"
+        "AcLBUgQAAQoABgUCXifRhgAAvR0QAK4mIpSdpDwPVfRZ4kPXNX4ABhTxVJVqRI4VM3XdcAp4rCNU\n"
+    )
+
+
+class All(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.snap_files = []
+        for name in ['vlc_1', 'core18_2', 'atom_3', 'snapd_4']:
+            snap_file = self.dir / f"{name}.snap"
+            write_snap(snap_file, name.encode() * 1000)
+            self.snap_files.append(snap_file)
+        self.installed = []
+        self.acked = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def get_details(self, snap_files):
+        types = {'snapd': 'snapd', 'core18': 'base'}
+        for f in snap_files:
+            name = f.stem.split('_')[0]
+            yield {'name': name, 'confinement': 'strict', 'type': types.get(name, 'app')}
+
+    def ack(self, assert_files):
+        self.acked.extend(assert_files)
+        return 0
+
+    def sideload(self, snap_files, classic, callback=None):
+        self.installed.extend(f.stem for f in snap_files)
+        return 0
+
+    def new_pipeline(self, **kwargs):
+        return pipeline.UpdatePipeline(
+            self.snap_files,
+            get_details=kwargs.get('get_details', self.get_details),
+            ack=self.ack,
+            sideload=kwargs.get('sideload', self.sideload),
+        )
+
+    def test_install_order(self):
+        status = self.new_pipeline().run()
+        self.assertEqual(status, 0)
+        self.assertEqual(self.installed, ['snapd_4', 'core18_2', 'atom_3', 'vlc_1'])
+        self.assertEqual(len(self.acked), 4)
+
+    def test_name_from_assertion(self):
+        snap_file = self.dir / 'renamed_1.snap'
+        write_snap(snap_file, b'hello')
+        assert_file = snap_file.with_suffix('.assert')
+        assert_file.write_text(
+            "type: snap-declaration\n"
+            "snap-name: hello\n"
+            "\n"
+            "AcLBUgQAAQoABgUCXifRhgAAvR0QAK4mIpSdpDwPVfRZ4kPXNX4ABhTxVJVqRI4VM3XdcAp4rCNU\n"
+            "\n" + assert_file.read_text()
+        )
+        self.assertEqual(pipeline.Job(snap_file).name, 'hello')
+        # Without a snap-declaration, only the file name is left.
+        self.assertEqual(pipeline.Job(self.snap_files[0]).name, 'vlc_1.snap')
+
+    def test_stage_file(self):
+        self.assertEqual(pipeline.stage_file(self.snap_files[0], bytearray(1024)), 5000)
+
+    def test_stats(self):
+        p = self.new_pipeline()
+        p.run()
+        verifying, details, staging, acking, installing = p.stages
+        self.assertEqual(verifying.count, 4)
+        self.assertEqual(staging.bytes, sum(f.stat().st_size for f in self.snap_files))
+        self.assertEqual(installing.count, 4)
+        self.assertTrue(0 <= installing.utilization(p.elapsed) <= 1)
+
+    def test_unreadable_skipped(self):
+        def get_details(snap_files):
+            for f in snap_files:
+                if f.stem.startswith('atom'):
+                    yield {'error': 'bad snap'}
+                else:
+                    yield {'name': f.stem, 'confinement': 'strict'}
+        done = []
+        status = self.new_pipeline(get_details=get_details).run(on_done=done.append)
+        self.assertEqual(status, 1)
+        self.assertNotIn('atom_3', self.installed)
+        self.assertEqual(len(done), 4)
+
+    def test_missing_assert(self):
+        (self.dir / 'vlc_1.assert').unlink()
+        status = self.new_pipeline().run()
+        self.assertEqual(status, 10)
+        self.assertNotIn('vlc_1', self.installed)
+
+    def test_damaged_skipped(self):
+        write_snap(self.snap_files[0], b'vlc_1' * 1000, digest='x' * 64)
+        # A truncated copy of a snap that would be installed first.
+        self.snap_files[3].write_bytes(b'snapd_4')
+        def sideload(snap_files, classic, callback=None):
+            # Both are known to be damaged before anything is installed.
+            self.assertEqual([j.status for j in p.jobs if j.status], [verify.DAMAGED_STATUS] * 2)
+            return self.sideload(snap_files, classic, callback)
+        p = self.new_pipeline(sideload=sideload)
+        status = p.run()
+        self.assertEqual(status, verify.DAMAGED_STATUS)
+        self.assertEqual(self.installed, ['core18_2', 'atom_3'])
+
+    def test_short_details_fail_the_rest(self):
+        def get_details(snap_files):
+            yield from list(self.get_details(snap_files))[:2]
+        done = []
+        status = self.new_pipeline(get_details=get_details).run(on_done=done.append)
+        self.assertEqual(status, 1)
+        # Only vlc_1 and core18_2 have details; the base still goes first.
+        self.assertEqual(self.installed, ['core18_2', 'vlc_1'])
+        self.assertEqual([j.status for j in done], [0, 1, 1, 0])
+
+    def test_stage_error_fails_only_its_job(self):
+        stage_file = pipeline.stage_file
+        def broken_stage(snap_file, buffer):
+            if Path(snap_file).stem == 'atom_3':
+                raise OSError('Input/output error')
+            return stage_file(snap_file, buffer)
+        pipeline.stage_file = broken_stage
+        try:
+            done = []
+            status = self.new_pipeline().run(on_done=done.append)
+        finally:
+            pipeline.stage_file = stage_file
+        self.assertEqual(status, 1)
+        self.assertEqual(self.installed, ['snapd_4', 'core18_2', 'vlc_1'])
+        self.assertEqual(len(done), 4)
+
+    def test_install_order_by_type(self):
+        def get_details(snap_files):
+            for details in self.get_details(snap_files):
+                # A base whose name doesn't say so.
+                if details['name'] == 'atom':
+                    details['type'] = 'base'
+                yield details
+        self.assertEqual(self.new_pipeline(get_details=get_details).run(), 0)
+        self.assertEqual(self.installed, ['snapd_4', 'atom_3', 'core18_2', 'vlc_1'])
+
+    def test_acks_batched(self):
+        # Assertions of snaps read ahead while one is acknowledged go in one request.
+        staged = threading.Event()
+        calls = []
+        def ack(assert_files):
+            if not calls:
+                self.assertTrue(staged.wait(timeout=5))
+            calls.append(len(assert_files))
+            return self.ack(assert_files)
+        p = pipeline.UpdatePipeline(
+            self.snap_files, read_ahead=4,
+            get_details=self.get_details, ack=ack, sideload=self.sideload,
+        )
+        read_ahead_file = p.read_ahead_file
+        def watch_read_ahead(stage, inbox, outbox):
+            read_ahead_file(stage, inbox, outbox)
+            staged.set()
+        p.read_ahead_file = watch_read_ahead
+        self.assertEqual(p.run(), 0)
+        self.assertLessEqual(len(calls), 2)
+        self.assertEqual(sum(calls), 4)
+        self.assertEqual(self.installed, ['snapd_4', 'core18_2', 'atom_3', 'vlc_1'])
+
+    def test_reads_ahead_during_install(self):
+        # The last snap is read ahead while the first is still installing.
+        staged = threading.Event()
+        stage_file = pipeline.stage_file
+        def watch_stage(snap_file, buffer):
+            size = stage_file(snap_file, buffer)
+            if Path(snap_file).stem == 'vlc_1':
+                staged.set()
+            return size
+        def sideload(snap_files, classic, callback=None):
+            if snap_files[0].stem == 'snapd_4':
+                self.assertTrue(staged.wait(timeout=5))
+            return self.sideload(snap_files, classic, callback)
+        pipeline.stage_file = watch_stage
+        try:
+            p = pipeline.UpdatePipeline(
+                self.snap_files, read_ahead=3,
+                get_details=self.get_details, ack=self.ack, sideload=sideload,
+            )
+            self.assertEqual(p.run(), 0)
+        finally:
+            pipeline.stage_file = stage_file
+
+if __name__ == '__main__':
+    unittest.main()
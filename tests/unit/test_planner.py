@@ -0,0 +1,83 @@
+import tempfile
+import unittest
+
+from pathlib import Path
+
+from wsm import catalog
+from wsm import planner
+
+
+class All(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tempdir.name)
+        self.details = {
+            'snapd': {'type': 'snapd', 'base': 'core', 'prerequisites': []},
+            'core18': {'type': 'base', 'base': 'core', 'prerequisites': []},
+            'gtk-common-themes': {'type': 'app', 'base': 'core', 'prerequisites': []},
+            'gnome-3-28-1804': {'type': 'app', 'base': 'core18', 'prerequisites': ['gtk-common-themes']},
+            'snap-store': {'type': 'app', 'base': 'core18', 'prerequisites': ['gnome-3-28-1804', 'gtk-common-themes']},
+            'loop-a': {'type': 'app', 'base': 'core18', 'prerequisites': ['loop-b']},
+            'loop-b': {'type': 'app', 'base': 'core18', 'prerequisites': ['loop-a']},
+            'needs-missing': {'type': 'app', 'base': 'core20', 'prerequisites': []},
+            'also-needs-missing': {'type': 'app', 'base': 'core20', 'prerequisites': []},
+        }
+        for name in self.details.keys():
+            (self.dir / f"{name}_1.snap").touch()
+            (self.dir / f"{name}_1.assert").touch()
+        self.catalog = catalog.OfflineCatalog(self.dir, arch='amd64')
+        self.installed = {'core'}
+        self.reads = []
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def installed_status(self, names):
+        return {n: n in self.installed for n in names}
+
+    def get_details_many(self, paths):
+        self.reads.extend(paths)
+        return [dict(self.details[Path(p).stem.rpartition('_')[0]]) for p in paths]
+
+    def plan(self, names):
+        return planner.plan_install(names, self.catalog, self.installed_status, self.get_details_many)
+
+    def test_layers(self):
+        plan = self.plan(['snap-store'])
+        self.assertTrue(plan.ok)
+        self.assertEqual(plan.layers, [
+            ['snapd'],
+            ['core18', 'gtk-common-themes'],
+            ['gnome-3-28-1804'],
+            ['snap-store'],
+        ])
+
+    def test_each_file_read_once(self):
+        self.plan(['snap-store', 'gnome-3-28-1804'])
+        self.assertEqual(len(self.reads), len(set(self.reads)))
+
+    def test_installed_skipped(self):
+        self.installed.update(['snapd', 'core18', 'gtk-common-themes'])
+        plan = self.plan(['snap-store'])
+        self.assertEqual(plan.layers, [['gnome-3-28-1804'], ['snap-store']])
+
+    def test_cycle(self):
+        self.installed.update(['snapd', 'core18'])
+        plan = self.plan(['loop-a'])
+        self.assertFalse(plan.ok)
+        self.assertEqual(plan.cycle, ['loop-a', 'loop-b'])
+
+    def test_missing(self):
+        self.installed.add('snapd')
+        plan = self.plan(['needs-missing', 'kiwi'])
+        self.assertEqual(sorted(plan.missing.items()), [('core20', 'needs-missing'), ('kiwi', 'request')])
+
+    def test_missing_reported_once(self):
+        self.installed.add('snapd')
+        plan = self.plan(['needs-missing', 'also-needs-missing'])
+        self.assertEqual(list(plan.missing.keys()), ['core20'])
+        self.assertEqual(len(plan.errors()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import threading
+import unittest
+
+from wsm.core import refresh
+
+
+class FakeClient():
+    def __init__(self, response):
+        self.response = response
+        self.last_refresh = '2021-01-01T00:00:00Z'
+        self.requests = 0
+        self.info_requests = 0
+        self.change_listeners = []
+        # Set to hold queries until released.
+        self.release = None
+
+    def get(self, node, child=None):
+        self.requests += 1
+        if self.release:
+            self.release.wait(5)
+        return self.response
+
+    def system_info(self):
+        self.info_requests += 1
+        return {'refresh': {'last': self.last_refresh}}
+
+
+class FakeState():
+    def __init__(self, snaps):
+        self.snaps = snaps
+
+    def list(self):
+        return self.snaps
+
+
+class All(unittest.TestCase):
+    def setUp(self):
+        self.response = {
+            'type': 'sync',
+            'status-code': 200,
+            'result': [{'name': 'atom', 'revision': '249', 'download-size': 1024}],
+        }
+        self.client = FakeClient(self.response)
+        self.installed = FakeState([{'name': 'atom', 'revision': '248'}])
+        self.cache = refresh.RefreshCache(self.client, self.installed)
+
+    def tearDown(self):
+        pass
+
+    def test_parse_updates(self):
+        updates, error = refresh.parse_refresh_response(self.response)
+        self.assertEqual(updates, {'atom': 1024})
+        self.assertIsNone(error)
+
+    def test_parse_no_updates(self):
+        response = {'type': 'sync', 'status-code': 200, 'result': []}
+        self.assertEqual(refresh.parse_refresh_response(response), ({}, None))
+
+    def test_parse_error(self):
+        response = {
+            'type': 'error',
+            'status-code': 500,
+            'result': {'message': 'cannot list updates: dial tcp: lookup api.snapcraft.io'},
+        }
+        updates, error = refresh.parse_refresh_response(response)
+        self.assertEqual(updates, {})
+        self.assertIn('cannot list updates', error)
+
+    def test_cached(self):
+        first = self.cache.get()
+        self.assertTrue(first.connected)
+        self.assertIs(self.cache.get(), first)
+        self.assertEqual(self.client.requests, 1)
+
+    def test_expired(self):
+        self.cache.ttl = 0
+        self.cache.get()
+        self.cache.get()
+        self.assertEqual(self.client.requests, 2)
+
+    def test_state_changed(self):
+        self.cache.get()
+        self.installed.snaps = [{'name': 'atom', 'revision': '249'}]
+        self.cache.get()
+        # snapd's last refresh time is only asked again once it's old.
+        self.client.last_refresh = '2021-01-02T00:00:00Z'
+        self.cache.get()
+        self.assertEqual(self.client.requests, 2)
+        value, asked = self.cache.last_refresh
+        self.cache.last_refresh = (value, asked - self.cache.ttl)
+        self.cache.get()
+        self.assertEqual(self.client.requests, 3)
+
+    def test_system_info_cached(self):
+        self.cache.get()
+        self.cache.get()
+        self.assertEqual(self.client.info_requests, 1)
+        self.cache.invalidate()
+        self.cache.get()
+        self.assertEqual(self.client.info_requests, 2)
+
+    def test_change_invalidates(self):
+        self.cache.get()
+        for listener in self.client.change_listeners:
+            listener(None)
+        self.cache.get()
+        self.assertEqual(self.client.requests, 2)
+
+    def test_failure_not_cached(self):
+        self.assertIsNone(self.cache.last_connected)
+        self.client.response = {'type': 'error', 'status-code': 500, 'result': {'message': 'offline'}}
+        self.assertFalse(self.cache.get().connected)
+        self.assertFalse(self.cache.last_connected)
+        self.client.response = self.response
+        self.assertTrue(self.cache.get().connected)
+        self.assertTrue(self.cache.last_connected)
+        self.assertEqual(self.client.requests, 2)
+
+    def test_one_query_at_a_time(self):
+        self.client.release = threading.Event()
+        threads = [self.cache.prefetch(), self.cache.prefetch()]
+        # Invalidating doesn't wait for the query in progress.
+        self.cache.invalidate()
+        self.client.release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.client.requests, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import tempfile
+import unittest
+
+from pathlib import Path
+
+from wsm.core import session
+
+
+class All(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / 'session.json'
+        self.snapshot = session.new_snapshot(
+            '/media/user/wasta-offline',
+            [{'name': 'atom', 'revision': '248', 'summary': 'Editor', 'confinement': 'classic', 'icon': '/a.png'}],
+            [{'name': 'vlc', 'summary': 'Player', 'file_path': '/media/user/vlc_1.snap'}],
+            [],
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        self.assertTrue(session.save_snapshot(self.snapshot, self.path))
+        self.assertEqual(session.load_snapshot(self.path), self.snapshot)
+        self.assertFalse(Path(f"{self.path}.tmp").exists())
+
+    def test_missing(self):
+        self.assertIsNone(session.load_snapshot(self.path))
+
+    def test_other_version(self):
+        self.snapshot['version'] = session.SNAPSHOT_VERSION + 1
+        session.save_snapshot(self.snapshot, self.path)
+        self.assertIsNone(session.load_snapshot(self.path))
+
+    def test_corrupt(self):
+        self.path.write_text('{"version": 1, "insta')
+        self.assertIsNone(session.load_snapshot(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
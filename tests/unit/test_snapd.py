@@ -3,6 +3,7 @@ import os
 import re
 import shutil
 import subprocess
+import tempfile
 import time
 import unittest
 import warnings
@@ -61,6 +62,32 @@ class All(unittest.TestCase):
             info = snap.info('core')
         self.assertTrue(isinstance(info, dict))
 
+    def test_multipart_body_length(self):
+        with tempfile.TemporaryDirectory() as d:
+            snapfile = Path(d, 'hello_1.snap')
+            snapfile.write_bytes(b'x' * 3000000)
+            body = snapd.MultipartBody({'action': 'install'}, [snapfile])
+            data = b''.join(body)
+        self.assertEqual(len(body), len(data))
+        self.assertIn(b'filename="hello_1.snap"', data)
+        self.assertTrue(data.endswith(f"--{body.boundary}--\r\n".encode()))
+
+    def test_change_progress(self):
+        change = {
+            'id': '42', 'summary': 'Refresh "hello" snap', 'status': 'Doing', 'ready': False,
+            'tasks': [
+                {'summary': 'Download snap "hello"', 'status': 'Doing', 'progress': {'done': 50, 'total': 100}},
+                {'summary': 'Link snap "hello"', 'status': 'Do', 'progress': {'done': 0, 'total': 1}},
+            ],
+        }
+        first = snapd.ChangeProgress(change)
+        change['tasks'][0]['progress']['done'] = 100
+        second = snapd.ChangeProgress(change, first)
+        self.assertEqual(first.label, 'Download snap "hello"')
+        self.assertEqual((second.done, second.total), (100, 101))
+        self.assertTrue(second.moved(first))
+        self.assertGreaterEqual(second.rate, 0)
+
     def get_snap_names(self):
         # Get list of snap names from snap dictionaries.
         with snapd.Snap() as s:
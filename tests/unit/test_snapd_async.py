@@ -0,0 +1,85 @@
+import asyncio
+import json
+import tempfile
+import unittest
+
+from pathlib import Path
+
+from wsm import snapd_async
+
+
+async def fake_snapd(reader, writer):
+    # Answers each request in order; alternates chunked and sized bodies.
+    count = 0
+    while True:
+        request_line = await reader.readline()
+        if not request_line:
+            break
+        while (await reader.readline()) not in (b'\r\n', b''):
+            pass
+        path = request_line.split()[1].decode()
+        name = path.split('/')[-1]
+        if name.startswith('missing'):
+            response = {'type': 'error', 'status-code': 404, 'result': {'kind': 'snap-not-found'}}
+        else:
+            response = {'type': 'sync', 'result': {'name': name}}
+        body = json.dumps(response).encode()
+        if count % 2:
+            head = b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n'
+            half = len(body) // 2
+            payload = b''
+            for chunk in (body[:half], body[half:]):
+                payload += f"{len(chunk):x}\r\n".encode() + chunk + b'\r\n'
+            writer.write(head + payload + b'0\r\n\r\n')
+        else:
+            writer.write(f"HTTP/1.1 200 OK\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+        await writer.drain()
+        count += 1
+    writer.close()
+
+
+class All(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.socket_path = str(Path(self.tempdir.name, 'snapd.socket'))
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_pipelined_info_many(self):
+        names = [f"snap{i}" for i in range(20)]
+
+        async def run():
+            server = await asyncio.start_unix_server(fake_snapd, path=self.socket_path)
+            async with snapd_async.AsyncSnap(self.socket_path) as snap:
+                results = await snap.info_many(names)
+            server.close()
+            await server.wait_closed()
+            return results
+
+        results = asyncio.run(run())
+        self.assertEqual([r['name'] for r in results], names)
+
+    def test_installed_many(self):
+        async def run():
+            server = await asyncio.start_unix_server(fake_snapd, path=self.socket_path)
+            async with snapd_async.AsyncSnap(self.socket_path) as snap:
+                results = await snap.installed_many(['core18', 'missing-base', 'core18'])
+            server.close()
+            await server.wait_closed()
+            return results
+
+        self.assertEqual(asyncio.run(run()), {'core18': True, 'missing-base': False})
+
+    def test_background_loop(self):
+        loop = snapd_async.BackgroundLoop()
+
+        async def add(a, b):
+            return a + b
+
+        self.assertEqual(loop.run(add(2, 3), timeout=5), 5)
+        loop.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
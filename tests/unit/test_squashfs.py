@@ -0,0 +1,39 @@
+import subprocess
+import tempfile
+import unittest
+
+from pathlib import Path
+
+from wsm import squashfs
+
+
+class All(unittest.TestCase):
+    def setUp(self):
+        self.offline_snaps_dir = Path(__file__).parents[2] / 'var' / 'offline-snaps'
+        self.snaps_dir = self.offline_snaps_dir / 'snaps'
+        self.snapfile = self.snaps_dir / 'amd64' / 'syncthing_501.snap'
+
+    def tearDown(self):
+        pass
+
+    def test_read_file_matches_unsquashfs(self):
+        snap_yaml = 'meta/snap.yaml'
+        with tempfile.TemporaryDirectory() as dest:
+            subprocess.run(
+                ['unsquashfs', '-n', '-force', '-dest', dest, self.snapfile, '/' + snap_yaml],
+                stdout=subprocess.DEVNULL
+            )
+            expected = Path(dest, snap_yaml).read_bytes()
+        self.assertEqual(squashfs.read_file(self.snapfile, snap_yaml), expected)
+
+    def test_read_file_missing(self):
+        with squashfs.SquashFS(self.snapfile) as fs:
+            self.assertRaises(FileNotFoundError, fs.read_file, 'meta/not-a-file')
+
+    def test_not_squashfs(self):
+        assert_file = self.snaps_dir / 'amd64' / 'syncthing_501.assert'
+        self.assertRaises(squashfs.SquashFSError, squashfs.SquashFS, assert_file)
+
+
+if __name__ == '__main__':
+    unittest.main()
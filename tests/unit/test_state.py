@@ -0,0 +1,45 @@
+import unittest
+
+from wsm import snapd
+from wsm import state
+
+
+class All(unittest.TestCase):
+    def setUp(self):
+        self.state = state.InstalledState(snapd.Snap())
+
+    def tearDown(self):
+        self.state.client.close()
+
+    def test_matches_snapd(self):
+        names = [s['name'] for s in self.state.client.list()]
+        self.assertEqual([s['name'] for s in self.state.list()], sorted(names))
+        for name in names:
+            self.assertTrue(self.state.is_installed(name))
+
+    def test_not_installed(self):
+        self.assertFalse(self.state.is_installed('not-a-real-snap-name'))
+        self.assertIsNone(self.state.revision('not-a-real-snap-name'))
+
+    def test_invalidate(self):
+        self.state.list()
+        self.state.invalidate()
+        self.assertIsNone(self.state._snaps)
+
+    def test_diff_snaps(self):
+        old = {
+            'a': {'revision': '1', 'summary': 'A'},
+            'b': {'revision': '2', 'summary': 'B'},
+            'c': {'revision': '3', 'summary': 'C'},
+        }
+        new = {
+            'a': {'revision': '1', 'summary': 'A', 'status': 'active'},
+            'b': {'revision': '4', 'summary': 'B'},
+            'd': {'revision': '5', 'summary': 'D'},
+        }
+        self.assertEqual(state.diff_snaps(old, new), (['d'], ['b'], ['c']))
+        self.assertEqual(state.diff_snaps(new, new), ([], [], []))
+
+
+if __name__ == '__main__':
+    unittest.main()
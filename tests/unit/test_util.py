@@ -1,9 +1,10 @@
 import os
+import threading
 import unittest
 
 from pathlib import Path
 
-from wsm import util
+from wsm.core import util
 
 
 class All(unittest.TestCase):
@@ -72,6 +73,33 @@ class All(unittest.TestCase):
             elif d == 'prerequisites':
                 self.assertEqual(type(v), type(list()))
 
+    def test_get_offline_snap_details_many(self):
+        snapfiles = [
+            self.snaps_dir / 'amd64' / 'syncthing_501.snap',
+            self.snaps_dir / 'amd64' / 'missing_1.snap',
+            self.snaps_dir / 'amd64' / 'snap-store_209.snap',
+        ]
+        details = util.get_offline_snap_details_many(snapfiles, workers=2)
+        self.assertEqual([d['file_path'] for d in details], [str(f) for f in snapfiles])
+        self.assertEqual(details[0]['name'], 'syncthing')
+        self.assertTrue(details[1].get('error'))
+        self.assertEqual(details[2]['name'], 'snap-store')
+
+    def test_iter_offline_snap_details(self):
+        snapfiles = [
+            self.snaps_dir / 'amd64' / 'syncthing_501.snap',
+            self.snaps_dir / 'amd64' / 'missing_1.snap',
+        ]
+        details = list(util.iter_offline_snap_details(snapfiles, workers=2))
+        self.assertEqual([d['file_path'] for d in details], [str(f) for f in snapfiles])
+        self.assertTrue(details[1].get('error'))
+
+    def test_iter_offline_snap_details_cancel(self):
+        cancel = threading.Event()
+        cancel.set()
+        snapfiles = [self.snaps_dir / 'amd64' / 'syncthing_501.snap']
+        self.assertEqual(list(util.iter_offline_snap_details(snapfiles, cancel)), [])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,76 @@
+import hashlib
+import tempfile
+import unittest
+
+from pathlib import Path
+
+from wsm.core import verify
+
+
+def write_snap(snap_file, data, size=None, digest=None):
+    snap_file.write_bytes(data)
+    if digest is None:
+        digest = verify.encode_digest(hashlib.sha3_384(data).digest())
+    size = len(data) if size is None else size
+    snap_file.with_suffix('.assert').write_text(
+        "type: snap-revision\n"
+        "authority-id: canonical\n"
+        f"snap-sha3-384: {digest}\n"
+        "snap-id: mVyGrEwiqSi5PugCwyH7WgpoQLemtTd6\n"
+        "snap-revision: 29\n"
+        f"snap-size: {size}\n"
+        "sign-key-sha3-384: BWDEoaqyr25nF5SNCvEv2v7QnM9QsfCc0PBMYD_i2NGSQ32EF2d4D0hqUel3m8ul\n"
+        "\n"
+        "AcLBUgQAAQoABgUCXifRhgAAvR0QAK4mIpSdpDwPVfRZ4kPXNX4ABhTxVJVqRI4VM3XdcAp4rCNU\n"
+    )
+
+
+class All(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.snap_file = self.dir / 'hello_29.snap'
+        self.data = b'hsqs' + bytes(range(256)) * 100
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_hash_file(self):
+        self.snap_file.write_bytes(self.data)
+        expected = verify.encode_digest(hashlib.sha3_384(self.data).digest())
+        self.assertEqual(verify.hash_file(self.snap_file), expected)
+        self.assertNotIn('=', expected)
+
+    def test_hash_empty_file(self):
+        self.snap_file.write_bytes(b'')
+        expected = verify.encode_digest(hashlib.sha3_384(b'').digest())
+        self.assertEqual(verify.hash_file(self.snap_file), expected)
+
+    def test_intact(self):
+        write_snap(self.snap_file, self.data)
+        self.assertIsNone(verify.check_size(self.snap_file))
+        self.assertIsNone(verify.verify_snap(self.snap_file))
+
+    def test_truncated(self):
+        write_snap(self.snap_file, self.data, size=len(self.data) + 4096)
+        self.assertIn('size', verify.check_size(self.snap_file))
+
+    def test_corrupt(self):
+        write_snap(self.snap_file, self.data, digest='x' * 64)
+        self.assertIsNone(verify.check_size(self.snap_file))
+        self.assertIn('SHA3-384', verify.verify_snap(self.snap_file))
+
+    def test_missing_assert(self):
+        self.snap_file.write_bytes(self.data)
+        self.assertIn('missing', verify.verify_snap(self.snap_file))
+
+    def test_verify_snaps(self):
+        bad_file = self.dir / 'bad_1.snap'
+        write_snap(self.snap_file, self.data)
+        write_snap(bad_file, self.data, digest='x' * 64)
+        errors = verify.verify_snaps([self.snap_file, bad_file])
+        self.assertEqual(list(errors.keys()), [str(bad_file)])
+
+
+if __name__ == '__main__':
+    unittest.main()
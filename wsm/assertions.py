@@ -0,0 +1,180 @@
+""" Parse snap assertion (.assert) files. """
+
+# Format reference:
+# https://snapcraft.io/docs/assertions
+
+from pathlib import Path
+
+
+# Headers that uniquely identify an assertion of a given type.
+PRIMARY_KEYS = {
+    'account': ('account-id',),
+    'account-key': ('public-key-sha3-384',),
+    'snap-declaration': ('series', 'snap-id'),
+    'snap-revision': ('snap-sha3-384',),
+    'store': ('store',),
+    'validation': ('series', 'snap-id', 'approved-snap-id', 'approved-snap-revision'),
+}
+
+
+class Assertion():
+    __slots__ = ('headers', 'raw')
+
+    def __init__(self, headers, raw):
+        # Only single-line top-level headers are kept.
+        self.headers = headers
+        self.raw = raw
+
+    def __repr__(self):
+        return f"Assertion({self.type!r}, {self.primary_key()})"
+
+    @property
+    def type(self):
+        return self.headers.get('type')
+
+    @property
+    def revision(self):
+        return int(self.headers.get('revision', 0))
+
+    def primary_key(self):
+        keys = PRIMARY_KEYS.get(self.type)
+        if not keys:
+            # Unknown type: the assertion is its own key.
+            return (self.raw,)
+        return tuple(self.headers.get(k) for k in keys)
+
+    def primary_headers(self):
+        """Headers that select this assertion in a query, or None for unknown types."""
+        keys = PRIMARY_KEYS.get(self.type)
+        if not keys:
+            return None
+        return {k: self.headers.get(k) for k in keys}
+
+    def key(self):
+        """Identity of this exact assertion, including its revision."""
+        return (self.type, self.primary_key(), self.revision)
+
+
+def parse_headers(text):
+    headers = {}
+    for line in text.split(b'\n'):
+        if not line or line[:1] == b' ':
+            # Continuation of a multi-line or list header.
+            continue
+        name, sep, value = line.partition(b':')
+        if sep:
+            headers[name.decode()] = value.strip().decode()
+    return headers
+
+def parse_stream(data):
+    """Split a stream of assertions into a list of Assertion objects."""
+    assertions = []
+    pos = 0
+    end = len(data)
+    while pos < end:
+        # Skip separating newlines.
+        while pos < end and data[pos:pos + 1] == b'\n':
+            pos += 1
+        if pos >= end:
+            break
+        start = pos
+        header_end = data.find(b'\n\n', pos)
+        if header_end < 0:
+            raise ValueError("assertion headers not terminated")
+        headers = parse_headers(data[pos:header_end])
+        pos = header_end + 2
+        body_length = int(headers.get('body-length', 0))
+        if body_length:
+            pos += body_length + 2
+        # The signature runs until the next blank line or the end of the stream.
+        sig_end = data.find(b'\n\n', pos)
+        if sig_end < 0:
+            sig_end = end
+        raw = data[start:sig_end].rstrip(b'\n')
+        assertions.append(Assertion(headers, raw))
+        pos = sig_end
+    return assertions
+
+def read_file(path):
+    return parse_stream(Path(path).read_bytes())
+
+def iter_headers(f):
+    """
+    Yield the top-level headers of each assertion read from binary file f,
+    line by line. Bodies and signatures are skipped without being kept.
+    """
+    while True:
+        headers = {}
+        line = f.readline()
+        while line == b'\n':
+            line = f.readline()
+        if not line:
+            return
+        while line and line != b'\n':
+            if line[:1] != b' ':
+                name, sep, value = line.partition(b':')
+                if sep:
+                    headers[name.decode()] = value.strip().decode()
+            line = f.readline()
+        if not line:
+            raise ValueError("assertion headers not terminated")
+        body_length = int(headers.get('body-length', 0))
+        if body_length:
+            f.seek(body_length + 2, 1)
+        # The signature runs until the next blank line or the end of the file.
+        line = f.readline()
+        while line and line != b'\n':
+            line = f.readline()
+        yield headers
+
+
+class SnapInfo():
+    """What an offline snap's .assert file says about the snap."""
+    __slots__ = ('name', 'snap_id', 'revision', 'size', 'sha3_384', 'publisher_id', 'publisher')
+
+    def __init__(self):
+        self.name = None
+        self.snap_id = None
+        self.revision = None
+        self.size = None
+        self.sha3_384 = None
+        self.publisher_id = None
+        self.publisher = None
+
+    def __repr__(self):
+        return f"SnapInfo({self.name!r}, {self.revision})"
+
+    @property
+    def complete(self):
+        return bool(self.name and self.revision is not None)
+
+
+def read_snap_info(path):
+    """
+    Return the SnapInfo found in an assert file: the name and publisher from
+    its snap-declaration, and the revision, size and digest from its
+    snap-revision.
+    """
+    info = SnapInfo()
+    accounts = {}
+    with open(path, 'rb') as f:
+        for headers in iter_headers(f):
+            assert_type = headers.get('type')
+            if assert_type == 'snap-revision':
+                info.snap_id = info.snap_id or headers.get('snap-id')
+                info.revision = int(headers.get('snap-revision', 0))
+                info.size = int(headers.get('snap-size', 0))
+                info.sha3_384 = headers.get('snap-sha3-384')
+                info.publisher_id = info.publisher_id or headers.get('developer-id')
+            elif assert_type == 'snap-declaration':
+                info.name = headers.get('snap-name')
+                info.snap_id = headers.get('snap-id')
+                info.publisher_id = headers.get('publisher-id')
+            elif assert_type == 'account':
+                accounts[headers.get('account-id')] = headers.get('username')
+    info.publisher = accounts.get(info.publisher_id)
+    return info
+
+def encode_stream(assertions):
+    """Join assertions into a stream accepted by snapd's /v2/assertions."""
+    return b'\n\n'.join(a.raw for a in assertions) + b'\n'
@@ -0,0 +1,149 @@
+""" Persistent metadata cache for offline snap files. """
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from pathlib import Path
+
+
+SCHEMA_VERSION = 2
+MAX_ENTRIES = 2000
+
+
+class MetadataCache():
+    """
+    SQLite-backed cache of parsed snap.yaml contents and file digests.
+    Entries are keyed by the file's (device, inode, size, mtime), so a
+    copied, replaced, or modified file is never served stale data. The least recently used entries are
+    evicted once max_entries is exceeded.
+    """
+    def __init__(self, db_path, max_entries=MAX_ENTRIES):
+        self.db_path = Path(db_path)
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self._ensure_schema()
+
+    def _ensure_schema(self):
+        with self.lock, self.db:
+            version = self.db.execute('PRAGMA user_version').fetchone()[0]
+            if version != SCHEMA_VERSION:
+                # Cached data is disposable; rebuild rather than migrate.
+                logging.debug(f"Resetting metadata cache schema {version} -> {SCHEMA_VERSION}")
+                self.db.execute('DROP TABLE IF EXISTS snap_yaml')
+                self.db.execute('DROP TABLE IF EXISTS snap_digest')
+                self.db.execute(
+                    'CREATE TABLE snap_yaml ('
+                    ' dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER,'
+                    ' path TEXT, yaml TEXT, last_used REAL,'
+                    ' PRIMARY KEY (dev, ino, size, mtime_ns))'
+                )
+                self.db.execute('CREATE INDEX snap_yaml_last_used ON snap_yaml (last_used)')
+                self.db.execute(
+                    'CREATE TABLE snap_digest ('
+                    ' dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER,'
+                    ' path TEXT, sha3_384 TEXT, last_used REAL,'
+                    ' PRIMARY KEY (dev, ino, size, mtime_ns))'
+                )
+                self.db.execute('CREATE INDEX snap_digest_last_used ON snap_digest (last_used)')
+                self.db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def key(self, file_path):
+        st = os.stat(file_path)
+        return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def get(self, file_path):
+        """Return cached snap.yaml dict for file_path, or None."""
+        try:
+            key = self.key(file_path)
+        except OSError:
+            return None
+        with self.lock, self.db:
+            row = self.db.execute(
+                'SELECT yaml FROM snap_yaml WHERE dev=? AND ino=? AND size=? AND mtime_ns=?',
+                key
+            ).fetchone()
+            if row is None:
+                return None
+            self.db.execute(
+                'UPDATE snap_yaml SET last_used=? WHERE dev=? AND ino=? AND size=? AND mtime_ns=?',
+                (time.time(), *key)
+            )
+        return json.loads(row[0])
+
+    def put(self, file_path, yaml_dict):
+        try:
+            key = self.key(file_path)
+        except OSError:
+            return
+        data = json.dumps(yaml_dict, default=str)
+        with self.lock, self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO snap_yaml VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (*key, str(file_path), data, time.time())
+            )
+            self._evict('snap_yaml')
+
+    def get_digest(self, file_path):
+        """Return the cached SHA3-384 digest of file_path, or None."""
+        try:
+            key = self.key(file_path)
+        except OSError:
+            return None
+        with self.lock, self.db:
+            row = self.db.execute(
+                'SELECT sha3_384 FROM snap_digest WHERE dev=? AND ino=? AND size=? AND mtime_ns=?',
+                key
+            ).fetchone()
+            if row is None:
+                return None
+            self.db.execute(
+                'UPDATE snap_digest SET last_used=? WHERE dev=? AND ino=? AND size=? AND mtime_ns=?',
+                (time.time(), *key)
+            )
+        return row[0]
+
+    def put_digest(self, file_path, digest, key=None):
+        # Pass the key stat'ed before hashing, so a file changed meanwhile isn't cached.
+        if key is None:
+            try:
+                key = self.key(file_path)
+            except OSError:
+                return
+        with self.lock, self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO snap_digest VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (*key, str(file_path), digest, time.time())
+            )
+            self._evict('snap_digest')
+
+    def _evict(self, table):
+        count = self.db.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self.db.execute(
+                f'DELETE FROM {table} WHERE rowid IN'
+                f' (SELECT rowid FROM {table} ORDER BY last_used LIMIT ?)',
+                (excess,)
+            )
+
+    def clear(self):
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM snap_yaml')
+            self.db.execute('DELETE FROM snap_digest')
@@ -0,0 +1,188 @@
+""" Index of the snap and assert files in an offline snaps folder. """
+
+import logging
+import os
+import platform
+
+from pathlib import Path
+
+from wsm import assertions
+
+
+# https://snapcraft.io/docs/architectures
+MACHINE_TO_ARCH = {
+    'x86_64': 'amd64',
+    'i686': 'i386',
+    'aarch64': 'arm64',
+    'armv7l': 'armhf',
+    'ppc64le': 'ppc64el',
+    's390x': 's390x',
+}
+
+
+def get_arch():
+    machine = platform.machine()
+    return MACHINE_TO_ARCH.get(machine, machine)
+
+def get_assert_file(snap_file):
+    """Return the path of the assert file that goes with snap_file."""
+    snap_file = Path(snap_file)
+    return snap_file.parent / f"{snap_file.stem}.assert"
+
+def split_snap_stem(stem):
+    """Split '<name>_<revision>' into (name, int revision), or return None."""
+    name, sep, revision = stem.rpartition('_')
+    if not sep or not name or not revision.isdigit():
+        return None
+    return name, int(revision)
+
+
+def read_snap_info(assert_path):
+    try:
+        return assertions.read_snap_info(assert_path)
+    except (OSError, ValueError) as e:
+        logging.debug(f"Unable to read {assert_path}: {e}")
+        return None
+
+
+class OfflineSnap():
+    __slots__ = ('name', 'revision', 'arch', 'file_path', 'assert_path', 'info')
+
+    def __init__(self, name, revision, arch, file_path, assert_path, info=None):
+        self.name = name
+        self.revision = revision
+        self.arch = arch
+        self.file_path = file_path
+        self.assert_path = assert_path
+        # assertions.SnapInfo, if the assert file could be read.
+        self.info = info
+
+    def __repr__(self):
+        return f"OfflineSnap({self.name!r}, {self.revision}, {self.arch!r})"
+
+    def as_dict(self):
+        # Same shape as the dictionaries used throughout util.
+        return {'name': self.name, 'revision': str(self.revision), 'file_path': self.file_path}
+
+
+def scan_folder(folder, arch='.'):
+    """
+    Return OfflineSnap records for each snap in folder that has an assert
+    file. Names and revisions come from the assert file, falling back to
+    the file name if it doesn't have them.
+    """
+    try:
+        with os.scandir(folder) as it:
+            entries = {e.name: e for e in it if e.is_file()}
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+    records = []
+    for filename in sorted(entries.keys()):
+        stem, ext = os.path.splitext(filename)
+        if ext != '.snap':
+            continue
+        assert_name = get_assert_file(filename).name
+        if assert_name not in entries:
+            # The snap file is only included if both the assert and snap exist.
+            continue
+        info = read_snap_info(entries[assert_name].path)
+        if info and info.complete:
+            name, revision = info.name, info.revision
+        else:
+            parts = split_snap_stem(stem)
+            if not parts:
+                logging.debug(f"Skipping unrecognized snap file name: {filename}")
+                continue
+            name, revision = parts
+        records.append(OfflineSnap(
+            name, revision, arch, entries[filename].path, entries[assert_name].path, info
+        ))
+    return records
+
+
+class OfflineCatalog():
+    """
+    Built from one pass over the snaps folders of a given folder, either a
+    wasta-offline folder (local-cache/snaps/...) or an arbitrary folder.
+    Each of these is searched: the folder itself, "all", and the current arch.
+    """
+    def __init__(self, folder, arch=None):
+        self.folder = Path(folder)
+        self.arch = arch if arch else get_arch()
+        self.records = []
+        # {name: [OfflineSnap, ...]} sorted by revision.
+        self.by_name = {}
+        # {'.'|'all'|arch: [OfflineSnap, ...]}
+        self.by_arch = {}
+        self.dir_mtimes = {}
+        self._scan()
+
+    def search_dirs(self):
+        # The expected layout is searched last so that it takes precedence.
+        buckets = ['.', 'all', self.arch]
+        bases = [self.folder, self.folder / 'local-cache' / 'snaps']
+        if self.folder.name != 'wasta-offline':
+            bases.reverse()
+        return [(bucket, base / bucket) for base in bases for bucket in buckets]
+
+    def _scan(self):
+        revisions = {}
+        for bucket, folder in self.search_dirs():
+            try:
+                self.dir_mtimes[folder] = os.stat(folder).st_mtime_ns
+            except OSError:
+                self.dir_mtimes[folder] = None
+                continue
+            records = scan_folder(folder, bucket)
+            self.records.extend(records)
+            self.by_arch.setdefault(bucket, []).extend(records)
+            for r in records:
+                # Later (more arch-specific) folders take precedence for duplicates.
+                revisions.setdefault(r.name, {})[r.revision] = r
+        for name, revs in revisions.items():
+            self.by_name[name] = [revs[r] for r in sorted(revs.keys())]
+
+    def is_current(self):
+        """Return False if any searched folder has changed since the scan."""
+        for folder, mtime in self.dir_mtimes.items():
+            try:
+                current = os.stat(folder).st_mtime_ns
+            except OSError:
+                current = None
+            if current != mtime:
+                return False
+        return True
+
+    def __contains__(self, name):
+        return name in self.by_name
+
+    def __len__(self):
+        return len(self.by_name)
+
+    def names(self):
+        return sorted(self.by_name.keys())
+
+    def revisions(self, name):
+        return [r.revision for r in self.by_name.get(name, [])]
+
+    def latest(self, name):
+        revs = self.by_name.get(name)
+        return revs[-1] if revs else None
+
+    def updatable(self, installed_snaps_list):
+        """Return the latest offline record of each installed snap that is newer."""
+        updatables = []
+        for inst in installed_snaps_list:
+            revision = str(inst['revision'])
+            if not revision.isdigit():
+                # Locally-installed revision, e.g. "x1"; can't compare.
+                continue
+            latest = self.latest(inst['name'])
+            if latest and latest.revision > int(revision):
+                updatables.append(latest)
+        return updatables
+
+    def installable(self, installed_snaps_list):
+        """Return the latest offline record of each snap that isn't installed."""
+        inst_names = {i['name'] for i in installed_snaps_list}
+        return [self.latest(n) for n in self.names() if n not in inst_names]
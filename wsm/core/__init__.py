@@ -0,0 +1 @@
+""" Snap management logic shared by the command line and the GUI; no GTK here. """
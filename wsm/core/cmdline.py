@@ -0,0 +1,173 @@
+""" Update snap packages from the command line. """
+
+import argparse
+import logging
+from os import path
+
+from wsm.core import export
+from wsm.core import install
+from wsm.core import pipeline
+from wsm.core import util
+
+# Options handled without the GUI.
+CLI_OPTIONS = ('version', 'online', 'snaps-dir', 'export-to')
+
+
+def get_parser(prog):
+    parser = argparse.ArgumentParser(prog=path.basename(prog))
+    parser.add_argument(
+        '-d', '--debug', action='store_true',
+        help="Set log level to DEBUG"
+    )
+    parser.add_argument(
+        '-e', '--export-to', metavar='/path/to/wasta-offline',
+        help='Export installed snaps to offline folder.'
+    )
+    parser.add_argument(
+        '-i', '--online', action='store_true',
+        help='Update snaps from the online Snap Store.'
+    )
+    parser.add_argument(
+        '-s', '--snaps-dir', metavar='/path/to/wasta-offline',
+        help='Update snaps from offline folder.'
+    )
+    parser.add_argument(
+        '-V', '--version', action='store_true',
+        help='Print snapd version number.'
+    )
+    parser.add_argument('snaps', nargs='*', help=argparse.SUPPRESS)
+    return parser
+
+def parse_args(argv):
+    """
+    Parse argv into the same (options dict, arguments list) that the GUI's
+    Gio.ApplicationCommandLine gives, so both share run(). Options that
+    aren't ours, e.g. GTK's, are returned too, as a list left for the GUI.
+    """
+    args, unknown = get_parser(argv[0]).parse_known_args(argv[1:])
+    opts = {}
+    for name in ['debug', 'online', 'version']:
+        if getattr(args, name):
+            opts[name] = True
+    if args.snaps_dir:
+        opts['snaps-dir'] = args.snaps_dir
+    if args.export_to:
+        opts['export-to'] = args.export_to
+    return opts, [argv[0]] + args.snaps, unknown
+
+def main(argv):
+    """
+    Run command line options without loading GTK. Return None if the GUI
+    is needed instead; it gets all of argv, including options unknown here.
+    """
+    opts, args, unknown = parse_args(argv)
+    if not any(o in opts for o in CLI_OPTIONS):
+        return None
+    if unknown:
+        # Exits with status 2, as parse_args() used to.
+        get_parser(argv[0]).error(f"unrecognized arguments: {' '.join(unknown)}")
+    return run(opts, args)
+
+def run(opts, args):
+    """Handle parsed options. Return exit status, or None to run the GUI."""
+    if 'version' in opts:
+        util.print_version()
+        return 0
+
+    # Verify execution with elevated privileges.
+    util.verify_elevated_privileges()
+
+    # Set loglevel.
+    log_level = logging.INFO
+    if 'debug' in opts:
+        log_level = logging.DEBUG
+
+    # Set up logging.
+    util.set_up_logging(log_level)
+    util.log_snapd_version(util.get_snapd_version())
+    util.log_installed_snaps(util.get_installed_snaps_list())
+
+    if not opts and not args:
+        # No command line args passed: run GUI.
+        return None
+
+    if 'export-to' in opts:
+        # Export installed snaps (or those listed), then exit.
+        status, stats = export.export_installed_snaps(opts.get('export-to'), args[1:])
+        print(stats.summary())
+        return status
+
+    # Give terminal guidance for tracking updates. Use print for clarity.
+    print('\nHint: To view update progress, open a new terminal and type:')
+    print('snap changes\n')
+    print('The last item on the list will be the in-progress update.')
+    print('Watch the progress of this particular change with:')
+    print('snap change [number]\n')
+
+    # Run offline and then online updates, if indicated.
+    #   TODO: Needs testing.
+    status = 0
+    early_return = False
+    if 'snaps-dir' in opts:
+        snaps_dir = opts.get('snaps-dir')
+        # Check for passed snap names to install.
+        if len(args) > 1:
+            install_list = args[1:]
+            # Install snaps, their bases, and prerequisites.
+            logging.info(f"Installing {install_list}...")
+            status = install.install_offline_snaps_and_prereqs(
+                snaps_dir, install_list, print_progress
+            )
+            if status != 0:
+                logging.error(f"Error: {install_list} failed to install")
+            return status
+        else:
+            # Run offline updates, then continue.
+            # Move snaps into arch-specific subfolders for multi-arch support.
+            util.wasta_offline_snap_cleanup(snaps_dir)
+            # Update snaps from wasta-offline folder.
+            status += update_offline(snaps_dir)
+            if status != 0:
+                return status
+        early_return = True
+
+    if 'online' in opts:
+        # Run online updates, then exit.
+        status = update_online()
+        return status
+
+    # Return now if offline updates were done.
+    if early_return:
+        return status
+
+    # Run GUI if other options were passed.
+    return None
+
+def update_offline(folder):
+    folder = path.abspath(folder)
+    updatables = util.get_offline_updatable_snaps(folder)
+    for snap in updatables:
+        logging.info(f"updating {snap['name']} from {folder}...")
+    # Read the next snaps from the folder while snapd installs the current one.
+    failed = []
+    def on_done(job):
+        if job.status != 0:
+            failed.append(job.name)
+    status = pipeline.update_snaps_offline([i['file_path'] for i in updatables], print_progress, on_done)
+    if failed:
+        logging.error(f"Failed to update {len(failed)} of {len(updatables)} snaps: {failed}")
+    return status
+
+def update_online():
+    snaps = util.get_snap_refresh_dict()
+    # Refresh all snaps together in one snapd change.
+    status = install.update_snaps_online(snaps.keys(), print_progress)
+    return status
+
+def print_progress(progress):
+    # Print is better than logging for a single updating line.
+    line = f"{progress.label}: {round(progress.fraction * 100)}%"
+    if progress.rate and progress.total > 1024:
+        line += f" ({util.convert_filesize(progress.rate)}/s)"
+    end = '\n' if progress.ready else ''
+    print(f"\r{line:<79}", end=end, flush=True)
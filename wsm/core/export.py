@@ -0,0 +1,186 @@
+""" Export installed snaps into a wasta-offline folder. """
+
+import fcntl
+import logging
+import os
+import shutil
+import time
+
+from pathlib import Path
+
+from wsm import assertions
+from wsm import catalog
+from wsm import snapd
+from wsm import state
+from wsm.core import util
+from wsm.core import verify
+
+
+SNAPD_SNAPS_DIR = Path('/var/lib/snapd/snaps')
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+COPY_RANGE_CHUNK = 2**30
+
+
+class ExportStats():
+    def __init__(self):
+        self.copied = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+        # {method: count}
+        self.methods = {}
+
+    def __repr__(self):
+        return f"ExportStats(copied={self.copied}, skipped={self.skipped}, failed={self.failed})"
+
+    def throughput(self):
+        return self.bytes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        line = f"Exported {self.copied} snaps ({util.convert_filesize(self.bytes)})"
+        line += f", skipped {self.skipped} already present"
+        if self.failed:
+            line += f", {self.failed} failed"
+        line += f" in {self.elapsed:.1f} s"
+        if self.bytes:
+            line += f" ({util.convert_filesize(self.throughput())}/s)"
+        return line
+
+
+def reflink(src, dst):
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+def copy_range(src, dst):
+    # The kernel copies the data, or shares it if the filesystem can.
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        while os.copy_file_range(fsrc.fileno(), fdst.fileno(), COPY_RANGE_CHUNK):
+            pass
+
+def clone_file(src, dst):
+    """
+    Copy src to dst the cheapest way the filesystems allow: reflink,
+    copy_file_range, then a plain copy. Returns the method used. dst is
+    never a hard link, which would share snapd's root-only file.
+    """
+    tmp = dst.with_name(f".{dst.name}.tmp")
+    methods = [('reflink', reflink)]
+    if hasattr(os, 'copy_file_range'):
+        methods.append(('copy_file_range', copy_range))
+    methods.append(('copy', shutil.copyfile))
+    for method, func in methods:
+        try:
+            tmp.unlink(missing_ok=True)
+            func(src, tmp)
+            break
+        except OSError as e:
+            logging.debug(f"{method} {src} -> {dst} failed: {e}")
+    else:
+        tmp.unlink(missing_ok=True)
+        raise OSError(f"Unable to copy {src} to {dst}")
+    os.replace(tmp, dst)
+    return method
+
+def get_assertion_stream(client, snap):
+    """
+    Return the assertions that `snap download` would save for an installed
+    snap, as a stream: its signing keys, its publisher's account, its
+    snap-declaration and its snap-revision.
+    """
+    declarations = client.get_assertions('snap-declaration', **{'snap-id': snap['id']})
+    revisions = client.get_assertions(
+        'snap-revision', **{'snap-id': snap['id'], 'snap-revision': str(snap['revision'])}
+    )
+    if not declarations or not revisions:
+        return None
+    publisher_id = declarations[0].headers.get('publisher-id')
+    accounts = client.get_assertions('account', **{'account-id': publisher_id})
+    sign_keys = [a.headers.get('sign-key-sha3-384') for a in accounts + declarations + revisions]
+    keys = []
+    for sign_key in dict.fromkeys(sign_keys):
+        keys.extend(client.get_assertions('account-key', **{'public-key-sha3-384': sign_key}))
+    return assertions.encode_stream(keys + accounts + declarations[:1] + revisions[:1])
+
+def get_export_arch(snap_file):
+    architectures = util.get_snap_yaml(snap_file).get('architectures', [])
+    return 'all' if 'all' in architectures else catalog.get_arch()
+
+def make_dirs(folder, user):
+    missing = [p for p in [folder, *folder.parents] if not p.exists()]
+    folder.mkdir(parents=True, exist_ok=True)
+    if user:
+        for p in missing:
+            shutil.chown(p, user=user, group=user)
+
+def export_snap(client, snap, snaps_dir, user, stats):
+    name = snap['name']
+    revision = str(snap['revision'])
+    src = SNAPD_SNAPS_DIR / f"{name}_{revision}.snap"
+    if not revision.isdigit() or not src.is_file():
+        # Locally-installed revisions have no store assertions.
+        logging.info(f"Skipping {name} (revision {revision}): not from the Snap Store.")
+        return
+    stream = get_assertion_stream(client, snap)
+    if not stream:
+        logging.error(f"No assertions found for {name} (revision {revision}).")
+        stats.failed += 1
+        return
+    arch_dir = snaps_dir / get_export_arch(src)
+    make_dirs(arch_dir, user)
+    dst = arch_dir / src.name
+    assert_file = catalog.get_assert_file(dst)
+    if not assert_file.is_file() or assert_file.read_bytes() != stream:
+        assert_file.write_bytes(stream)
+        if user:
+            shutil.chown(assert_file, user=user, group=user)
+
+    # Files already exported are checked against the assertion, not re-copied.
+    if dst.is_file() and not verify.verify_snap(dst):
+        logging.info(f"{dst.name} is already in {arch_dir}.")
+        stats.skipped += 1
+        return
+    start = time.monotonic()
+    method = clone_file(src, dst)
+    size = dst.stat().st_size
+    if user:
+        shutil.chown(dst, user=user, group=user)
+    elapsed = time.monotonic() - start
+    rate = f"{util.convert_filesize(size / elapsed)}/s" if elapsed > 0 else ''
+    logging.info(f"Exported {dst.name} to {arch_dir} by {method} {rate}")
+    stats.copied += 1
+    stats.bytes += size
+    stats.methods[method] = stats.methods.get(method, 0) + 1
+
+def export_installed_snaps(folder, snap_names=None):
+    """
+    Copy the installed revisions of snap_names (default: all installed snaps)
+    and their assertions into folder's local-cache/snaps/<arch> folders.
+    Returns (status, ExportStats).
+    """
+    snaps_dir = Path(folder, 'local-cache', 'snaps')
+    user = util.get_user()
+    client = snapd.get_client()
+    installed = state.get_installed_state().list()
+    if snap_names:
+        installed = [s for s in installed if s['name'] in snap_names]
+        missing = set(snap_names) - {s['name'] for s in installed}
+        for name in sorted(missing):
+            logging.error(f"\"{name}\" is not installed.")
+    else:
+        missing = set()
+
+    stats = ExportStats()
+    start = time.monotonic()
+    for snap in installed:
+        try:
+            export_snap(client, snap, snaps_dir, user, stats)
+        except OSError as e:
+            logging.error(f"Unable to export {snap['name']}: {e}")
+            stats.failed += 1
+    stats.elapsed = time.monotonic() - start
+    logging.info(stats.summary())
+    logging.debug(f"Copy methods used: {stats.methods}")
+    status = 1 if stats.failed or missing else 0
+    return status, stats
@@ -0,0 +1,181 @@
+""" Install and update snaps through snapd. """
+
+import logging
+
+from pathlib import Path
+
+from wsm import catalog
+from wsm import planner
+from wsm import snapd
+from wsm import snapd_async
+from wsm import state
+from wsm.core import util
+from wsm.core import verify
+
+
+def update_snaps_online(snaps, callback=None):
+    """Refresh all given snaps from the Snap Store in a single snapd change."""
+    snaps = list(snaps)
+    if not snaps:
+        return 0
+    logging.info(f'Updating (refreshing) online: {snaps}')
+    snapctl = snapd.get_client()
+    try:
+        response = snapctl.refresh(snaps)
+    except Exception as e:
+        logging.error(e)
+        return 13
+    return wait_for_change(snapctl, response, callback, 13)
+
+def update_snaps_online_each(snaps, callback=None):
+    """
+    Refresh snaps in one snapd change like update_snaps_online, but return
+    {name: status}. snapd only undoes the refreshes that failed, so a snap
+    whose revision moved was updated even if the change as a whole wasn't.
+    """
+    snaps = list(snaps)
+    installed_state = state.get_installed_state()
+    before = {n: installed_state.revision(n) for n in snaps}
+    status = update_snaps_online(snaps, callback)
+    if status == 0:
+        return {n: 0 for n in snaps}
+    # A refused request leaves no change to clear the state; reload it anyway.
+    installed_state.invalidate()
+    return {n: 0 if installed_state.revision(n) != before[n] else status for n in snaps}
+
+def wait_for_change(snapctl, response, callback=None, error_status=1):
+    """Follow the change started by an async snapd response until it's ready."""
+    change_id = response.get('change') if response else None
+    if not change_id:
+        logging.error(f"snapd refused request: {response.get('result') if response else None}")
+        return error_status
+    try:
+        change = snapctl.wait_change(change_id, callback=callback)
+    except Exception as e:
+        logging.error(e)
+        return error_status
+    if not change or change.get('status') != 'Done':
+        status = change.get('status') if change else None
+        err = change.get('err') if change else None
+        logging.error(f"Change {change_id} ended with status \"{status}\": {err}")
+        return error_status
+    logging.info(f"Change {change_id} done: {change.get('summary')}")
+    return 0
+
+def acknowledge_snap_asserts(assert_files):
+    for assert_file in assert_files:
+        if not assert_file.is_file():
+            # Without its assertion the snap's name is unknown; the path has to do.
+            logging.error(f'{assert_file} is missing.')
+            logging.error('Try installing this snap from the Snap Store instead.')
+            # TODO: Display message saying how to install it from the Snap Store.
+            return 10
+    try:
+        logging.info(f'Acknowledging {[str(f) for f in assert_files]}')
+        response = snapd.get_client().ack_assertions(assert_files)
+    except Exception as e:
+        logging.error(e)
+        return 11
+    if response.get('type') == 'error':
+        logging.error(f"snapd refused assertions: {response.get('result')}")
+        return 11
+    return 0
+
+def install_snaps_offline(snap_files, details_list=None, callback=None):
+    """
+    Install several offline snaps with as few snapd changes as possible: one
+    sideload request for strictly-confined snaps and one for classic snaps.
+    """
+    snap_files = [Path(f) for f in snap_files]
+    if not snap_files:
+        return 0
+    if not details_list:
+        details_list = util.get_offline_snap_details_many(snap_files)
+
+    root_type = util.get_root_type()
+    if not root_type:
+        return 1
+
+    # Group snaps by confinement; snapd applies the same flags to a whole request.
+    groups = {False: [], True: []}
+    status = 0
+    for snap_file, details in zip(snap_files, details_list):
+        if not details or details.get('error'):
+            logging.error(f"Unable to read details of {snap_file}.")
+            status = 1
+            continue
+        if not catalog.get_assert_file(snap_file).is_file():
+            logging.error(f"{catalog.get_assert_file(snap_file)} is missing.")
+            logging.error(f"Try installing {details.get('name')} from the Snap Store instead.")
+            status = 10
+            continue
+        classic_flag = details.get('confinement') == 'classic'
+        groups[classic_flag].append(snap_file)
+
+    # Acknowledge all assertions for the batch at once.
+    assert_files = [catalog.get_assert_file(f) for f in groups[False] + groups[True]]
+    if assert_files:
+        a_status = acknowledge_snap_asserts(assert_files)
+        if a_status != 0:
+            return a_status
+
+    snap = snapd.get_client()
+    for classic_flag, files in groups.items():
+        if not files:
+            continue
+        msg = f"Installing/Updating {[str(f) for f in files]}"
+        if classic_flag:
+            msg += ' with --classic flag'
+        logging.info(msg)
+        g_status = sideload_snaps(snap, files, classic_flag, callback)
+        if g_status != 0:
+            status = g_status
+    return status
+
+def sideload_snaps(snap, snap_files, classic_flag, callback=None):
+    try:
+        response = snap.sideload(snap_files, classic=classic_flag)
+    except Exception as e:
+        logging.error(e)
+        return 12
+    return wait_for_change(snap, response, callback, 12)
+
+def snaps_are_installed(snap_names):
+    # Planning asks about a whole dependency level at once, so ask snapd concurrently.
+    try:
+        return snapd_async.snaps_are_installed(snap_names)
+    except Exception as e:
+        logging.debug(f"Concurrent snapd queries failed, using installed state: {e!r}")
+        return util.snaps_are_installed(snap_names)
+
+def install_offline_snap_and_prereqs(snaps_dir, snap_name, callback=None):
+    return install_offline_snaps_and_prereqs(snaps_dir, [snap_name], callback)
+
+def install_offline_snaps_and_prereqs(snaps_dir, snap_names, callback=None):
+    """
+    Install snaps from snaps_dir along with snapd, their bases, and their
+    prerequisites, planned up front and installed one dependency layer at a time.
+    """
+    offline_catalog = util.get_offline_catalog(snaps_dir)
+    plan = planner.plan_install(
+        snap_names,
+        offline_catalog,
+        snaps_are_installed,
+        util.get_offline_snap_details_many,
+    )
+    if not plan.ok:
+        for error in plan.errors():
+            logging.error(error)
+        return 10
+    logging.info(f"Install plan for {snap_names}: {plan.layers}")
+    # Find damaged files before anything is installed.
+    if verify.verify_snaps(n['file_path'] for n in plan.nodes.values()):
+        return verify.DAMAGED_STATUS
+
+    for layer in plan.layers:
+        snap_files, details_list = plan.layer_files(layer)
+        ret = install_snaps_offline(snap_files, details_list, callback)
+        logging.debug(f"Installation of {layer} terminated with status \"{ret}\".")
+        if ret != 0:
+            return ret
+    return 0
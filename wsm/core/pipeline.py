@@ -0,0 +1,274 @@
+""" Update snaps from offline files through a pipeline of concurrent stages. """
+
+import logging
+import os
+import queue
+import threading
+import time
+
+from pathlib import Path
+
+from wsm import catalog
+from wsm import snapd
+from wsm.core import install
+from wsm.core import util
+from wsm.core import verify
+
+
+# Snaps read ahead of the one being installed.
+READ_AHEAD = 2
+STAGE_CHUNK = 2**20
+# Snap types installed first, in this order: snapd, then the bases others run on.
+TYPE_ORDER = {'snapd': 0, 'base': 1, 'os': 1}
+
+
+class Stage():
+    """Work done by one pipeline stage: time spent busy, snaps and bytes handled."""
+    def __init__(self, name):
+        self.name = name
+        self.busy = 0.0
+        self.count = 0
+        self.bytes = 0
+
+    def __repr__(self):
+        return f"Stage({self.name}, busy={self.busy:.2f}s, count={self.count})"
+
+    def utilization(self, elapsed):
+        return self.busy / elapsed if elapsed > 0 else 0.0
+
+    def report(self, elapsed):
+        line = f"{self.name}: {self.count} snaps, busy {self.busy:.1f} s ({self.utilization(elapsed):.0%})"
+        if self.bytes and self.busy > 0:
+            line += f", {util.convert_filesize(self.bytes / self.busy)}/s"
+        return line
+
+
+class Job():
+    __slots__ = ('snap_file', 'details', 'status')
+
+    def __init__(self, snap_file):
+        self.snap_file = Path(snap_file)
+        self.details = None
+        self.status = 0
+
+    def __repr__(self):
+        return f"Job({self.snap_file.name}, status={self.status})"
+
+    @property
+    def name(self):
+        if self.details and self.details.get('name'):
+            return self.details['name']
+        return snap_file_name(self.snap_file)
+
+
+def snap_file_name(snap_file):
+    # Name from the assertion; the file name only labels snaps without one.
+    info = catalog.read_snap_info(catalog.get_assert_file(snap_file))
+    if info and info.name:
+        return info.name
+    return Path(snap_file).name
+
+def install_order(job):
+    snap_type = job.details.get('type') if job.details else None
+    return (TYPE_ORDER.get(snap_type, len(TYPE_ORDER)), job.name)
+
+def stage_file(snap_file, buffer):
+    """Read snap_file once so that snapd's upload comes from the page cache."""
+    size = 0
+    with open(snap_file, 'rb', buffering=0) as f:
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            size += n
+    return size
+
+
+class UpdatePipeline():
+    """
+    Update snaps from offline files. All files are first verified against
+    their assertions, so that damaged ones are skipped before anything is
+    installed. The rest go through four stages, each in its own thread and
+    joined by bounded queues: read details, read the file ahead into the
+    page cache, acknowledge assertions, install. While snapd installs one
+    snap the next ones are already being read, so slow USB media and snapd
+    are both kept busy.
+
+    get_details(files) yields snap details in order; ack(assert_files) and
+    sideload(snap_files, classic, callback) return a status, 0 on success.
+    """
+    def __init__(self, snap_files, read_ahead=READ_AHEAD, get_details=None, ack=None, sideload=None):
+        self.jobs = [Job(f) for f in snap_files]
+        self.read_ahead = read_ahead
+        self.get_details = get_details if get_details else util.iter_offline_snap_details
+        self.ack = ack if ack else install.acknowledge_snap_asserts
+        self.sideload = sideload if sideload else self.sideload_snapd
+        self.stages = [Stage(n) for n in ('verify', 'details', 'read-ahead', 'acknowledge', 'install')]
+        self.elapsed = 0.0
+
+    def sideload_snapd(self, snap_files, classic, callback=None):
+        return install.sideload_snaps(snapd.get_client(), snap_files, classic, callback)
+
+    def read_details(self, stage, outbox):
+        # Only a snap's own metadata gives its type, so every snap's details
+        #   are read before the first is passed on. They're small and usually
+        #   cached, so this costs little next to reading the snaps themselves.
+        start = time.monotonic()
+        done = 0
+        try:
+            details_iter = self.get_details([j.snap_file for j in self.jobs])
+            for job in self.jobs:
+                job.details = next(details_iter)
+                done += 1
+        except Exception as e:
+            logging.error(f"Unable to read snap details: {e!r}")
+        try:
+            for job in self.jobs[:done]:
+                if not job.details or job.details.get('error'):
+                    logging.error(f"Skipping {job.name}: {job.details.get('error') if job.details else 'no details'}")
+                    job.status = 1
+                elif not catalog.get_assert_file(job.snap_file).is_file():
+                    logging.error(f"{catalog.get_assert_file(job.snap_file)} is missing.")
+                    job.status = 10
+            # Jobs without details fail, but still reach on_done.
+            for job in self.jobs[done:]:
+                job.status = 1
+            self.jobs.sort(key=install_order)
+            stage.busy += time.monotonic() - start
+            stage.count += done
+            for job in self.jobs:
+                outbox.put(job)
+        finally:
+            outbox.put(None)
+
+    def forward(self, stage, inbox, outbox, work):
+        """
+        Pass each job from inbox to outbox, calling work(job) on those that
+        haven't failed yet. A job fails if work raises; the None that ends
+        the queue is always passed on, so run() never waits forever.
+        """
+        try:
+            while True:
+                job = inbox.get()
+                if job is None:
+                    break
+                if job.status == 0:
+                    start = time.monotonic()
+                    try:
+                        work(job)
+                    except Exception as e:
+                        logging.error(f"{stage.name} failed for {job.snap_file}: {e!r}")
+                        job.status = 1
+                    stage.busy += time.monotonic() - start
+                    stage.count += 1
+                outbox.put(job)
+        finally:
+            outbox.put(None)
+
+    def read_ahead_file(self, stage, inbox, outbox):
+        buffer = bytearray(STAGE_CHUNK)
+        def work(job):
+            stage.bytes += stage_file(job.snap_file, buffer)
+        self.forward(stage, inbox, outbox, work)
+
+    def acknowledge(self, stage, inbox, outbox):
+        """Acknowledge the assertions of all jobs waiting in inbox at once."""
+        try:
+            end = False
+            while not end:
+                batch = [inbox.get()]
+                while batch[-1] is not None:
+                    try:
+                        batch.append(inbox.get_nowait())
+                    except queue.Empty:
+                        break
+                if batch[-1] is None:
+                    batch.pop()
+                    end = True
+                jobs = [j for j in batch if j.status == 0]
+                if jobs:
+                    start = time.monotonic()
+                    try:
+                        status = self.ack([catalog.get_assert_file(j.snap_file) for j in jobs])
+                    except Exception as e:
+                        logging.error(f"{stage.name} failed for {[j.name for j in jobs]}: {e!r}")
+                        status = 1
+                    for job in jobs:
+                        job.status = status
+                    stage.busy += time.monotonic() - start
+                    stage.count += len(jobs)
+                for job in batch:
+                    outbox.put(job)
+        finally:
+            outbox.put(None)
+
+    def run(self, callback=None, on_done=None):
+        """
+        Install all snaps, calling callback(progress) during each install and
+        on_done(job) as each snap finishes. Returns the last non-zero status.
+        """
+        if not self.jobs:
+            return 0
+        verifying, details, staging, acking, installing = self.stages
+        # Bounded queues keep at most a few snaps staged ahead of snapd.
+        to_stage = queue.Queue(maxsize=self.read_ahead)
+        to_ack = queue.Queue(maxsize=self.read_ahead)
+        to_install = queue.Queue(maxsize=1)
+        threads = [
+            threading.Thread(target=self.read_details, args=(details, to_stage), daemon=True),
+            threading.Thread(target=self.read_ahead_file, args=(staging, to_stage, to_ack), daemon=True),
+            threading.Thread(target=self.acknowledge, args=(acking, to_ack, to_install), daemon=True),
+        ]
+        start = time.monotonic()
+        # Damaged files are found before any snap is installed.
+        damaged = verify.verify_snaps(j.snap_file for j in self.jobs)
+        for job in self.jobs:
+            if str(job.snap_file) in damaged:
+                job.status = verify.DAMAGED_STATUS
+        verifying.busy += time.monotonic() - start
+        verifying.count += len(self.jobs)
+        for thread in threads:
+            thread.start()
+
+        status = 0
+        while True:
+            job = to_install.get()
+            if job is None:
+                break
+            # Each snap gets its own change rather than being sideloaded with
+            #   others: the next snaps are still being read while it installs,
+            #   and on_done can report every snap as soon as it's done.
+            if job.status == 0:
+                t = time.monotonic()
+                classic = job.details.get('confinement') == 'classic'
+                logging.info(f"Installing/Updating {job.snap_file}{' with --classic flag' if classic else ''}")
+                try:
+                    job.status = self.sideload([job.snap_file], classic, callback)
+                except Exception as e:
+                    logging.error(f"Unable to install {job.snap_file}: {e!r}")
+                    job.status = 1
+                installing.busy += time.monotonic() - t
+                installing.count += 1
+            if job.status != 0:
+                status = job.status
+            if on_done:
+                on_done(job)
+        for thread in threads:
+            thread.join()
+        self.elapsed = time.monotonic() - start
+        self.log_report()
+        return status
+
+    def log_report(self):
+        logging.info(f"Offline update pipeline finished in {self.elapsed:.1f} s:")
+        for stage in self.stages:
+            logging.info(f" {stage.report(self.elapsed)}")
+
+
+def update_snaps_offline(snap_files, callback=None, on_done=None):
+    """Update snaps from offline files through an UpdatePipeline."""
+    if not util.get_root_type():
+        return 1
+    return UpdatePipeline(snap_files).run(callback, on_done)
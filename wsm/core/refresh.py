@@ -0,0 +1,141 @@
+""" Cached list of snaps with updates in the Snap Store, as reported by snapd. """
+
+import logging
+import threading
+import time
+
+from wsm import snapd
+from wsm import state
+
+
+# Seconds a refresh list stays fresh if snapd's state hasn't changed.
+REFRESH_TTL = 300
+
+_refresh_cache = None
+_lock = threading.Lock()
+
+
+class RefreshCandidates():
+    """
+    Result of one /v2/find?select=refresh query: {name: download size} of
+    snaps with updates, or the error snapd gave if it couldn't ask the store.
+    """
+    __slots__ = ('updates', 'error', 'key', 'time')
+
+    def __init__(self, updates, error, key):
+        self.updates = updates
+        self.error = error
+        self.key = key
+        self.time = time.monotonic()
+
+    def __repr__(self):
+        return f"RefreshCandidates({self.updates}, error={self.error!r})"
+
+    @property
+    def connected(self):
+        return self.error is None
+
+    def age(self):
+        return time.monotonic() - self.time
+
+
+def parse_refresh_response(response):
+    """Return ({name: download size}, error message or None)."""
+    if not response or response.get('type') == 'error':
+        result = response.get('result') if response else None
+        message = result.get('message') if isinstance(result, dict) else None
+        return {}, message or 'no response from snapd'
+    result = response.get('result') or []
+    return {s['name']: s.get('download-size', 0) for s in result}, None
+
+
+class RefreshCache():
+    """
+    Keeps the last refresh list for ttl seconds, as long as snapd's state is
+    the same: the installed revisions and the time of snapd's last refresh.
+    Any completed snapd change also clears it.
+    """
+    def __init__(self, client=None, installed_state=None, ttl=REFRESH_TTL):
+        self.client = client if client else snapd.get_client()
+        self.installed_state = installed_state if installed_state else state.get_installed_state()
+        self.ttl = ttl
+        # lock guards candidates; query_lock lets only one query run at a time.
+        self.lock = threading.Lock()
+        self.query_lock = threading.Lock()
+        self.candidates = None
+        # Whether the last query reached the store; None until one is made.
+        self.last_connected = None
+        # (time of snapd's last refresh, when it was asked); snapd's refresh
+        #   timer rarely fires, so it's asked at most once per ttl.
+        self.last_refresh = None
+        self.client.change_listeners.append(lambda progress: self.invalidate())
+
+    def get_last_refresh(self):
+        with self.lock:
+            cached = self.last_refresh
+        if cached and time.monotonic() - cached[1] < self.ttl:
+            return cached[0]
+        try:
+            last_refresh = self.client.system_info().get('refresh', {}).get('last')
+        except Exception as e:
+            logging.debug(f"Unable to get snapd refresh info: {e}")
+            return None
+        with self.lock:
+            self.last_refresh = (last_refresh, time.monotonic())
+        return last_refresh
+
+    def state_key(self):
+        installed = tuple((s['name'], str(s['revision'])) for s in self.installed_state.list())
+        return (installed, self.get_last_refresh())
+
+    def is_fresh(self, candidates, key):
+        return candidates is not None and candidates.key == key and candidates.age() < self.ttl
+
+    def invalidate(self):
+        with self.lock:
+            self.candidates = None
+            self.last_refresh = None
+
+    def cached(self, key):
+        with self.lock:
+            return self.candidates if self.is_fresh(self.candidates, key) else None
+
+    def get(self):
+        """Return RefreshCandidates, asking snapd only if the cached ones are stale."""
+        # Asked outside the locks, so invalidate() and cache hits never wait on snapd.
+        key = self.state_key()
+        candidates = self.cached(key)
+        if candidates:
+            return candidates
+        # Only one query at a time; a second caller gets the first one's result.
+        with self.query_lock:
+            candidates = self.cached(key)
+            if candidates:
+                return candidates
+            try:
+                response = self.client.get('find?select=refresh')
+            except Exception as e:
+                response = {'type': 'error', 'result': {'message': str(e)}}
+            updates, error = parse_refresh_response(response)
+            if error:
+                logging.info(f"Snap Store not reachable through snapd: {error}")
+            candidates = RefreshCandidates(updates, error, key)
+            with self.lock:
+                # Don't keep failures; the connection may come back at any time.
+                self.candidates = candidates if candidates.connected else None
+                self.last_connected = candidates.connected
+            return candidates
+
+    def prefetch(self):
+        """Fill the cache in a background thread."""
+        thread = threading.Thread(target=self.get, name='refresh-prefetch', daemon=True)
+        thread.start()
+        return thread
+
+
+def get_refresh_cache():
+    global _refresh_cache
+    with _lock:
+        if _refresh_cache is None:
+            _refresh_cache = RefreshCache()
+        return _refresh_cache
@@ -0,0 +1,64 @@
+""" Save and restore a snapshot of what the GUI last showed. """
+
+import json
+import logging
+import os
+import shutil
+
+from pathlib import Path
+
+from wsm.core import util
+
+
+SNAPSHOT_VERSION = 1
+
+
+def get_snapshot_path():
+    return util.get_data_dir() / 'session.json'
+
+def new_snapshot(snaps_dir, installed, available, updatable_offline, store_connected=False):
+    """
+    installed: [{name, revision, summary, confinement, icon}]
+    available: [{name, summary, file_path}]
+    updatable_offline: [{name, revision, file_path, ...}]
+    store_connected: whether snapd last reached the Snap Store
+    """
+    return {
+        'version': SNAPSHOT_VERSION,
+        'snaps_dir': str(snaps_dir),
+        'installed': installed,
+        'available': available,
+        'updatable_offline': updatable_offline,
+        'store_connected': store_connected,
+    }
+
+def load_snapshot(path=None):
+    """Return the saved snapshot, or None if there isn't a usable one."""
+    path = Path(path) if path else get_snapshot_path()
+    try:
+        snapshot = json.loads(path.read_text())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable session snapshot {path}: {e}")
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get('version') != SNAPSHOT_VERSION:
+        logging.debug(f"Ignoring session snapshot with a different version.")
+        return None
+    return snapshot
+
+def save_snapshot(snapshot, path=None):
+    path = Path(path) if path else get_snapshot_path()
+    user = util.get_user()
+    # Write then rename so a crash never leaves a partial snapshot.
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path.write_text(json.dumps(snapshot, separators=(',', ':')))
+        if user:
+            shutil.chown(tmp_path, user=user, group=user)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning(f"Unable to save session snapshot {path}: {e}")
+        return False
+    return True
@@ -1,29 +1,37 @@
 """ Utility functions module. """
 
-import gi
+import collections
+import concurrent.futures
+import itertools
 import logging
 import os
 import platform
 import pwd
-import re
 import shutil
 import socket
+import sqlite3
 import sys
 import subprocess
 import tempfile
 import threading
 import time
-import urllib.request
 import yaml
 
-gi.require_version("Gtk", "3.0")
-from gi.repository import Gtk
 from pathlib import Path
 
-from wsm import wsmapp
+from wsm import cache
+from wsm import catalog
 from wsm import snapd
+from wsm import squashfs
+from wsm import state
+from wsm.core import refresh
 
 
+_metadata_cache = None
+_offline_catalogs = {}
+# Decompression and disk reads release the GIL, so threads work well here.
+METADATA_WORKERS = min(8, os.cpu_count() or 1)
+
 def verify_elevated_privileges():
     # Verify execution with elevated privileges.
     if os.geteuid() != 0:
@@ -50,24 +58,26 @@ def wasta_offline_snap_cleanup(folder):
         return
 
     # Gather architecture info from snaps.
-    #   Create dictionary of: {name_rev: [arch1, arch2, archN], ...}
+    #   Create dictionary of: {file_path: [arch1, arch2, archN], ...}
     #       Valid arches: s390x, ppc64el, arm64, armhf, amd64, i386, all
     #           https://snapcraft.io/docs/architectures
     #       A snap could possibly run on multiple arch's without specifying "all".
     #         So, I suppose in that case the snap would need to be copied multiple
     #          times: once into each relevant arch folder!
     wayward_snaps = {}
-    for snap_dict in snaps:
-        file_path = snap_dict['file_path']
-        contents = get_snap_yaml(file_path)
-        p = Path(file_path)
-        name, revision = p.stem.split('_')
-        wayward_snaps[p.stem] = contents.get('architectures', [])
+    file_paths = [snap_dict['file_path'] for snap_dict in snaps]
+    for details in get_offline_snap_details_many(file_paths):
+        if details.get('error'):
+            # Leave unreadable snaps where they are.
+            continue
+        wayward_snaps[details['file_path']] = details.get('architectures', [])
     logging.debug(f"Wayward snaps: {wayward_snaps}")
 
     # Move snaps to arch-specific subfolders.
     user = get_user()
-    for snap_rev, arches in wayward_snaps.items():
+    for file_path, arches in wayward_snaps.items():
+        snap_file = Path(file_path)
+        assert_file = catalog.get_assert_file(snap_file)
         for arch in arches:
             # Create arch-specific subfolder(s).
             arch_dir = Path(snaps_dir, arch)
@@ -75,12 +85,10 @@ def wasta_offline_snap_cleanup(folder):
                 Path.mkdir(arch_dir, mode=0o777)
                 shutil.chown(arch_dir, user=user, group=user)
             # Copy snaps to arch-specific folder.
-            assert_file = snap_rev + '.assert'
-            snap_file = snap_rev + '.snap'
-            logging.info(f'Moving {snap_file} and {assert_file} into {arch_dir}')
+            logging.info(f'Moving {snap_file.name} and {assert_file.name} into {arch_dir}')
             for f in [snap_file, assert_file]:
                 try:
-                    shutil.move(str(Path(snaps_dir, f)), str(Path(arch_dir, f)))
+                    shutil.move(str(f), str(Path(arch_dir, f.name)))
                 except shutil.Error as err:
                     logging.warning(err)
 
@@ -104,7 +112,7 @@ def get_root_type():
 def set_up_logging(log_level):
     # Define log file.
     user = get_user()
-    log_path = Path('/home', user, '.local', 'share', 'wasta-snap-manager')
+    log_path = get_data_dir()
     if not log_path.is_dir():
         os.mkdir(log_path)
     shutil.chown(log_path, user=user, group=user)
@@ -145,8 +153,7 @@ def log_installed_snaps(snaps):
         logging.info(f'\t{k} ({v})')
 
 def get_snapd_version():
-    with snapd.Snap() as snap:
-        info = snap.system_info()
+    info = snapd.get_client().system_info()
     version = info['version']
     return version
 
@@ -185,56 +192,8 @@ def guess_offline_source_folder():
         begin = alt_begin
     return user, begin.as_posix()
 
-def get_snap_icon(snap, app):
-    name = snap
-    logging.debug(f"snap name: {name}")
-    icon_path = ''
-
-    ### 1. Fastest location to try: ${SNAP}/meta/gui.
-    snap_root = Path('/snap', name)
-    subdirs = [s for s in snap_root.iterdir() if s.is_dir()]
-    SNAP = sorted(subdirs, reverse=True)[0]
-    gui_dir = Path(SNAP, 'meta', 'gui')
-    suffixes = ['.png', '.svg']
-    for s in suffixes:
-        filename = Path(gui_dir, 'icon' + s)
-        if filename.is_file():
-            icon_path = filename
-            logging.debug(f"icon path: {icon_path}")
-            return str(icon_path)
-
-    ### 2. Next try file name from Gtk.IconTheme.
-    app.icon_theme.append_search_path(str(Path(SNAP, 'usr', 'share', 'icons')))
-
-    desktop_files = sorted(Path(SNAP).rglob('*' + name +'*.desktop'), reverse=True)
-    desktop_file = desktop_files[0] if desktop_files else Path()
-    if desktop_file.is_file():
-        with open(desktop_file) as file:
-            contents = file.read()
-            icon_line = re.search('^Icon=.*$', contents, re.MULTILINE)
-            if icon_line:
-                icon_name = icon_line.group(0).split('=')[1]
-                if icon_name.split('/')[0] == '${SNAP}':
-                    # Relative path given.
-                    icon_name = str(SNAP) + "/" + "/".join(icon_name.split('/')[1:])
-                elif icon_name[0] == '/':
-                    # Relative path given, but masquerading as absolute path.
-                    icon_name = str(SNAP) + icon_name
-
-                if Path(icon_name).is_file():
-                    icon_path = icon_name
-                elif app.icon_theme.lookup_icon(icon_name, 48, 0):
-                    icon_path = app.icon_theme.lookup_icon(icon_name, 48, 0).get_filename()
-                    logging.debug(f"icon path: {icon_path}")
-                return str(icon_path)
-
-    ### 3. Icon not found. Use fallback icon.
-    logging.debug(f"Icon not found. Using fallback icon.")
-    return str(app.fallback_icon_path)
-
 def get_snap_refresh_dict():
-    with snapd.Snap() as snap:
-        updatables = {s['name']: s['download-size'] for s in snap.get_refresh_list()}
+    updatables = refresh.get_refresh_cache().get().updates
     logging.info(f"Snaps with online updates (download size):")
     for n, s in updatables.items():
         logging.info(f" {n} ({s} B)")
@@ -249,119 +208,99 @@ def add_item_to_update_list(item, update_list):
     return update_list
 
 def get_list_from_snaps_folder(dir):
-    snaps = []
-    for assertfile in Path(dir).glob('*.assert'):
-        # Each assert file is found first, then the corresponding snap file.
-        snapfile = str(Path(dir, assertfile.stem + '.snap'))
-        if Path(snapfile).exists():
-            # The snap file is only included if both the assert and snap exist.
-            snap, rev = Path(snapfile).stem.split('_')
-            dictionary = {'name': snap, 'revision': rev, 'file_path': snapfile}
-            snaps.append(dictionary)
-    return snaps
+    return [r.as_dict() for r in catalog.scan_folder(dir)]
 
 def check_arch():
     # Get arch in order to search correct wasta-offline folders.
     arch = platform.machine()
-    if arch != 'x86_64':
-        label = Gtk.Label('{} architecture not yet supported for offline updates.'.format(arch))
-        wsmapp.app.listbox_available.add(label)
-        label.show()
-    else:
+    if arch == 'x86_64':
         arch = 'amd64'
     return arch
 
-def snaps_list_to_dict(snaps_list, fallback_icon_path):
-    """Create dictionary of relevant info: icon, name, description, revision."""
-    contents_dict = {}
-    for entry in snaps_list:
-        name = entry['name']
-        icon_path = get_snap_icon(name, fallback_icon_path)
-        contents_dict[name] = {
-            'icon': icon_path,
-            'name': name,
-            'summary': entry['summary'],
-            'revision': entry['revision'],
-            'confinement': entry['confinement'],
-        }
-    return contents_dict
+def get_offline_catalog(folder):
+    # Reuse the catalog for a folder until one of its snaps folders changes.
+    key = str(Path(folder))
+    offline_catalog = _offline_catalogs.get(key)
+    if not offline_catalog or not offline_catalog.is_current():
+        offline_catalog = catalog.OfflineCatalog(folder)
+        _offline_catalogs[key] = offline_catalog
+    return offline_catalog
 
 def list_offline_snaps(dir, init=False):
     # Called at 2 different times:
     #   1. 'wasta-offline' found automatically; i.e. init=True
     #   2. User selects an arbitrary folder; i.e. init=False
 
-    # Get basename of given dir.
-    basename = Path(dir).name
-    offline_list = []
-
     # Determine if it's a wasta-offline folder.
-    if init and basename != 'wasta-offline':
+    if init and Path(dir).name != 'wasta-offline':
         # Initial folder is user's home folder.
-        return offline_list
-
-    # Get arch in order to search correct wasta-offline folders.
-    # TODO: This could be passed as an argument.
-    arch = platform.machine()
-    if arch == 'x86_64':
-        arch = 'amd64'
+        return []
+    return [r.as_dict() for r in get_offline_catalog(dir).records]
 
-    # Search the given directory for snaps.
-    folders = ['.', 'all', arch]
-    for folder in folders:
-        if basename != 'wasta-offline':
-            # An arbitrary folder is selected by the user.
-            folder_path = Path(dir, folder)
-        else:
-            # A 'wasta-offline' folder is being used.
-            folder_path = Path(dir, 'local-cache', 'snaps', folder)
-        if folder_path.exists():
-            # Add new dictionary from folder to existing one.
-            offline_list += get_list_from_snaps_folder(folder_path)
-    return offline_list
+def get_installed_snaps_list():
+    return state.get_installed_state().list()
 
 def get_offline_updatable_snaps(folder):
-    offline_snaps_list = list_offline_snaps(folder)
-    installed_snaps_list = wsmapp.app.installed_snaps_list
+    installed_snaps_list = get_installed_snaps_list()
     # This is a list of snap dictionaries (name, revision, file_path).
-    updatable_snaps_list = []
-    for offl in offline_snaps_list:
-        for inst in installed_snaps_list:
-            if offl['name'] == inst['name'] and int(offl['revision']) > int(inst['revision']):
-                updatable_snaps_list.append(offl)
-    return updatable_snaps_list
+    updatables = get_offline_catalog(folder).updatable(installed_snaps_list)
+    return [r.as_dict() for r in updatables]
 
 def get_offline_installable_snaps(snaps_folder):
-    installed_snaps_list = wsmapp.app.installed_snaps_list
-    offline_snaps_list = list_offline_snaps(snaps_folder)
-    copy1 = copy2 = offline_snaps_list
-    # Remove older revisions of each snap from offline_snaps_list.
-    for e1 in copy1:
-        for e2 in copy2:
-            if e1['name'] == e2['name']:
-                if int(e1['revision']) < int(e2['revision']):
-                    offline_snaps_list.remove(e1)
-                elif int(e2['revision']) < int(e1['revision']):
-                    offline_snaps_list.remove(e2)
-
-    # Make list of installable snaps.
-    installable_snaps_list = []
-    inst_names = [i['name'] for i in installed_snaps_list]
-    for item in offline_snaps_list:
-        if item['name'] not in inst_names:
-            installable_snaps_list.append(item)
-    return installable_snaps_list
-
-def snap_store_accessible():
-    try:
-        urllib.request.urlopen('https://api.snapcraft.io', data=None, timeout=3)
-        return True
-    except:
-        return False
+    installed_snaps_list = get_installed_snaps_list()
+    installables = get_offline_catalog(snaps_folder).installable(installed_snaps_list)
+    return [r.as_dict() for r in installables]
+
+def get_data_dir():
+    # Per-user data folder, shared with log files.
+    user = get_user()
+    if user:
+        return Path('/home', user, '.local', 'share', 'wasta-snap-manager')
+    return Path.home() / '.local' / 'share' / 'wasta-snap-manager'
+
+def get_metadata_cache():
+    global _metadata_cache
+    if _metadata_cache is None:
+        user = get_user()
+        data_dir = get_data_dir()
+        db_path = data_dir / 'snap-metadata.sqlite'
+        try:
+            if not data_dir.is_dir():
+                os.makedirs(data_dir)
+                if user:
+                    shutil.chown(data_dir, user=user, group=user)
+            _metadata_cache = cache.MetadataCache(db_path)
+            if user:
+                # WAL mode keeps the -wal and -shm files next to the database.
+                for suffix in ('', '-wal', '-shm'):
+                    path = Path(f"{db_path}{suffix}")
+                    if path.exists():
+                        shutil.chown(path, user=user, group=user)
+        except (OSError, sqlite3.Error) as e:
+            logging.warning(f"Snap metadata cache unavailable: {e}")
+            # Don't try again.
+            _metadata_cache = False
+    return _metadata_cache
 
 def get_snap_yaml(snapfile):
     # Data needed: 'base', 'confinement', 'prerequisites'
+    metadata_cache = get_metadata_cache()
+    if metadata_cache:
+        yaml_dict = metadata_cache.get(snapfile)
+        if yaml_dict is not None:
+            return yaml_dict
+    yaml_dict = read_snap_yaml(snapfile)
+    if metadata_cache and yaml_dict is not None:
+        metadata_cache.put(snapfile, yaml_dict)
+    return yaml_dict
+
+def read_snap_yaml(snapfile):
     snap_yaml = 'meta/snap.yaml'
+    try:
+        # Read the file in-process; much faster than spawning unsquashfs.
+        return yaml.safe_load(squashfs.read_file(snapfile, snap_yaml))
+    except (squashfs.SquashFSError, OSError) as e:
+        logging.debug(f"Falling back to unsquashfs for {snapfile}: {e}")
     with open(os.devnull, 'w') as DEVNULL:
         with tempfile.TemporaryDirectory() as dest:
             subprocess.run(
@@ -385,31 +324,96 @@ def get_snap_prerequisites(yaml_dict):
     prerequisites.sort()
     return prerequisites
 
+def get_offline_snap_name_revision(snapfile):
+    # The assert file is authoritative; the file name is only a fallback.
+    p = Path(snapfile)
+    info = catalog.read_snap_info(catalog.get_assert_file(p))
+    if info and info.complete:
+        return info.name, str(info.revision)
+    parts = catalog.split_snap_stem(p.stem)
+    if not parts:
+        raise ValueError(f"Unrecognized snap file name: {p.name}")
+    return parts[0], str(parts[1])
+
 def get_offline_snap_details(snapfile):
     if not snapfile:
         return False
+    name, revision = get_offline_snap_name_revision(snapfile)
+    # Only what the assert file doesn't say is read from the snap itself.
     snap_yaml_dict = get_snap_yaml(snapfile)
-    p = Path(snapfile)
-    name, revision = p.stem.split('_')
     output_dict = {'name': name}
     output_dict['revision'] = revision
     output_dict['base'] = snap_yaml_dict.get('base', 'core')
     output_dict['confinement'] = snap_yaml_dict.get('confinement')
     output_dict['prerequisites'] = get_snap_prerequisites(snap_yaml_dict)
     output_dict['summary'] = snap_yaml_dict.get('summary')
+    output_dict['architectures'] = snap_yaml_dict.get('architectures', [])
+    output_dict['type'] = snap_yaml_dict.get('type', 'app')
     return output_dict
 
-def snap_is_installed(snap_name):
-    # response = snap.info(snap_name)
-    with snapd.Snap() as snap:
-        response = snap.info(snap_name)
+def get_offline_snap_details_or_error(snapfile):
+    # A file that can't be read gives {'file_path': ..., 'error': ...}.
     try:
-        if response['name'] == snap_name:
-            return True
-        else: # maybe not possible?
-            return False
-    except KeyError:
-        return False
+        details = get_offline_snap_details(snapfile)
+    except Exception as e:
+        logging.warning(f"Unable to read details of {snapfile}: {e}")
+        return {'file_path': str(snapfile), 'error': e}
+    details['file_path'] = str(snapfile)
+    return details
+
+def get_offline_snap_details_many(snapfiles, workers=None):
+    """
+    Get details for several snap files at once using a pool of threads.
+    Results are returned in the same order as snapfiles. A file that can't be
+    read gives {'file_path': ..., 'error': ...} instead of aborting the batch.
+    """
+    if workers is None:
+        workers = METADATA_WORKERS
+    # Open the cache before any threads need it.
+    get_metadata_cache()
+
+    snapfiles = list(snapfiles)
+    if workers <= 1 or len(snapfiles) <= 1:
+        return [get_offline_snap_details_or_error(f) for f in snapfiles]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(get_offline_snap_details_or_error, snapfiles))
+
+def iter_offline_snap_details(snapfiles, cancel=None, workers=None):
+    """
+    Like get_offline_snap_details_many, but yield each file's details, in
+    order, as soon as it has been read. Stops early once cancel (a
+    threading.Event) is set.
+    """
+    if workers is None:
+        workers = METADATA_WORKERS
+    get_metadata_cache()
+
+    files = iter(snapfiles)
+    pending = collections.deque()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        try:
+            # Only a few reads are in flight at once so that cancelling is quick.
+            for snapfile in itertools.islice(files, max(1, workers) * 2):
+                pending.append(executor.submit(get_offline_snap_details_or_error, snapfile))
+            while pending:
+                if cancel and cancel.is_set():
+                    return
+                details = pending.popleft().result()
+                snapfile = next(files, None)
+                if snapfile is not None:
+                    pending.append(executor.submit(get_offline_snap_details_or_error, snapfile))
+                yield details
+        finally:
+            for future in pending:
+                future.cancel()
+
+def snap_is_installed(snap_name):
+    return state.get_installed_state().is_installed(snap_name)
+
+def snaps_are_installed(snap_names):
+    """Check several snaps at once; return {name: True|False}."""
+    installed_state = state.get_installed_state()
+    return {n: installed_state.is_installed(n) for n in snap_names}
 
 def convert_filesize(input):
     B_amt = float(input)
@@ -424,34 +428,11 @@ def convert_filesize(input):
     return output
 
 def get_snap_file_path(snap, offline_base_path):
-    # Search files in corect arch folder of offline_base_path for snap.
-    arch = check_arch()
-    wol_base_path = Path(offline_base_path) / 'local-cache' / 'snaps'
-    wol_all_path = Path(offline_base_path) / 'local-cache' / 'snaps' / 'all'
-    wol_arch_path = Path(offline_base_path) / 'local-cache' / 'snaps' / arch
-    gen_base_path = Path(offline_base_path)
-    gen_all_path = Path(offline_base_path) / 'all'
-    gen_arch_path = Path(offline_base_path) / arch
-    base_paths = [
-        wol_base_path,
-        wol_all_path,
-        wol_arch_path,
-        gen_base_path,
-        gen_all_path,
-        gen_arch_path,
-    ]
-
-    # Return full path of file matching snap.
-    snap_path = False
-    for p in base_paths:
-        try:
-            snap_path = sorted(p.glob(f'{snap}_*.snap'))[-1]
-        except IndexError:
-            continue
-
-    if not snap_path:
+    # Return full path of latest revision of snap in offline_base_path.
+    latest = get_offline_catalog(offline_base_path).latest(snap)
+    if not latest:
         logging.error(f"No matching file found for \"{snap}\" in \"{offline_base_path}\".")
-    else:
-        logging.debug(f"{snap} found at {snap_path}")
-
+        return False
+    snap_path = Path(latest.file_path)
+    logging.debug(f"{snap} found at {snap_path}")
     return snap_path
@@ -0,0 +1,109 @@
+""" Check offline snap files against their snap-revision assertions. """
+
+import base64
+import concurrent.futures
+import hashlib
+import logging
+import mmap
+import os
+
+from pathlib import Path
+
+from wsm import assertions
+from wsm import catalog
+from wsm.core import util
+
+
+# Status returned when a snap file doesn't match its assertion.
+DAMAGED_STATUS = 14
+HASH_CHUNK = 8 * 2**20
+HASH_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def encode_digest(digest):
+    # Assertions give digests as unpadded URL-safe base64.
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+def hash_file(snap_file):
+    """Return the encoded SHA3-384 digest of snap_file."""
+    sha3 = hashlib.sha3_384()
+    with open(snap_file, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return encode_digest(sha3.digest())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            if hasattr(m, 'madvise'):
+                m.madvise(mmap.MADV_SEQUENTIAL)
+            view = memoryview(m)
+            try:
+                # hashlib releases the GIL for large updates, so files hash in parallel.
+                for pos in range(0, size, HASH_CHUNK):
+                    sha3.update(view[pos:pos + HASH_CHUNK])
+            finally:
+                view.release()
+    return encode_digest(sha3.digest())
+
+def get_file_digest(snap_file):
+    metadata_cache = util.get_metadata_cache()
+    if metadata_cache:
+        digest = metadata_cache.get_digest(snap_file)
+        if digest:
+            return digest
+        key = metadata_cache.key(snap_file)
+    digest = hash_file(snap_file)
+    if metadata_cache:
+        metadata_cache.put_digest(snap_file, digest, key)
+    return digest
+
+def check_snap_info(snap_file):
+    """Return (SnapInfo, None) if snap_file's size matches its assertion, else (None, error)."""
+    assert_file = catalog.get_assert_file(snap_file)
+    try:
+        info = assertions.read_snap_info(assert_file)
+    except FileNotFoundError:
+        return None, f"{assert_file.name} is missing"
+    except (OSError, ValueError) as e:
+        return None, f"{assert_file.name} is unreadable: {e}"
+    if info.revision is None:
+        return None, f"{assert_file.name} has no snap-revision assertion"
+    try:
+        size = Path(snap_file).stat().st_size
+    except OSError as e:
+        return None, f"unreadable: {e}"
+    if size != info.size:
+        return None, f"size is {size} B, expected {info.size} B"
+    return info, None
+
+def check_size(snap_file):
+    """
+    Quick check without reading the file: return a description of what's
+    wrong with snap_file, or None if its size matches its assertion.
+    """
+    return check_snap_info(snap_file)[1]
+
+def verify_snap(snap_file):
+    """Return a description of what's wrong with snap_file, or None if it's intact."""
+    info, error = check_snap_info(snap_file)
+    if error:
+        return error
+    try:
+        digest = get_file_digest(snap_file)
+    except (OSError, ValueError) as e:
+        return f"unreadable: {e}"
+    if digest != info.sha3_384:
+        return "SHA3-384 checksum doesn't match its assertion"
+    return None
+
+def verify_snaps(snap_files, workers=None):
+    """Verify several snap files in parallel. Returns {file path: error} of the bad ones."""
+    if workers is None:
+        workers = HASH_WORKERS
+    # Open the cache before any threads need it.
+    util.get_metadata_cache()
+    snap_files = [str(f) for f in snap_files]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        errors = dict(zip(snap_files, executor.map(verify_snap, snap_files)))
+    errors = {f: e for f, e in errors.items() if e}
+    for snap_file, error in errors.items():
+        logging.error(f"Damaged snap file {snap_file}: {error}")
+    return errors
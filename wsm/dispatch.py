@@ -0,0 +1,120 @@
+""" Batch widget updates from worker threads into the GTK main loop. """
+
+import itertools
+import logging
+import threading
+
+from collections import OrderedDict
+from gi.repository import GLib
+
+
+# Apply queued updates at most once per frame (~60 Hz).
+FRAME_MS = 16
+
+_dispatcher = None
+_lock = threading.Lock()
+
+
+class UIDispatcher():
+    """
+    Collects widget calls made from worker threads and applies them all in
+    one main loop callback per frame instead of one GLib.idle_add each.
+    Calls given the same key replace each other, so e.g. a show followed by
+    a hide of the same widget only applies the hide, and a stream of
+    progress notes only applies the latest one.
+    """
+    def __init__(self, schedule=None):
+        # schedule(callback) must run callback once on the main loop.
+        self.schedule = schedule if schedule else self.schedule_frame
+        self.lock = threading.Lock()
+        self.pending = OrderedDict()
+        self.scheduled = False
+        self.counter = itertools.count()
+        # Metrics.
+        self.max_depth = 0
+        self.queued = 0
+        self.merged = 0
+        self.applied = 0
+        self.batches = 0
+
+    def schedule_frame(self, callback):
+        GLib.timeout_add(FRAME_MS, callback)
+
+    @property
+    def depth(self):
+        """Number of updates waiting to be applied."""
+        with self.lock:
+            return len(self.pending)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'depth': len(self.pending),
+                'max_depth': self.max_depth,
+                'queued': self.queued,
+                'merged': self.merged,
+                'applied': self.applied,
+                'batches': self.batches,
+            }
+
+    def call(self, func, *args, key=None):
+        """Queue func(*args). A queued call with the same key is replaced."""
+        with self.lock:
+            if key is None:
+                key = ('call', next(self.counter))
+            elif key in self.pending:
+                # Replaced calls move to the back so they still run after
+                # anything that was queued before them.
+                del self.pending[key]
+                self.merged += 1
+            self.pending[key] = (func, args)
+            self.queued += 1
+            self.max_depth = max(self.max_depth, len(self.pending))
+            if self.scheduled:
+                return
+            self.scheduled = True
+        self.schedule(self.flush)
+
+    def set_property(self, obj, name, value):
+        self.call(obj.set_property, name, value, key=(id(obj), 'property', name))
+
+    def set_text(self, label, text):
+        self.call(label.set_text, text, key=(id(label), 'text'))
+
+    def show(self, widget):
+        self.call(widget.set_visible, True, key=(id(widget), 'visible'))
+
+    def hide(self, widget):
+        self.call(widget.set_visible, False, key=(id(widget), 'visible'))
+
+    def start(self, spinner):
+        self.call(spinner.start, key=(id(spinner), 'spinning'))
+
+    def stop(self, spinner):
+        self.call(spinner.stop, key=(id(spinner), 'spinning'))
+
+    def flush(self):
+        """Apply all queued calls in order. Runs on the main loop."""
+        with self.lock:
+            pending = self.pending
+            self.pending = OrderedDict()
+            self.scheduled = False
+            self.batches += 1
+            self.applied += len(pending)
+        for func, args in pending.values():
+            try:
+                func(*args)
+            except Exception as e:
+                logging.error(f"UI update {func} failed: {e}")
+        if len(pending) > 1:
+            logging.debug(f"Applied {len(pending)} UI updates in one batch.")
+        # Run only once when used as a GLib callback.
+        return False
+
+
+def get_dispatcher():
+    global _dispatcher
+    with _lock:
+        if _dispatcher is None:
+            _dispatcher = UIDispatcher()
+        return _dispatcher
@@ -4,46 +4,107 @@
 import gi
 
 gi.require_version("Gtk", "3.0")
+from gi.repository import Gdk
+from gi.repository import GObject
 from gi.repository import Gtk
 from gi.repository import Pango
 from gi.repository import GdkPixbuf
 
 
+# Note shown on rows whose snap file doesn't match its assertion.
+DAMAGED_NOTE = 'Damaged file'
+
+
+class SnapItem(GObject.Object):
+    """
+    One snap in a list pane's Gio.ListStore. Rows are built from items as
+    they're added and follow changes to their selected, note and busy
+    properties.
+    """
+    name = GObject.Property(type=str, default='')
+    summary = GObject.Property(type=str, default='')
+    icon = GObject.Property(type=str, default='')
+    revision = GObject.Property(type=str, default='')
+    confinement = GObject.Property(type=str, default='')
+    file_path = GObject.Property(type=str, default='')
+    selected = GObject.Property(type=bool, default=False)
+    note = GObject.Property(type=str, default='')
+    busy = GObject.Property(type=bool, default=False)
+
+    def __repr__(self):
+        return f"SnapItem({self.name!r})"
+
+
+def get_store_items(store):
+    """Return {name: item} for all items in a Gio.ListStore of SnapItems."""
+    return {store.get_item(i).name: store.get_item(i) for i in range(store.get_n_items())}
+
+def find_store_item(store, name):
+    """Return (position, item) of the named snap in store, or (None, None)."""
+    for i in range(store.get_n_items()):
+        item = store.get_item(i)
+        if item.name == name:
+            return i, item
+    return None, None
+
+def compare_items(a, b, *args):
+    return (a.name > b.name) - (a.name < b.name)
+
+def snaps_list_to_dict(snaps_list, icon_resolver):
+    """Create dictionary of relevant info: icon, name, description, revision."""
+    contents_dict = {}
+    for entry in snaps_list:
+        name = entry['name']
+        icon_path = icon_resolver.resolve(name, entry['revision'])
+        contents_dict[name] = {
+            'icon': icon_path,
+            'name': name,
+            'summary': entry['summary'],
+            'revision': entry['revision'],
+            'confinement': entry['confinement'],
+        }
+    return contents_dict
+
+def new_spinner(**kwargs):
+    spinner = Gtk.Spinner(**kwargs)
+    spinner.override_color(Gtk.StateFlags.NORMAL, Gdk.RGBA(0.19, 0.20, 0.23, 1.0))
+    return spinner
+
+
 class InstalledSnapRow(Gtk.ListBoxRow):
-    def __init__(self, data):
+    def __init__(self, item, pixbuf_cache=None):
         super(Gtk.ListBoxRow, self).__init__()
-        self.data = data
+        self.item = item
+        self.pixbuf_cache = pixbuf_cache
 
         # Parse the input data.
-        icon = self.data['icon']
-        snap = self.data['name']
-        description = self.data['summary']
-        rev_installed = self.data['revision']
+        icon = self.item.icon
+        snap = self.item.name
+        description = self.item.summary
+        rev_installed = self.item.revision
         rev_available = 'N/A'
-        flag = self.data['confinement']
+        flag = self.item.confinement
 
         # Define the row.
         self.box_row = Gtk.Box(orientation='horizontal')
         self.add(self.box_row)
 
         # Define the various parts of the row box.
-        image = GdkPixbuf.Pixbuf.new_from_file_at_scale(
-            filename=icon,
-            width=32,
-            height=32,
-            preserve_aspect_ratio=True
-        )
-        self.label_icon = Gtk.Image.new_from_pixbuf(image)
+        self.label_icon = Gtk.Image()
+        self.label_icon.set_size_request(32, 32)
+        self.load_icon(icon)
         self.box_info = Gtk.Box(orientation='vertical')
         #label_rev_installed = Gtk.Label(rev_installed)
         #label_rev_available = Gtk.Label(rev_available)
         self.label_update_note = Gtk.Label('')
+        self.spinner = new_spinner(halign=Gtk.Align.START, valign=Gtk.Align.CENTER)
 
         # Pack the various parts of the row box.
         self.box_row.pack_start(self.label_icon, False, False, 5)
         self.box_row.pack_start(self.box_info, False, False, 5)
         #box_row.pack_end(label_rev_installed, False, False, 5)
         #box_row.pack_end(label_rev_available, False, False, 5)
+        self.box_row.pack_end(self.spinner, False, False, 5)
         self.box_row.pack_end(self.label_update_note, False, False, 5)
 
         # Define the 2 parts of the info box within the row.
@@ -59,11 +120,76 @@ class InstalledSnapRow(Gtk.ListBoxRow):
         self.box_info.pack_start(self.label_name, False, False, 1)
         self.box_info.pack_start(self.label_description, False, False, 1)
         self.show_all()
-        self.label_update_note.hide()
+
+        # Follow the model item.
+        self.handler_ids = [
+            self.item.connect('notify::selected', self.on_item_selected),
+            self.item.connect('notify::note', self.on_item_note),
+            self.item.connect('notify::busy', self.on_item_busy),
+            self.item.connect('notify::summary', self.on_item_summary),
+            self.item.connect('notify::icon', self.on_item_icon),
+        ]
+        self.connect('parent-set', self.on_item_selected)
+        self.connect('destroy', self.on_destroy)
+        self.on_item_note()
+        self.on_item_busy()
+
+    def load_icon(self, icon):
+        if self.pixbuf_cache:
+            # Icon is decoded in the background and set when ready.
+            self.pixbuf_cache.load_async(icon, self.set_icon)
+        else:
+            image = GdkPixbuf.Pixbuf.new_from_file_at_scale(
+                filename=icon,
+                width=32,
+                height=32,
+                preserve_aspect_ratio=True
+            )
+            self.set_icon(image)
+
+    def set_icon(self, pixbuf):
+        self.label_icon.set_from_pixbuf(pixbuf)
+        # Run only once when used as an idle callback.
+        return False
+
+    def on_item_selected(self, *args):
+        listbox = self.get_parent()
+        if not listbox or self.is_selected() == self.item.selected:
+            return
+        if self.item.selected:
+            listbox.select_row(self)
+        else:
+            listbox.unselect_row(self)
+
+    def on_item_note(self, *args):
+        self.label_update_note.set_text(self.item.note)
+        self.label_update_note.set_visible(bool(self.item.note))
+
+    def on_item_summary(self, *args):
+        self.label_description.set_text(self.item.summary)
+
+    def on_item_icon(self, *args):
+        self.load_icon(self.item.icon)
+
+    def on_item_busy(self, *args):
+        if self.item.busy:
+            self.spinner.show()
+            self.spinner.start()
+        else:
+            self.spinner.stop()
+            self.spinner.hide()
+
+    def on_destroy(self, *args):
+        for handler_id in self.handler_ids:
+            self.item.disconnect(handler_id)
+        self.handler_ids = []
 
 class AvailableSnapRow(Gtk.ListBoxRow):
-    def __init__(self, snap, summary):
+    def __init__(self, item):
         super(Gtk.ListBoxRow, self).__init__()
+        self.item = item
+        snap = self.item.name
+        summary = self.item.summary
 
         # Define the row.
         box_row = Gtk.Box(orientation='horizontal')
@@ -77,10 +203,15 @@ class AvailableSnapRow(Gtk.ListBoxRow):
         self.button_install_offline.set_property('margin-top', 6)
         self.button_install_offline.set_property('margin-bottom', 6)
         self.button_install_offline.set_label('Install')
+        # Takes the button's place while the snap installs.
+        self.spinner = new_spinner(halign=Gtk.Align.CENTER, valign=Gtk.Align.CENTER)
+        self.label_note = Gtk.Label('')
 
         # Pack the various parts of the row box.
         box_row.pack_start(box_info, False, False, 10)
         box_row.pack_end(self.button_install_offline, False, False, 10)
+        box_row.pack_end(self.spinner, False, True, 10)
+        box_row.pack_end(self.label_note, False, False, 5)
 
         # Define the 2 parts of the info box within the row.
         label_name = Gtk.Label(snap)
@@ -94,3 +225,35 @@ class AvailableSnapRow(Gtk.ListBoxRow):
         # Pack the 2 parts of the info box into the row box.
         box_info.pack_start(label_name, False, False, 1)
         box_info.pack_start(label_summary, False, False, 1)
+        self.show_all()
+
+        self.handler_ids = [
+            self.item.connect('notify::busy', self.on_item_busy),
+            self.item.connect('notify::note', self.on_item_note),
+        ]
+        self.connect('destroy', self.on_destroy)
+        self.on_item_busy()
+        self.on_item_note()
+
+    def on_item_note(self, *args):
+        self.label_note.set_text(self.item.note)
+        self.label_note.set_visible(bool(self.item.note))
+        # A damaged file can't be installed.
+        self.button_install_offline.set_sensitive(self.item.note != DAMAGED_NOTE)
+
+    def on_item_busy(self, *args):
+        if self.item.busy:
+            width = self.button_install_offline.get_allocated_width()
+            self.spinner.set_property('width-request', width)
+            self.button_install_offline.hide()
+            self.spinner.show()
+            self.spinner.start()
+        else:
+            self.spinner.stop()
+            self.spinner.hide()
+            self.button_install_offline.show()
+
+    def on_destroy(self, *args):
+        for handler_id in self.handler_ids:
+            self.item.disconnect(handler_id)
+        self.handler_ids = []
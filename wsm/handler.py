@@ -6,9 +6,9 @@ import threading
 
 from pathlib import Path
 
-from wsm import util
 from wsm import worker
 from wsm import wsmapp
+from wsm.core import util
 
 
 class Handler():
@@ -30,30 +30,11 @@ class Handler():
     def on_button_source_offline_file_set(self, folder_obj):
         logging.debug(f"Start of function: handler.on_button_source_offline_file_set")
         folder = Path(folder_obj.get_filename())
-
-        # Move wasta-offline snaps into arch-specific subfolders for multi-arch support.
-        if folder.name == 'wasta-offline':
-            util.wasta_offline_snap_cleanup(folder)
         wsmapp.app.snaps_dir = str(folder)
+        wsmapp.app.set_available_placeholder("No installable snaps found in this folder.")
 
-        # Remove any existing rows (placeholder, previous folder, etc.).
-        children = wsmapp.app.listbox_available.get_children()
-        for c in children:
-            wsmapp.app.listbox_available.remove(c)
-
-        # Return if using unsupported architecture.
-        # TODO: Remove the label from the check_arch() function once multi-arch is supported.
-        if util.check_arch() != 'amd64':
-            return
-
-        # Set app-wide variables.
-        wsmapp.app.updatable_offline_list = util.get_offline_updatable_snaps(wsmapp.app.snaps_dir)
-        wsmapp.app.installable_snaps_list = util.get_offline_installable_snaps(wsmapp.app.snaps_dir)
-        wsmapp.app.select_offline_update_rows(wsmapp.app.snaps_dir)
-
-        # Populate available snaps rows.
-        lst = wsmapp.app.installable_snaps_list
-        wsmapp.app.rows1 = wsmapp.app.populate_listbox_available(wsmapp.app.listbox_available, lst)
+        # Scan in the background; rows are added as snaps are found.
+        wsmapp.app.start_offline_scan(folder)
         logging.debug(f"End of function: handler.on_button_source_offline_file_set")
 
     def on_button_update_snaps_clicked(self, *args):
@@ -77,7 +58,6 @@ class Handler():
         except Exception as error:
             # Snap Store not installed?
             logging.error(error)
-            logging.error(subprocess.stdout, subprocess.stderr)
 
     def on_install_button_clicked(self, button, snap):
         target = worker.handle_install_button_clicked
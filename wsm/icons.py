@@ -0,0 +1,305 @@
+""" Find icon files for installed snaps. """
+
+import concurrent.futures
+import gi
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import shutil
+import threading
+
+gi.require_version("Gtk", "3.0")
+from collections import OrderedDict
+from gi.repository import GdkPixbuf
+from gi.repository import GLib
+from gi.repository import Gtk
+from pathlib import Path
+
+from wsm import dispatch
+from wsm.core import util
+
+
+DESKTOP_DIR = Path('/var/lib/snapd/desktop/applications')
+SNAP_ROOT = Path('/snap')
+# Fixed search path for the private icon theme, including snapd's exported icons.
+ICON_SEARCH_PATH = [
+    '/var/lib/snapd/desktop/icons',
+    '/usr/share/icons',
+    '/usr/share/pixmaps',
+]
+ICON_SIZE = 48
+# Size of icons shown in list rows.
+ROW_ICON_SIZE = 32
+PIXBUF_CACHE_BYTES = 8 * 2**20
+# Thumbnails kept on disk; the least recently used ones beyond this are deleted.
+MAX_THUMBNAILS = 500
+
+
+def parse_desktop_icon(desktop_file):
+    try:
+        contents = Path(desktop_file).read_text(errors='replace')
+    except OSError:
+        return None
+    icon_line = re.search('^Icon=(.*)$', contents, re.MULTILINE)
+    return icon_line.group(1).strip() if icon_line else None
+
+
+class IconResolver():
+    """
+    Resolve snap icons from, in order: the snap's meta/gui folder, the
+    desktop files that snapd exports for installed snaps, snapd's
+    /v2/icons endpoint, and finally a fallback icon. Results are cached per
+    (name, revision), so each snap revision is only looked up once.
+    """
+    def __init__(self, fallback_icon_path, cache_dir=None, snap_client=None):
+        self.fallback_icon_path = str(fallback_icon_path)
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.snap_client = snap_client
+        self.lock = threading.Lock()
+        self.icons = {}
+        self.desktop_index = None
+        # Private theme: its search path never grows.
+        self.theme = Gtk.IconTheme.new()
+        self.theme.set_search_path(ICON_SEARCH_PATH)
+
+    def build_desktop_index(self):
+        """Map each snap name to the Icon= entries of its exported desktop files."""
+        index = {}
+        try:
+            desktop_files = sorted(DESKTOP_DIR.glob('*.desktop'))
+        except OSError:
+            desktop_files = []
+        for desktop_file in desktop_files:
+            # Exported files are named <snap>_<app>.desktop.
+            name = desktop_file.stem.split('_')[0]
+            icon = parse_desktop_icon(desktop_file)
+            if icon:
+                index.setdefault(name, []).append(icon)
+        return index
+
+    def invalidate(self):
+        with self.lock:
+            self.desktop_index = None
+
+    def resolve(self, name, revision=None):
+        key = (name, str(revision))
+        with self.lock:
+            icon_path = self.icons.get(key)
+            if icon_path:
+                return icon_path
+            if self.desktop_index is None:
+                self.desktop_index = self.build_desktop_index()
+        icon_path = (
+            self.from_meta_gui(name, revision)
+            or self.from_desktop_index(name, revision)
+            or self.from_snapd(name, revision)
+        )
+        if not icon_path:
+            logging.debug(f"Icon not found for {name}. Using fallback icon.")
+            icon_path = self.fallback_icon_path
+        logging.debug(f"icon path for {name}: {icon_path}")
+        with self.lock:
+            self.icons[key] = icon_path
+        return icon_path
+
+    def snap_dir(self, name, revision=None):
+        return SNAP_ROOT / name / (str(revision) if revision else 'current')
+
+    def from_meta_gui(self, name, revision=None):
+        gui_dir = self.snap_dir(name, revision) / 'meta' / 'gui'
+        for suffix in ['.png', '.svg']:
+            filename = gui_dir / f"icon{suffix}"
+            if filename.is_file():
+                return str(filename)
+        return None
+
+    def from_desktop_index(self, name, revision=None):
+        SNAP = self.snap_dir(name, revision)
+        for icon_name in self.desktop_index.get(name, []):
+            if icon_name.split('/')[0] == '${SNAP}':
+                # Relative path given.
+                icon_name = str(SNAP) + "/" + "/".join(icon_name.split('/')[1:])
+            if icon_name.startswith('/'):
+                if Path(icon_name).is_file():
+                    return icon_name
+                # Relative path given, but masquerading as absolute path.
+                if Path(str(SNAP) + icon_name).is_file():
+                    return str(SNAP) + icon_name
+                continue
+            icon_info = self.theme.lookup_icon(icon_name, ICON_SIZE, 0)
+            if icon_info:
+                return icon_info.get_filename()
+        return None
+
+    def from_snapd(self, name, revision=None):
+        if not self.snap_client or not self.cache_dir:
+            return None
+        # Saved in an earlier session. Without a revision it can't be known
+        #   to be current, so it's fetched again.
+        if revision is not None:
+            for icon_file in sorted(self.cache_dir.glob(f"{name}_{revision}.*")):
+                return str(icon_file)
+        try:
+            response = self.snap_client.icon(name)
+        except Exception as e:
+            logging.debug(f"snapd icon request failed for {name}: {e}")
+            return None
+        if not response:
+            return None
+        content_type, data = response
+        suffix = mimetypes.guess_extension(content_type) or '.png'
+        stem = name if revision is None else f"{name}_{revision}"
+        icon_file = self.cache_dir / f"{stem}{suffix}"
+        user = util.get_user()
+        try:
+            if not self.cache_dir.is_dir():
+                self.cache_dir.mkdir(parents=True)
+                if user:
+                    shutil.chown(self.cache_dir, user=user, group=user)
+            icon_file.write_bytes(data)
+            if user:
+                shutil.chown(icon_file, user=user, group=user)
+        except OSError as e:
+            logging.debug(f"Unable to save icon for {name}: {e}")
+            return None
+        return str(icon_file)
+
+
+class PixbufCache():
+    """
+    Scaled icon pixbufs kept in memory, least recently used first out once
+    max_bytes is exceeded, and saved as PNG thumbnails on disk so that SVGs
+    don't need rendering again after a restart. Entries are keyed by the
+    icon file's (path, mtime, size). At most max_thumbnails are kept on disk.
+    """
+    def __init__(self, thumbnail_dir=None, size=ROW_ICON_SIZE, max_bytes=PIXBUF_CACHE_BYTES,
+                 max_thumbnails=MAX_THUMBNAILS):
+        self.thumbnail_dir = Path(thumbnail_dir) if thumbnail_dir else None
+        self.size = size
+        self.max_bytes = max_bytes
+        self.max_thumbnails = max_thumbnails
+        self.user = util.get_user()
+        self.bytes = 0
+        self.pixbufs = OrderedDict()
+        self.lock = threading.Lock()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        if self.thumbnail_dir:
+            self.executor.submit(self.prune_thumbnails)
+
+    def key(self, path):
+        st = os.stat(path)
+        return (str(path), st.st_mtime_ns, st.st_size)
+
+    def get(self, path):
+        """Return the pixbuf for path if it's in memory, else None."""
+        try:
+            key = self.key(path)
+        except OSError:
+            return None
+        with self.lock:
+            pixbuf = self.pixbufs.get(key)
+            if pixbuf:
+                self.pixbufs.move_to_end(key)
+            return pixbuf
+
+    def _put(self, key, pixbuf):
+        nbytes = pixbuf.get_rowstride() * pixbuf.get_height()
+        with self.lock:
+            if key in self.pixbufs:
+                return
+            self.pixbufs[key] = pixbuf
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes and len(self.pixbufs) > 1:
+                _, old = self.pixbufs.popitem(last=False)
+                self.bytes -= old.get_rowstride() * old.get_height()
+
+    def thumbnail_path(self, key):
+        if not self.thumbnail_dir:
+            return None
+        digest = hashlib.sha1(f"{key}:{self.size}".encode()).hexdigest()
+        return self.thumbnail_dir / f"{digest}.png"
+
+    def load(self, path):
+        """Return the scaled pixbuf for path, decoding it if needed. Safe in any thread."""
+        pixbuf = self.get(path)
+        if pixbuf:
+            return pixbuf
+        try:
+            key = self.key(path)
+        except OSError as e:
+            logging.debug(f"Icon file unavailable: {e}")
+            return None
+        thumbnail = self.thumbnail_path(key)
+        try:
+            if thumbnail and thumbnail.is_file():
+                pixbuf = GdkPixbuf.Pixbuf.new_from_file(str(thumbnail))
+                self.touch_thumbnail(thumbnail)
+            else:
+                pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_scale(
+                    filename=str(path),
+                    width=self.size,
+                    height=self.size,
+                    preserve_aspect_ratio=True
+                )
+                if thumbnail:
+                    self.save_thumbnail(pixbuf, thumbnail)
+        except GLib.Error as e:
+            logging.warning(f"Unable to load icon {path}: {e}")
+            return None
+        self._put(key, pixbuf)
+        return pixbuf
+
+    def save_thumbnail(self, pixbuf, thumbnail):
+        try:
+            if not thumbnail.parent.is_dir():
+                thumbnail.parent.mkdir(parents=True)
+                if self.user:
+                    shutil.chown(thumbnail.parent, user=self.user, group=self.user)
+            pixbuf.savev(str(thumbnail), 'png', [], [])
+            if self.user:
+                shutil.chown(thumbnail, user=self.user, group=self.user)
+        except (OSError, GLib.Error) as e:
+            logging.debug(f"Unable to save thumbnail {thumbnail}: {e}")
+
+    def touch_thumbnail(self, thumbnail):
+        # The mtime records when it was last used, for prune_thumbnails.
+        try:
+            os.utime(thumbnail)
+        except OSError:
+            pass
+
+    def prune_thumbnails(self):
+        """Delete the least recently used thumbnails beyond max_thumbnails."""
+        thumbnails = []
+        for thumbnail in self.thumbnail_dir.glob('*.png'):
+            try:
+                thumbnails.append((thumbnail.stat().st_mtime, thumbnail))
+            except OSError:
+                continue
+        if len(thumbnails) <= self.max_thumbnails:
+            return
+        thumbnails.sort(reverse=True)
+        for _, thumbnail in thumbnails[self.max_thumbnails:]:
+            try:
+                thumbnail.unlink()
+            except OSError as e:
+                logging.debug(f"Unable to delete thumbnail {thumbnail}: {e}")
+        logging.debug(f"Deleted {len(thumbnails) - self.max_thumbnails} old icon thumbnails.")
+
+    def load_async(self, path, callback):
+        """
+        Call callback(pixbuf) on the main loop once path is decoded. A pixbuf
+        already in memory goes through the main loop too, as rows can be
+        built from worker threads.
+        """
+        pixbuf = self.get(path)
+        if pixbuf:
+            dispatch.get_dispatcher().call(callback, pixbuf)
+            return
+        def deliver(future):
+            pixbuf = future.result()
+            if pixbuf:
+                dispatch.get_dispatcher().call(callback, pixbuf)
+        self.executor.submit(self.load, path).add_done_callback(deliver)
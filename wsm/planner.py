@@ -0,0 +1,117 @@
+""" Plan offline installs of snaps together with everything they depend on. """
+
+import logging
+
+
+# Snap types that don't run on top of a base snap.
+BASELESS_TYPES = ('base', 'os', 'snapd')
+
+
+class InstallPlan():
+    """
+    Snaps to install, in layers: every snap's dependencies are in earlier
+    layers, so each layer can be installed at once. The plan can't be used
+    if any needed snap is missing from the folder or unreadable, or if
+    dependencies form a cycle.
+    """
+    def __init__(self):
+        self.layers = []
+        # {name: {'file_path': ..., 'details': ..., 'deps': set()}}
+        self.nodes = {}
+        # {missing name: first snap that needs it}
+        self.missing = {}
+        self.unreadable = []
+        self.cycle = []
+
+    def __repr__(self):
+        return f"InstallPlan({self.layers})"
+
+    @property
+    def ok(self):
+        return not (self.missing or self.unreadable or self.cycle)
+
+    def errors(self):
+        errors = []
+        for name, needed_by in self.missing.items():
+            errors.append(f"No offline file found for \"{name}\" (needed by {needed_by}).")
+        for name in self.unreadable:
+            errors.append(f"Unable to read details of \"{name}\".")
+        if self.cycle:
+            errors.append(f"Dependency cycle among: {', '.join(sorted(self.cycle))}")
+        return errors
+
+    def layer_files(self, layer):
+        """Return (file paths, details) for one layer."""
+        files = [self.nodes[n]['file_path'] for n in layer]
+        details = [self.nodes[n]['details'] for n in layer]
+        return files, details
+
+
+def get_dependencies(name, details, is_installed):
+    deps = set()
+    if name != 'snapd':
+        deps.add('snapd')
+    if details.get('type', 'app') not in BASELESS_TYPES and details.get('base'):
+        deps.add(details.get('base'))
+    deps.update(details.get('prerequisites', []))
+    deps.discard(name)
+    return {d for d in deps if not is_installed.get(d, False)}
+
+def plan_install(snap_names, offline_catalog, installed_status, get_details_many):
+    """
+    Build the full dependency graph of snap_names from offline_catalog.
+    installed_status(names) returns {name: bool}; get_details_many(paths)
+    returns snap details in order. Snap details are read one breadth-first
+    level at a time so each level can be read in parallel.
+    """
+    plan = InstallPlan()
+    is_installed = dict(installed_status(list(snap_names) + ['snapd']))
+    frontier = [(n, 'request') for n in dict.fromkeys(snap_names) if not is_installed.get(n)]
+    while frontier:
+        # {name: file path}
+        level = {}
+        for name, needed_by in frontier:
+            if name in plan.nodes or name in level or name in plan.missing:
+                continue
+            latest = offline_catalog.latest(name)
+            if not latest:
+                plan.missing[name] = needed_by
+                continue
+            level[name] = latest.file_path
+        details_list = get_details_many(list(level.values()))
+
+        # Check installed status of all newly-seen dependencies at once.
+        new_deps = set()
+        for details in details_list:
+            if details.get('error'):
+                continue
+            new_deps.add(details.get('base'))
+            new_deps.update(details.get('prerequisites', []))
+        new_deps = [d for d in new_deps if d and d not in is_installed]
+        is_installed.update(installed_status(new_deps))
+
+        frontier = []
+        for (name, file_path), details in zip(level.items(), details_list):
+            if details.get('error'):
+                plan.unreadable.append(name)
+                continue
+            deps = get_dependencies(name, details, is_installed)
+            plan.nodes[name] = {'file_path': file_path, 'details': details, 'deps': deps}
+            frontier.extend((d, name) for d in sorted(deps) if d not in plan.nodes)
+
+    # Layer the graph (Kahn's algorithm); whatever can't be layered is a cycle.
+    remaining = {
+        n: {d for d in v['deps'] if d in plan.nodes} for n, v in plan.nodes.items()
+    }
+    while remaining:
+        layer = sorted(n for n, deps in remaining.items() if not deps)
+        if not layer:
+            plan.cycle = sorted(remaining.keys())
+            break
+        plan.layers.append(layer)
+        for n in layer:
+            del remaining[n]
+        for deps in remaining.values():
+            deps.difference_update(layer)
+    logging.debug(f"Install plan for {list(snap_names)}: {plan.layers}")
+    return plan
@@ -3,14 +3,29 @@
 # Built on example shared by SO user david-k-hess:
 # https://stackoverflow.com/a/59594889
 
+import atexit
 import logging
 import requests
 import socket
+import threading
+import time
+import uuid
+import weakref
+
+from pathlib import Path
 
 from urllib3.connection import HTTPConnection
 from urllib3.connectionpool import HTTPConnectionPool
 from requests.adapters import HTTPAdapter
 
+from wsm import assertions
+
+
+# Most connections open to snapd at once; more requests wait for a free one.
+POOL_SIZE = 4
+
+_client = None
+_client_lock = threading.Lock()
 
 class SnapdConnection(HTTPConnection):
     def __init__(self):
@@ -24,27 +39,145 @@ class SnapdConnection(HTTPConnection):
     #     self.sock.close()
 
 class SnapdConnectionPool(HTTPConnectionPool):
-    def __init__(self):
-        super().__init__("localhost")
+    def __init__(self, maxsize=1, block=False):
+        super().__init__("localhost", maxsize=maxsize, block=block)
 
     def _new_conn(self):
         return SnapdConnection()
 
 class SnapdAdapter(HTTPAdapter):
-    def __init__(self):
+    """
+    Route every request through a pool of keep-alive connections to snapd's
+    socket instead of opening a new socket per request. Several adapters
+    can share one pool; urllib3 pools are thread-safe.
+    """
+    def __init__(self, snapd_pool=None):
         super().__init__()
+        self.snapd_pool = snapd_pool if snapd_pool else SnapdConnectionPool(maxsize=POOL_SIZE)
 
     def get_connection(self, url, proxies=None):
-        return SnapdConnectionPool()
+        return self.snapd_pool
+
+    def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+        # Used instead of get_connection by requests >= 2.32.
+        return self.snapd_pool
+
+class MultipartBody():
+    """
+    multipart/form-data request body that streams file parts from disk in
+    chunks rather than loading them into memory. Its length is known ahead
+    of time so that requests sends a Content-Length header instead of
+    falling back to chunked encoding.
+    """
+    chunk_size = 1024 * 1024
+
+    def __init__(self, fields, files, file_field='snap'):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        # List of (part header bytes, value bytes or file Path).
+        self.parts = []
+        for name, value in fields.items():
+            header = (
+                f"--{self.boundary}\r\n"
+                f"Content-Disposition: form-data; name=\"{name}\"\r\n\r\n"
+            )
+            self.parts.append((header.encode(), str(value).encode()))
+        for f in files:
+            f = Path(f)
+            header = (
+                f"--{self.boundary}\r\n"
+                f"Content-Disposition: form-data; name=\"{file_field}\"; filename=\"{f.name}\"\r\n"
+                f"Content-Type: application/octet-stream\r\n\r\n"
+            )
+            self.parts.append((header.encode(), f))
+        self.trailer = f"--{self.boundary}--\r\n".encode()
+
+    def __len__(self):
+        length = len(self.trailer)
+        for header, value in self.parts:
+            size = value.stat().st_size if isinstance(value, Path) else len(value)
+            length += len(header) + size + 2
+        return length
+
+    def __iter__(self):
+        for header, value in self.parts:
+            yield header
+            if isinstance(value, Path):
+                with value.open('rb') as f:
+                    while True:
+                        chunk = f.read(self.chunk_size)
+                        if not chunk:
+                            break
+                        yield chunk
+            else:
+                yield value
+            yield b'\r\n'
+        yield self.trailer
+
+class ChangeProgress():
+    """
+    Snapshot of a snapd change, summed over its tasks. Task progress is
+    measured in bytes for downloads and in steps for everything else.
+    """
+    __slots__ = ('change', 'id', 'summary', 'status', 'ready', 'err', 'label', 'done', 'total', 'time', 'rate')
+
+    def __init__(self, change, previous=None):
+        self.change = change
+        self.id = change.get('id')
+        self.summary = change.get('summary', '')
+        self.status = change.get('status')
+        self.ready = change.get('ready', False)
+        self.err = change.get('err')
+        tasks = change.get('tasks', [])
+        self.done = sum(t.get('progress', {}).get('done', 0) for t in tasks)
+        self.total = sum(t.get('progress', {}).get('total', 0) for t in tasks)
+        doing = [t for t in tasks if t.get('status') == 'Doing']
+        self.label = doing[0].get('summary', '') if doing else self.summary
+        self.time = time.monotonic()
+        self.rate = 0
+        if previous and self.time > previous.time:
+            self.rate = max(0, self.done - previous.done) / (self.time - previous.time)
+
+    def __repr__(self):
+        return f"ChangeProgress({self.id}, {self.status}, {self.done}/{self.total})"
+
+    @property
+    def fraction(self):
+        return self.done / self.total if self.total else 0
+
+    def moved(self, previous):
+        return (self.status, self.done, self.label) != (previous.status, previous.done, previous.label)
 
 class Snap():
-    def __init__(self):
-        self.session = requests.Session()
+    def __init__(self, pool_size=POOL_SIZE):
         self.fake_http = 'http://snapd'
-        self.session.mount(self.fake_http, SnapdAdapter())
+        # requests.Session isn't thread-safe, so each thread gets its own;
+        # they all draw from one blocking pool of connections to snapd.
+        self.snapd_pool = SnapdConnectionPool(maxsize=pool_size, block=True)
+        self.local = threading.local()
+        # Sessions of threads that have ended drop out by themselves.
+        self.sessions = weakref.WeakSet()
+        self.sessions_lock = threading.Lock()
+        # Called with the final ChangeProgress of each watched change.
+        self.change_listeners = []
+
+    @property
+    def session(self):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount(self.fake_http, SnapdAdapter(self.snapd_pool))
+            self.local.session = session
+            with self.sessions_lock:
+                self.sessions.add(session)
+        return session
 
     def close(self):
-        self.session.close()
+        with self.sessions_lock:
+            for session in list(self.sessions):
+                session.close()
+            self.sessions.clear()
+        self.snapd_pool.close()
 
     def __enter__(self):
         return self
@@ -80,6 +213,13 @@ class Snap():
     def info(self, snap):
         return self.get('snaps', snap).get('result')
 
+    def icon(self, snap):
+        """Return (content type, data) of an installed snap's icon, or None."""
+        response = self.session.get(f"{self.fake_http}/v2/icons/{snap}/icon")
+        if response.status_code != 200:
+            return None
+        return response.headers.get('Content-Type', ''), response.content
+
     def get_refresh_list(self):
         result = self.get('find?select=refresh').get('result')
         refresh_list = None
@@ -91,3 +231,147 @@ class Snap():
         payload = '/v2/system-info'
         result = self.session.get(self.fake_http + payload).json()['result']
         return result
+
+    def post(self, node, **kwargs):
+        return self.session.post(f"{self.fake_http}/v2/{node}", **kwargs).json()
+
+    def get_path(self, path):
+        return self.session.get(f"{self.fake_http}/{path}").json()
+
+    def change(self, change_id):
+        response = self.get_path(f"v2/changes/{change_id}")
+        # An unknown change is an error response, not a change that never gets ready.
+        if not response or response.get('type') == 'error':
+            return None
+        return response.get('result')
+
+    def watch_changes(self, change_ids, interval=0.2, max_interval=2.0, timeout=None):
+        """
+        Poll several changes from one thread. Yields a ChangeProgress whenever
+        a change's progress moves, and stops once all changes are ready.
+        Polling backs off while nothing is moving.
+        """
+        pending = {str(c): None for c in change_ids}
+        start = time.monotonic()
+        delay = interval
+        while pending:
+            moved = False
+            for change_id, previous in list(pending.items()):
+                change = self.change(change_id)
+                if not change:
+                    del pending[change_id]
+                    continue
+                progress = ChangeProgress(change, previous)
+                if not previous or progress.moved(previous):
+                    moved = True
+                    yield progress
+                if progress.ready:
+                    del pending[change_id]
+                    for listener in self.change_listeners:
+                        listener(progress)
+                else:
+                    pending[change_id] = progress
+            if not pending:
+                break
+            if timeout and time.monotonic() - start > timeout:
+                logging.warning(f"Stopped waiting for snapd changes: {list(pending.keys())}")
+                break
+            delay = interval if moved else min(delay * 1.5, max_interval)
+            time.sleep(delay)
+
+    def wait_change(self, change_id, callback=None, timeout=None):
+        """Wait for a change to be ready; return its final state."""
+        last = None
+        for progress in self.watch_changes([change_id], timeout=timeout):
+            last = progress
+            if callback:
+                callback(progress)
+        return last.change if last else self.change(change_id)
+
+    def refresh(self, names=None):
+        """
+        Refresh several snaps in one snapd change. With no names snapd
+        refreshes everything that has an update.
+        """
+        payload = {'action': 'refresh'}
+        if names:
+            payload['snaps'] = list(names)
+        return self.post('snaps', json=payload)
+
+    def sideload(self, files, classic=False, dangerous=False):
+        """
+        Install one or more local snap files in a single snapd change.
+        Returns the async response; its 'change' item is the change ID.
+        """
+        fields = {'action': 'install'}
+        if classic:
+            fields['classic'] = 'true'
+        if dangerous:
+            fields['dangerous'] = 'true'
+        body = MultipartBody(fields, files)
+        headers = {'Content-Type': body.content_type}
+        return self.post('snaps', data=body, headers=headers)
+
+    def known_assertions(self, assert_type, **headers):
+        """Return the set of keys of assertions of assert_type in the local database that match headers."""
+        return {a.key() for a in self.get_assertions(assert_type, **headers)}
+
+    def get_assertions(self, assert_type, **headers):
+        """Return the assertions of assert_type in the local database that match headers."""
+        response = self.session.get(
+            f"{self.fake_http}/v2/assertions/{assert_type}", params=headers
+        )
+        if response.status_code != 200:
+            return []
+        return assertions.parse_stream(response.content)
+
+    def ack_assertions(self, paths):
+        """
+        Add the assertions in the given .assert files to the system database
+        in one request, skipping duplicates and those already acknowledged.
+        """
+        pending = []
+        seen = set()
+        for path in paths:
+            for a in assertions.read_file(path):
+                if a.key() not in seen:
+                    seen.add(a.key())
+                    pending.append(a)
+        # Ask only for the pending assertions; a whole type can be thousands of them.
+        queries = {}
+        for a in pending:
+            headers = a.primary_headers()
+            queries[(a.type, tuple(sorted(headers.items())) if headers else None)] = headers
+        known = set()
+        for (assert_type, _), headers in queries.items():
+            known |= self.known_assertions(assert_type, **(headers or {}))
+        pending = [a for a in pending if a.key() not in known]
+        logging.debug(f"Acknowledging {len(pending)} new assertions from {len(paths)} files.")
+        if not pending:
+            return {'type': 'sync', 'status-code': 200, 'result': None}
+        return self.post(
+            'assertions',
+            data=assertions.encode_stream(pending),
+            headers={'Content-Type': 'application/x.ubuntu.assertion'},
+        )
+
+
+def get_client():
+    """
+    Return the process-wide Snap client. It can be shared between threads;
+    don't close it (or use it as a context manager), use close_client().
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = Snap()
+        return _client
+
+def close_client():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+atexit.register(close_client)
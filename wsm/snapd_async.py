@@ -0,0 +1,218 @@
+""" asyncio client for the snapd REST API, for running many queries at once. """
+
+import asyncio
+import json
+import logging
+import threading
+
+from collections import deque
+from urllib.parse import quote
+
+
+SNAPD_SOCKET = '/run/snapd.socket'
+# Seconds to wait for a batch of queries made from another thread.
+RUN_TIMEOUT = 30
+
+_background_loop = None
+_client = None
+_lock = threading.Lock()
+
+
+def encode_request(method, path, body=None):
+    lines = [
+        f"{method} {path} HTTP/1.1",
+        "Host: snapd",
+        "Accept: application/json",
+    ]
+    if body is not None:
+        body = json.dumps(body).encode()
+        lines.append("Content-Type: application/json")
+        lines.append(f"Content-Length: {len(body)}")
+    head = ('\r\n'.join(lines) + '\r\n\r\n').encode()
+    return head + (body or b'')
+
+async def read_response(reader):
+    """Read one HTTP/1.1 response; return (status, headers, body)."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("snapd closed the connection")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if 'chunked' in headers.get('transfer-encoding', ''):
+        body = bytearray()
+        while True:
+            size = int((await reader.readline()).split(b';')[0].strip(), 16)
+            if size == 0:
+                # Skip any trailers.
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                break
+            body += await reader.readexactly(size)
+            await reader.readexactly(2)
+        body = bytes(body)
+    else:
+        body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers, body
+
+
+class AsyncSnap():
+    """
+    Same queries as snapd.Snap, but as coroutines. Requests share one
+    connection and are pipelined: each is written as soon as it's made and
+    responses are matched to requests in order.
+    """
+    def __init__(self, socket_path=SNAPD_SOCKET):
+        self.socket_path = socket_path
+        self.reader = None
+        self.writer = None
+        self.reader_task = None
+        self.pending = deque()
+        # Created inside the running loop.
+        self.write_lock = None
+        self.has_pending = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_unix_connection(self.socket_path)
+        self.reader_task = asyncio.ensure_future(self._read_responses())
+
+    async def close(self):
+        if self.reader_task:
+            self.reader_task.cancel()
+            self.reader_task = None
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+        self._fail_pending(ConnectionError("connection closed"))
+
+    def _fail_pending(self, error):
+        while self.pending:
+            future = self.pending.popleft()
+            if not future.done():
+                future.set_exception(error)
+
+    async def _read_responses(self):
+        try:
+            while True:
+                if not self.pending:
+                    self.has_pending.clear()
+                    await self.has_pending.wait()
+                    continue
+                response = await read_response(self.reader)
+                future = self.pending.popleft()
+                if not future.done():
+                    future.set_result(response)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.debug(f"snapd connection lost: {e}")
+            if self.writer:
+                self.writer.close()
+            self.writer = None
+            self.reader_task = None
+            self._fail_pending(e)
+
+    async def request(self, method, path, body=None):
+        if self.write_lock is None:
+            self.write_lock = asyncio.Lock()
+            self.has_pending = asyncio.Event()
+        async with self.write_lock:
+            if self.writer is None:
+                await self.connect()
+            future = asyncio.get_running_loop().create_future()
+            self.pending.append(future)
+            self.writer.write(encode_request(method, path, body))
+            self.has_pending.set()
+            await self.writer.drain()
+        status, headers, data = await future
+        return json.loads(data) if data else {}
+
+    async def get(self, path):
+        return await self.request('GET', path)
+
+    async def list(self):
+        return (await self.get('/v2/snaps')).get('result')
+
+    async def info(self, snap):
+        """Return the installed snap's details, or None if it isn't installed."""
+        response = await self.get(f"/v2/snaps/{quote(snap)}")
+        if response.get('type') == 'error':
+            return None
+        return response.get('result')
+
+    async def info_many(self, snaps):
+        return await asyncio.gather(*[self.info(s) for s in snaps])
+
+    async def installed_many(self, snaps):
+        """Return {name: True|False} for several snaps, asked all at once."""
+        snaps = list(dict.fromkeys(snaps))
+        return {s: info is not None for s, info in zip(snaps, await self.info_many(snaps))}
+
+    async def system_info(self):
+        return (await self.get('/v2/system-info')).get('result')
+
+    async def get_refresh_list(self):
+        result = (await self.get('/v2/find?select=refresh')).get('result')
+        return result if isinstance(result, list) else None
+
+    async def changes(self, select='in-progress'):
+        return (await self.get(f"/v2/changes?select={select}")).get('result')
+
+    async def change(self, change_id):
+        return (await self.get(f"/v2/changes/{change_id}")).get('result')
+
+
+class BackgroundLoop():
+    """An event loop running in a daemon thread, usable from GTK or worker threads."""
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='snapd-async', daemon=True)
+        self.thread.start()
+
+    def submit(self, coro):
+        """Schedule coro on the loop; returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Run coro on the loop and wait for its result (not from the loop's own thread)."""
+        return self.submit(coro).result(timeout)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+def get_background_loop():
+    global _background_loop
+    with _lock:
+        if _background_loop is None:
+            _background_loop = BackgroundLoop()
+        return _background_loop
+
+def get_client():
+    """Return the shared AsyncSnap; use it only on the background loop."""
+    global _client
+    with _lock:
+        if _client is None:
+            _client = AsyncSnap()
+        return _client
+
+def run(coro, timeout=None):
+    return get_background_loop().run(coro, timeout)
+
+def snaps_are_installed(snap_names):
+    """Check several snaps with snapd concurrently; return {name: True|False}."""
+    return run(get_client().installed_many(snap_names), RUN_TIMEOUT)
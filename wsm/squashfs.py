@@ -0,0 +1,280 @@
+""" Read single files out of squashfs images (e.g. snaps) without unsquashfs. """
+
+# Format reference:
+# https://dr-emann.github.io/squashfs/squashfs.html
+
+import lzma
+import mmap
+import struct
+import zlib
+
+from pathlib import Path
+
+
+SQUASHFS_MAGIC = 0x73717368
+SUPERBLOCK = struct.Struct('<IIIIIHHHHHHQQQQQQQQ')
+INODE_HEADER = struct.Struct('<HHHHII')
+DIR_HEADER = struct.Struct('<III')
+DIR_ENTRY = struct.Struct('<HhHH')
+FRAGMENT_ENTRY = struct.Struct('<QII')
+
+METADATA_SIZE = 8192
+METADATA_UNCOMPRESSED = 0x8000
+DATA_UNCOMPRESSED = 0x1000000
+NO_FRAGMENT = 0xFFFFFFFF
+FRAGMENTS_PER_BLOCK = METADATA_SIZE // FRAGMENT_ENTRY.size
+
+BASIC_DIR = 1
+BASIC_FILE = 2
+EXT_DIR = 8
+EXT_FILE = 9
+
+
+class SquashFSError(Exception):
+    pass
+
+
+def _decompress_gzip(data, size):
+    return zlib.decompress(data)
+
+def _decompress_lzma(data, size):
+    return lzma.decompress(data, format=lzma.FORMAT_ALONE)
+
+def _decompress_xz(data, size):
+    return lzma.decompress(data, format=lzma.FORMAT_XZ)
+
+def _decompress_lzo(data, size):
+    # Optional dependency: python3-lzo.
+    import lzo
+    return lzo.decompress(data, False, size)
+
+def _decompress_lz4(data, size):
+    # Optional dependency: python3-lz4.
+    import lz4.block
+    return lz4.block.decompress(data, uncompressed_size=size)
+
+def _decompress_zstd(data, size):
+    # Optional dependency: python3-zstandard.
+    import zstandard
+    return zstandard.ZstdDecompressor().decompress(data, max_output_size=size)
+
+DECOMPRESSORS = {
+    1: _decompress_gzip,
+    2: _decompress_lzma,
+    3: _decompress_lzo,
+    4: _decompress_xz,
+    5: _decompress_lz4,
+    6: _decompress_zstd,
+}
+
+
+class SquashFS():
+    """
+    Read-only view of a squashfs image through mmap. Only the metadata blocks
+    along the requested path and the requested file's data are decompressed.
+    """
+    def __init__(self, image):
+        self.image = Path(image)
+        self._file = open(self.image, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty file.
+            self._file.close()
+            raise SquashFSError(f"{self.image} is empty")
+        self._metadata_cache = {}
+        try:
+            self._read_superblock()
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _read_superblock(self):
+        if len(self._map) < SUPERBLOCK.size:
+            raise SquashFSError(f"{self.image} is too small to be a squashfs image")
+        (
+            magic, self.inode_count, _mtime, self.block_size, _frag_count,
+            self.compression_id, _block_log, _flags, _id_count,
+            version_major, version_minor, self.root_inode_ref, self.bytes_used,
+            _id_table, _xattr_table, self.inode_table_start,
+            self.directory_table_start, self.fragment_table_start, _export_table,
+        ) = SUPERBLOCK.unpack_from(self._map, 0)
+        if magic != SQUASHFS_MAGIC:
+            raise SquashFSError(f"{self.image} is not a squashfs image")
+        if version_major != 4:
+            raise SquashFSError(f"unsupported squashfs version {version_major}.{version_minor}")
+        self._decompress = DECOMPRESSORS.get(self.compression_id)
+        if not self._decompress:
+            raise SquashFSError(f"unknown compression id {self.compression_id}")
+
+    def _decompress_block(self, data, size):
+        try:
+            return self._decompress(data, size)
+        except ImportError as e:
+            raise SquashFSError(f"no decompressor for compression id {self.compression_id}: {e}")
+        except (lzma.LZMAError, zlib.error) as e:
+            raise SquashFSError(f"corrupt block in {self.image}: {e}")
+
+    def _metadata_block(self, position):
+        """Return (decompressed bytes, position of next block)."""
+        cached = self._metadata_cache.get(position)
+        if cached:
+            return cached
+        if position + 2 > len(self._map):
+            raise SquashFSError(f"metadata block beyond end of {self.image}")
+        header, = struct.unpack_from('<H', self._map, position)
+        size = header & ~METADATA_UNCOMPRESSED
+        data = self._map[position + 2:position + 2 + size]
+        if not header & METADATA_UNCOMPRESSED:
+            data = self._decompress_block(data, METADATA_SIZE)
+        cached = (data, position + 2 + size)
+        self._metadata_cache[position] = cached
+        return cached
+
+    def _read_metadata(self, table_start, block, offset, length):
+        """Read length bytes from a metadata table, spanning blocks as needed."""
+        position = table_start + block
+        output = bytearray()
+        while len(output) < length:
+            data, position = self._metadata_block(position)
+            if offset >= len(data):
+                # Offset points past this block (e.g. an inode body split across blocks).
+                offset -= len(data)
+                continue
+            chunk = data[offset:offset + length - len(output)]
+            if not chunk:
+                raise SquashFSError(f"truncated metadata in {self.image}")
+            output += chunk
+            offset = 0
+        return bytes(output)
+
+    def _read_inode(self, ref):
+        block = ref >> 16
+        offset = ref & 0xFFFF
+        head = self._read_metadata(self.inode_table_start, block, offset, INODE_HEADER.size)
+        inode_type = INODE_HEADER.unpack(head)[0]
+        body_offset = offset + INODE_HEADER.size
+        if inode_type == BASIC_DIR:
+            fields = struct.unpack('<IIHHI', self._read_metadata(
+                self.inode_table_start, block, body_offset, 16
+            ))
+            start, _links, size, dir_offset, _parent = fields
+            return {'type': 'dir', 'start': start, 'offset': dir_offset, 'size': size}
+        elif inode_type == EXT_DIR:
+            fields = struct.unpack('<IIIIHHI', self._read_metadata(
+                self.inode_table_start, block, body_offset, 24
+            ))
+            _links, size, start, _parent, _index_count, dir_offset, _xattr = fields
+            return {'type': 'dir', 'start': start, 'offset': dir_offset, 'size': size}
+        elif inode_type == BASIC_FILE:
+            fixed = 16
+            start, fragment, frag_offset, size = struct.unpack('<IIII', self._read_metadata(
+                self.inode_table_start, block, body_offset, fixed
+            ))
+        elif inode_type == EXT_FILE:
+            fixed = 40
+            start, size, _sparse, _links, fragment, frag_offset, _xattr = struct.unpack(
+                '<QQQIIII', self._read_metadata(self.inode_table_start, block, body_offset, fixed)
+            )
+        else:
+            raise SquashFSError(f"unsupported inode type {inode_type}")
+
+        block_count = size // self.block_size
+        if fragment == NO_FRAGMENT and size % self.block_size:
+            block_count += 1
+        sizes = struct.unpack(f'<{block_count}I', self._read_metadata(
+            self.inode_table_start, block, body_offset + fixed, 4 * block_count
+        ))
+        return {
+            'type': 'file',
+            'start': start,
+            'size': size,
+            'block_sizes': sizes,
+            'fragment': fragment,
+            'fragment_offset': frag_offset,
+        }
+
+    def _list_dir(self, inode):
+        """Yield (name, inode_ref) for each entry of a directory inode."""
+        # Listing size includes 3 bytes for implicit "." and "..".
+        remaining = inode['size'] - 3
+        if remaining <= 0:
+            return
+        data = self._read_metadata(
+            self.directory_table_start, inode['start'], inode['offset'], remaining
+        )
+        pos = 0
+        while pos < len(data):
+            count, start, _inode_number = DIR_HEADER.unpack_from(data, pos)
+            pos += DIR_HEADER.size
+            for i in range(count + 1):
+                offset, _inode_offset, _type, name_size = DIR_ENTRY.unpack_from(data, pos)
+                pos += DIR_ENTRY.size
+                name = data[pos:pos + name_size + 1].decode('utf-8', 'surrogateescape')
+                pos += name_size + 1
+                yield name, (start << 16) | offset
+
+    def _lookup(self, path):
+        inode = self._read_inode(self.root_inode_ref)
+        for part in [p for p in str(path).split('/') if p]:
+            if inode['type'] != 'dir':
+                raise FileNotFoundError(path)
+            for name, ref in self._list_dir(inode):
+                if name == part:
+                    inode = self._read_inode(ref)
+                    break
+            else:
+                raise FileNotFoundError(path)
+        return inode
+
+    def _read_fragment(self, index):
+        block, entry = divmod(index, FRAGMENTS_PER_BLOCK)
+        pointer, = struct.unpack_from('<Q', self._map, self.fragment_table_start + 8 * block)
+        start, size, _unused = FRAGMENT_ENTRY.unpack(self._read_metadata(
+            pointer, 0, entry * FRAGMENT_ENTRY.size, FRAGMENT_ENTRY.size
+        ))
+        return self._read_data_block(start, size)
+
+    def _read_data_block(self, start, size_field):
+        size = size_field & ~DATA_UNCOMPRESSED
+        if size == 0:
+            # Sparse block.
+            return bytes(self.block_size)
+        data = self._map[start:start + size]
+        if len(data) < size:
+            raise SquashFSError(f"data block beyond end of {self.image}")
+        if size_field & DATA_UNCOMPRESSED:
+            return data
+        return self._decompress_block(data, self.block_size)
+
+    def read_file(self, path):
+        """Return the contents of the regular file at path inside the image."""
+        inode = self._lookup(path)
+        if inode['type'] != 'file':
+            raise SquashFSError(f"{path} is not a regular file in {self.image}")
+        output = bytearray()
+        position = inode['start']
+        for size_field in inode['block_sizes']:
+            output += self._read_data_block(position, size_field)
+            position += size_field & ~DATA_UNCOMPRESSED
+        if inode['fragment'] != NO_FRAGMENT:
+            tail = inode['size'] % self.block_size
+            fragment = self._read_fragment(inode['fragment'])
+            offset = inode['fragment_offset']
+            output += fragment[offset:offset + tail]
+        return bytes(output[:inode['size']])
+
+
+def read_file(image, path):
+    with SquashFS(image) as fs:
+        return fs.read_file(path)
@@ -0,0 +1,85 @@
+""" In-memory view of the installed snaps, shared by the GUI and CLI. """
+
+import logging
+import threading
+
+from wsm import snapd
+
+
+_installed_state = None
+_lock = threading.Lock()
+# Snap fields shown in the installed list.
+SHOWN_FIELDS = ('revision', 'summary', 'confinement')
+
+
+class InstalledState():
+    """
+    Loads /v2/snaps once and answers installed-snap queries from memory.
+    Registers with the snapd client so that it reloads after any watched
+    change (install, refresh, etc.) completes.
+    """
+    def __init__(self, client=None):
+        self.client = client if client else snapd.get_client()
+        self.lock = threading.Lock()
+        self._snaps = None
+        self.client.change_listeners.append(self.on_change_ready)
+
+    def _index(self):
+        with self.lock:
+            if self._snaps is None:
+                snaps = self.client.list() or []
+                self._snaps = {s['name']: s for s in snaps}
+                logging.debug(f"Loaded state of {len(self._snaps)} installed snaps.")
+            return self._snaps
+
+    def invalidate(self):
+        with self.lock:
+            self._snaps = None
+
+    def on_change_ready(self, progress):
+        logging.debug(f"Change {progress.id} ready; reloading installed snaps.")
+        self.invalidate()
+
+    def list(self):
+        """Return installed snaps as given by snapd, sorted by name."""
+        index = self._index()
+        return [index[n] for n in sorted(index.keys())]
+
+    def get(self, snap_name):
+        return self._index().get(snap_name)
+
+    def is_installed(self, snap_name):
+        return snap_name in self._index()
+
+    def revision(self, snap_name):
+        snap = self.get(snap_name)
+        return snap.get('revision') if snap else None
+
+    def confinement(self, snap_name):
+        snap = self.get(snap_name)
+        return snap.get('confinement') if snap else None
+
+    def status(self, snap_name):
+        snap = self.get(snap_name)
+        return snap.get('status') if snap else None
+
+
+def diff_snaps(old, new, fields=SHOWN_FIELDS):
+    """
+    Compare two {name: snap} dicts. Return sorted lists of names that were
+    added, changed in any of fields, and removed.
+    """
+    added = sorted(n for n in new if n not in old)
+    removed = sorted(n for n in old if n not in new)
+    changed = sorted(
+        n for n in new if n in old
+        and any(old[n].get(f) != new[n].get(f) for f in fields)
+    )
+    return added, changed, removed
+
+def get_installed_state():
+    global _installed_state
+    with _lock:
+        if _installed_state is None:
+            _installed_state = InstalledState()
+        return _installed_state
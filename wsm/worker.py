@@ -1,266 +1,181 @@
 """ Functions that run in background threads. """
-# All of these functions run inside of threads and use GLib to communicate back.
+# All of these functions run inside of threads and use the UI dispatcher to communicate back.
 
-import gi
 import logging
-import subprocess
 
 from pathlib import Path
-from gi.repository import Gdk, GLib, Gtk
-gi.require_version("Gtk", "3.0")
 
-from wsm import snapd
-from wsm import util
+from wsm import dispatch
+from wsm import guiparts
 from wsm import wsmapp
+from wsm.core import install
+from wsm.core import pipeline
+from wsm.core import refresh
+from wsm.core import util
+from wsm.core import verify
 
 
 def handle_button_online_source_toggled(button):
+    ui = dispatch.get_dispatcher()
     is_activated = button.get_active()
 
     label = wsmapp.app.label_button_source_online
-    grid = wsmapp.app.grid_source
-    spinner = Gtk.Spinner(halign=Gtk.Align.START)
-    spinner.override_color(Gtk.StateFlags.NORMAL, Gdk.RGBA(0.19, 0.20, 0.23, 1.0))
+    spinner = wsmapp.app.spinner_source_online
 
     text = ''
     # Clear the label text if not empty.
-    GLib.idle_add(label.set_text, text)
+    ui.set_text(label, text)
     if is_activated:
         #text = 'Checking the Snap Store...'
         #GLib.idle_add(wsmapp.app.label_button_source_online.set_text, text)
-        GLib.idle_add(label.hide)
-        GLib.idle_add(grid.attach, spinner, 2, 0, 1, 1)
-        GLib.idle_add(spinner.show)
-        GLib.idle_add(spinner.start)
-        if util.snap_store_accessible():
+        ui.hide(label)
+        ui.show(spinner)
+        ui.start(spinner)
+        # Usually already fetched at startup; otherwise snapd asks the store now.
+        candidates = refresh.get_refresh_cache().get()
+        if candidates.connected:
             text = ''
-            wsmapp.app.updatable_online_dict = util.get_snap_refresh_dict()
+            wsmapp.app.updatable_online_dict = candidates.updates
             # wsmapp.app.select_online_update_rows()
-            GLib.idle_add(wsmapp.app.select_online_update_rows)
+            ui.call(wsmapp.app.select_online_update_rows)
         else:
             text = 'No connection to the Snap Store.'
             # wsmapp.app.button_source_online.set_active(False)
-            GLib.idle_add(wsmapp.app.button_source_online.set_active, False)
-        GLib.idle_add(spinner.stop)
-        GLib.idle_add(spinner.hide)
-        GLib.idle_add(label.show)
+            ui.call(wsmapp.app.button_source_online.set_active, False)
+        ui.stop(spinner)
+        ui.hide(spinner)
+        ui.show(label)
     else:
         text = ''
         # wsmapp.app.deselect_online_update_rows()
-        GLib.idle_add(wsmapp.app.deselect_online_update_rows)
+        ui.call(wsmapp.app.deselect_online_update_rows)
 
-    GLib.idle_add(label.set_text, text)
+    ui.set_text(label, text)
     return
 
 def handle_button_update_snaps_clicked():
-    obj_rows_selected = wsmapp.app.listbox_installed.get_selected_rows()
+    ui = dispatch.get_dispatcher()
     updatables = wsmapp.app.updatable_offline_list
-    for row in obj_rows_selected:
-        listbox = row.get_parent()
-        # child = box; children = icon, box_info, label_update_note
-        box_row = row.get_child()
-        box_children = box_row.get_children()
-        label_update_note = box_children[2]
-        # children = snap_name, description
-        snap_name = box_children[1].get_children()[0].get_text()
-        label_update_text = label_update_note.get_text()
-
-        spinner = Gtk.Spinner(halign=Gtk.Align.START, valign=Gtk.Align.CENTER)
-        spinner.override_color(Gtk.StateFlags.NORMAL, Gdk.RGBA(0.19, 0.20, 0.23, 1.0))
-        GLib.idle_add(box_row.pack_end, spinner, False, False, 5)
-        GLib.idle_add(label_update_note.hide)
-        GLib.idle_add(spinner.show)
-        GLib.idle_add(spinner.start)
-
-        update_snap_offline(snap_name, updatables)
-
-        # Update from online source.
-        #if snap_name in wsmapp.app.updatable_online_list:
-        if snap_name in wsmapp.app.updatable_online_dict.keys():
-            status = update_snap_online(snap_name)
-
-        # Post-install.
-        GLib.idle_add(spinner.stop)
-        GLib.idle_add(spinner.hide)
-        if status == 0:
-            GLib.idle_add(listbox.unselect_row, row)
-        #row.hide()
+    items = guiparts.get_store_items(wsmapp.app.installed_store)
+    selected = [item for item in items.values() if item.selected]
+    for item in selected:
+        # The update note shows progress while the row's spinner runs.
+        ui.set_property(item, 'note', '')
+        ui.set_property(item, 'busy', True)
+    names = [item.name for item in selected]
+
+    # Update from offline source, reading the next snaps while snapd installs each one.
+    offline_updates = {i['name']: i['file_path'] for i in updatables}
+    offline_selected = [s for s in selected if s.name in offline_updates]
+    # Jobs are matched to rows by file, as a job's name comes from the snap itself.
+    offline_items = {str(Path(offline_updates[s.name])): s for s in offline_selected}
+    def on_offline_done(job):
+        # Stop showing progress on finished rows.
+        item = offline_items.pop(str(job.snap_file), None)
+        if item:
+            offline_selected.remove(item)
+            finish_update_item(item, job.status)
+    callback = show_change_progress(offline_selected)
+    offline_status = pipeline.update_snaps_offline(list(offline_items.keys()), callback, on_offline_done)
+    # Rows whose jobs never finished, e.g. without root privileges, get the overall status.
+    for item in list(offline_items.values()):
+        finish_update_item(item, offline_status or 1)
+
+    # Update from online source: all selected snaps in one snapd change.
+    online_selected = [s for s in selected if s.name in wsmapp.app.updatable_online_dict.keys()]
+    callback = show_change_progress(online_selected)
+    online_status = install.update_snaps_online_each([s.name for s in online_selected], callback)
+
+    for item in selected:
+        if item.name in online_status:
+            finish_update_item(item, online_status[item.name])
+        elif item.name not in offline_updates:
+            finish_update_item(item, 0)
+
+def finish_update_item(item, status):
+    ui = dispatch.get_dispatcher()
+    ui.set_property(item, 'busy', False)
+    ui.set_property(item, 'note', guiparts.DAMAGED_NOTE if status == verify.DAMAGED_STATUS else '')
+    if status == 0:
+        ui.set_property(item, 'selected', False)
+
+def show_change_progress(items):
+    """Return a change progress callback that writes percent done into items' notes."""
+    ui = dispatch.get_dispatcher()
+    def callback(progress):
+        text = f"{round(progress.fraction * 100)}%"
+        if progress.rate and progress.total > 1024:
+            text += f" ({util.convert_filesize(progress.rate)}/s)"
+        for item in items:
+            ui.set_property(item, 'note', text)
+    return callback
 
 def handle_install_button_clicked(button, snap):
     logging.debug(f"Start of function: worker.handle_install_button_clicked")
+    ui = dispatch.get_dispatcher()
 
-    # Get widget pointers.
-    width = button.get_allocated_width()
-    box_row = button.get_parent()
-    row = box_row.get_parent()
-    listbox = wsmapp.app.listbox_installed
-
-    # Adjust widgets.
+    # The row shows its own spinner while its item is busy.
     logging.debug("Updating window widgets.")
-    spinner = Gtk.Spinner(halign=Gtk.Align.CENTER, valign=Gtk.Align.CENTER)
-    GLib.idle_add(spinner.override_color, Gtk.StateFlags.NORMAL, Gdk.RGBA(0.19, 0.20, 0.23, 1.0))
-    GLib.idle_add(spinner.set_property, "width-request", width)
-    GLib.idle_add(box_row.pack_end, spinner, False, True, 5)
-    GLib.idle_add(button.hide)
-    GLib.idle_add(spinner.show)
-    GLib.idle_add(spinner.start)
-
-    # Instantiate local snap class.
-    snapctl = snapd.Snap()
+    position, item = guiparts.find_store_item(wsmapp.app.available_store, snap)
+    if item:
+        ui.set_property(item, 'busy', True)
 
     # Start installation loop.
-    ret = install_offline_snap_and_prereqs(wsmapp.app, snap)
+    ret = install.install_offline_snap_and_prereqs(wsmapp.app.snaps_dir, snap)
 
     # Post-install.
-    GLib.idle_add(spinner.stop)
-    GLib.idle_add(spinner.hide)
+    if item:
+        ui.set_property(item, 'busy', False)
+        # The file's digest is cached by now, so this doesn't hash it again.
+        if ret == verify.DAMAGED_STATUS and verify.verify_snap(item.file_path):
+            ui.set_property(item, 'note', guiparts.DAMAGED_NOTE)
     if ret == 0: # successful installation
-        # Re-populate installed snaps window.
+        # Update installed snaps window with just the changed snaps.
         logging.debug(f"Removing installed snap from available list.")
-        GLib.idle_add(row.hide)
-        wsmapp.app.populate_listbox_installed(listbox, snapctl.list())
-    else: # failed installation
-        GLib.idle_add(button.show)
+        ui.call(wsmapp.app.remove_available_item, snap)
+        wsmapp.app.populate_listbox_installed(wsmapp.app.installed_snaps_list)
     logging.debug(f"End of function: worker.handle_install_button_clicked")
 
-def update_snap_offline(snap_name, updatables):
-    offline_names = [i['name'] for i in updatables]
-    if snap_name in offline_names:
-        file_paths = [i['file_path'] for i in updatables if i['name'] == snap_name]
-        file_path = Path(file_paths[0])
-        status = install_snap_offline(file_path)
-    else:
-        status = 0
-    return status
-
-def update_snap_online(snap):
-    logging.info(f'Updating (refreshing) {snap} online.')
-    try:
-        subprocess.run(
-            ['pkexec', 'snap', 'refresh', snap],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT
-        )
-        return 0
-    except Exception as e:
-        logging.error(e)
-        logging.error(subprocess.stdout, subprocess.stderr)
-        return 13
-
-def acknowledge_snap_assert(root_type, assert_file):
-    name = assert_file.stem.split('_')[0]
-    if not assert_file.is_file():
-        logging.error(f'{assert_file} is missing.')
-        logging.error(f'Try installing {name} from the Snap Store instead.')
-        # TODO: Display message saying how to install it from the Snap Store.
-        return 10
-    try:
-        logging.info(f'Acknowledging \"{assert_file}\"')
-        subprocess.run(
-            [root_type, 'snap', 'ack', assert_file],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT
-        )
-    except Exception as e:
-        logging.error(e)
-        logging.error(subprocess.stdout, subprocess.stderr)
-        return 11
-    return 0
-
-def get_assert_file(snap_file):
-    return snap_file.parent / f"{snap_file.stem}.assert"
-
-def install_snap_offline(snap_file):
-    # Read /meta/snap.yaml in snap file to get 'core' and 'prerequisites'.
-    offline_snap_details = util.get_offline_snap_details(snap_file)
-    if not offline_snap_details:
-        return 1
-    logging.debug(f"snap details: {offline_snap_details}")
-
-    root_type = util.get_root_type()
-    if not root_type:
-        return 1
-    logging.debug(f"root type: {root_type}")
-
-    classic_flag = False
-    confinement = offline_snap_details.get('confinement')
-    if confinement == 'classic':
-        classic_flag = True
-    logging.debug(f"confinement for {snap_file}: {confinement}")
-
-    a_status = acknowledge_snap_assert(root_type, get_assert_file(snap_file))
-    if a_status != 0:
-        return a_status
-
-    cmd = [root_type, 'snap', 'install', str(snap_file)]
-    msg = f"Installing/Updating \"{snap_file}\""
-    if classic_flag:
-        cmd.insert(-1, '--classic')
-        msg += ' with --classic flag'
-
-    logging.info(msg)
-    logging.debug(f"command: {' '.join(cmd)}")
-    try:
-        subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT
-        )
-        return 0
-    except Exception as e:
-        # What are the possible errors here?
-        logging.error(e)
-        logging.error(subprocess.stdout, subprocess.stderr)
-        return 12
-
-def install_offline_snap_and_prereqs(app, snap_name):
-    # Ensure that snap is not already installed.
-    if util.snap_is_installed(snap_name):
-        return 0
-
-    # Get snap_file for given snap_name.
-    snap_file = util.get_snap_file_path(snap_name, app.snaps_dir)
-    if not snap_file:
-        return 10
-    logging.info(f"Starting install process for: {snap_file}")
-
-    # Ensure that snapd is installed.
-    if not util.snap_is_installed('snapd'):
-        logging.info(f"Installing snapd snap...")
-        snapd_file = util.get_snap_file_path('snapd', app.snaps_dir)
-        if not snapd_file:
-            return 10
-        ret = install_snap_offline(snapd_file)
-        if ret != 0:
-            return ret
-
-    # Get snap_file details.
-    details = util.get_offline_snap_details(snap_file)
-    logging.debug(f"Details for \"{snap_file}\": {details}")
-
-    # Ensure base snap is installed.
-    base = details.get('base')
-    if not base:
-        logging.info(f"No base snap listed for \"{snap_name}\".")
-    elif not util.snap_is_installed(base):
-        logging.info(f"Installing base snap \"{base}\" for \"{snap_name}\"...")
-        base_file = util.get_snap_file_path(base, app.snaps_dir)
-        if not base_file:
-            return 10
-        ret = install_snap_offline(base_file)
-        if ret != 0:
-            return ret
-
-    # List uninstalled prerequisites for snap.
-    deps = [p for p in details.get('prerequisites', []) if not util.snap_is_installed(p)]
-    logging.info(f"Prerequisites for \"{snap_name}\": {deps}")
-    # Install any prerequisites.
-    installables = wsmapp.app.installable_snaps_list
-    for dep in deps:
-        ret = install_offline_snap_and_prereqs(app, dep)
-        if ret != 0:
-            return ret
-
-    ret = install_snap_offline(snap_file)
-    logging.debug(f"Installation of \"{snap_file}\" terminated with status \"{ret}\".")
-    return ret
+def scan_offline_folder(folder, cancel, previous=None, init=False):
+    """
+    Fill the Available list from folder, adding rows as snaps are found.
+    Stops as soon as cancel is set, e.g. because another folder was chosen.
+    """
+    logging.debug(f"Start of function: worker.scan_offline_folder")
+    # Let a cancelled scan finish its last read before replacing its rows.
+    if previous:
+        previous.join()
+    if cancel.is_set():
+        return
+    ui = dispatch.get_dispatcher()
+    folder = Path(folder)
+
+    # Move wasta-offline snaps into arch-specific subfolders for multi-arch support.
+    if folder.name == 'wasta-offline':
+        util.wasta_offline_snap_cleanup(folder)
+    if cancel.is_set():
+        return
+
+    # Return if using unsupported architecture.
+    arch = util.check_arch()
+    if arch != 'amd64':
+        text = '{} architecture not yet supported for offline updates.'.format(arch)
+        ui.call(wsmapp.app.set_available_placeholder, text)
+        # Remove any existing rows (previous folder, etc.).
+        wsmapp.app.populate_listbox_available([])
+        # Online updates still work.
+        ui.call(wsmapp.app.set_session_ready)
+        return
+
+    # Set app-wide variables.
+    updatable_offline = util.get_offline_updatable_snaps(folder)
+    wsmapp.app.installable_snaps_list = util.get_offline_installable_snaps(folder)
+    if cancel.is_set():
+        return
+    ui.call(wsmapp.app.apply_offline_updates, updatable_offline, init)
+
+    # Populate available snaps rows, replacing those of any previous folder.
+    wsmapp.app.populate_listbox_available(wsmapp.app.installable_snaps_list, cancel)
+    if not cancel.is_set():
+        ui.call(wsmapp.app.set_session_ready)
+    logging.debug(f"End of function: worker.scan_offline_folder")
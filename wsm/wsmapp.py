@@ -2,6 +2,7 @@
 
 import gi
 import logging
+import threading
 
 from pathlib import Path
 
@@ -10,13 +11,19 @@ from gi.repository import Gio
 from gi.repository import GLib
 from gi.repository import Gtk
 
-from wsm import cmdline
+from wsm import dispatch
 from wsm import guiparts
 from wsm import handler
-from wsm import util
+from wsm import icons
 from wsm import snapd
+from wsm import state
 from wsm import worker
 from wsm import wsmwindow
+from wsm.core import cmdline
+from wsm.core import refresh
+from wsm.core import session
+from wsm.core import util
+from wsm.core import verify
 
 
 class WSMApp(Gtk.Application):
@@ -30,6 +37,10 @@ class WSMApp(Gtk.Application):
             'debug', ord('d'), GLib.OptionFlags.NONE, GLib.OptionArg.NONE,
             "Set log level to DEBUG", None
         )
+        self.add_main_option(
+            'export-to', ord('e'), GLib.OptionFlags.NONE, GLib.OptionArg.STRING,
+            'Export installed snaps to offline folder.', '/path/to/wasta-offline'
+        )
         self.add_main_option(
             'online', ord('i'), GLib.OptionFlags.NONE, GLib.OptionArg.NONE,
             'Update snaps from the online Snap Store.', None
@@ -44,14 +55,63 @@ class WSMApp(Gtk.Application):
         )
 
         # Define app-wide variables.
-        self.snapctl = snapd.Snap()
-        self.installed_snaps_list = self.snapctl.list()
+        #   snapd, icon theme, and icon cache setup is deferred until first use.
+        self._icon_resolver = None
+        self._pixbuf_cache = None
         self.installable_snaps_list = []
+        # Models behind the installed and available list panes.
+        self.installed_store = Gio.ListStore.new(guiparts.SnapItem)
+        # {name: snapd info} of the snaps currently in installed_store.
+        self.installed_shown = {}
+        self.available_store = Gio.ListStore.new(guiparts.SnapItem)
+        # {name: {'file_path': ...}} of the snaps currently in available_store.
+        self.available_shown = {}
         self.updatable_offline_list = []
+        # Set once the shown session has been checked against snapd and the
+        #   offline folder, so that only checked sessions are saved.
+        self.session_ready = False
+        # Background scan of the offline folder.
+        self.t_scan = None
+        self.scan_cancel = None
         self.updatable_online_dict = {}
-        self.icon_theme = Gtk.IconTheme.get_default()
-        themed_icon = self.icon_theme.lookup_icon('applications-system', 48, 0)
-        self.fallback_icon_path = themed_icon.get_filename()
+        # Whether the Snap Store was reachable when last checked, in any session.
+        self.store_connected = False
+
+    @property
+    def snapctl(self):
+        return snapd.get_client()
+
+    @property
+    def installed_state(self):
+        return state.get_installed_state()
+
+    @property
+    def installed_snaps_list(self):
+        # Always current: reloaded after each install or refresh.
+        return self.installed_state.list()
+
+    @property
+    def icon_resolver(self):
+        if self._icon_resolver is None:
+            icon_theme = Gtk.IconTheme.get_default()
+            themed_icon = icon_theme.lookup_icon('applications-system', 48, 0)
+            self.fallback_icon_path = themed_icon.get_filename()
+            self._icon_resolver = icons.IconResolver(
+                self.fallback_icon_path,
+                cache_dir=util.get_data_dir() / 'icons',
+                snap_client=self.snapctl,
+            )
+            # Newly installed snaps export new desktop files.
+            self.snapctl.change_listeners.append(
+                lambda progress: self._icon_resolver.invalidate()
+            )
+        return self._icon_resolver
+
+    @property
+    def pixbuf_cache(self):
+        if self._pixbuf_cache is None:
+            self._pixbuf_cache = icons.PixbufCache(util.get_data_dir() / 'thumbnails')
+        return self._pixbuf_cache
 
     def do_startup(self):
         # Get UI location based on runmode.
@@ -71,84 +131,21 @@ class WSMApp(Gtk.Application):
         self.button_remove_snaps = self.builder.get_object('button_remove_snaps')
         self.label_button_source_online = self.builder.get_object('label_button_source_online')
         self.button_source_offline = self.builder.get_object('button_source_offline')
+        self.button_update_snaps = self.builder.get_object('button_update_snaps')
         self.window_installed_snaps = self.builder.get_object("scrolled_window_installed")
         self.window_available_snaps = self.builder.get_object("scrolled_window_available")
         self.label_can_update = self.builder.get_object('label_can_update')
+        # Shown in place of the online source label while checking the Snap Store.
+        self.spinner_source_online = guiparts.new_spinner(halign=Gtk.Align.START)
+        self.grid_source.attach(self.spinner_source_online, 2, 0, 1, 1)
 
     def do_command_line(self, command_line):
         self.cmd_args = command_line.get_arguments()
         self.cmd_opts = command_line.get_options_dict().end().unpack()
-        self.log_level = logging.INFO
-
-        if 'version' in self.cmd_opts:
-            util.print_version()
-            return 0
-
-        # Verify execution with elevated privileges.
-        util.verify_elevated_privileges()
-
-        # Set loglevel.
-        self.log_level = logging.INFO
-        if 'debug' in self.cmd_opts:
-            self.log_level = logging.DEBUG
-
-        # Set up logging.
-        util.set_up_logging(self.log_level)
-        util.log_snapd_version(util.get_snapd_version())
-        util.log_installed_snaps(self.installed_snaps_list)
-
-        if not self.cmd_opts and not self.cmd_args:
-            # No command line args passed: run GUI.
+        status = cmdline.run(self.cmd_opts, self.cmd_args)
+        if status is None:
             self.activate()
-            return 0
-
-        # Give terminal guidance for tracking updates. Use print for clarity.
-        print('\nHint: To view update progress, open a new terminal and type:')
-        print('snap changes\n')
-        print('The last item on the list will be the in-progress update.')
-        print('Watch the progress of this particular change with:')
-        print('snap change [number]\n')
-
-        # Run offline and then online updates, if indicated.
-        #   TODO: Needs testing.
-        status = 0
-        early_return = False
-        if 'snaps-dir' in self.cmd_opts:
-            # Set snaps_dir.
-            self.snaps_dir = self.cmd_opts.get('snaps-dir')
-            # Check for passed snap names to install.
-            if len(self.cmd_args) > 1:
-                install_list = self.cmd_args[1:]
-                status = 0
-                for s in install_list:
-                    # Install snap, its base, and prerequisites.
-                    logging.info(f"Installing {s}...")
-                    s_status = worker.install_offline_snap_and_prereqs(self, s)
-                    if s_status != 0:
-                        logging.error(f"Error: {s} failed to install")
-                    status += s_status
-                return status
-            else:
-                # Run offline updates, then continue.
-                # Move snaps into arch-specific subfolders for multi-arch support.
-                util.wasta_offline_snap_cleanup(self.snaps_dir)
-                # Update snaps from wasta-offline folder.
-                status += cmdline.update_offline(self.snaps_dir)
-                if status != 0:
-                    return status
-            early_return = True
-
-        if 'online' in self.cmd_opts:
-            # Run online updates, then exit.
-            status = cmdline.update_online()
-            return status
-
-        # Return now if offline updates were done.
-        if early_return:
-            return status
-
-        # Run GUI if other options were passed.
-        self.activate()
+            status = 0
         return status
 
     def do_activate(self):
@@ -169,7 +166,15 @@ class WSMApp(Gtk.Application):
         self.button_remove_snaps.hide()
 
         # Make GUI initial adjustments.
-        self.user, self.snaps_dir = util.guess_offline_source_folder()
+        #   Show the last session right away; the offline folder is found and
+        #   everything is checked against it and snapd in the background.
+        self.user = util.get_user()
+        snapshot = session.load_snapshot()
+        if snapshot:
+            self.snaps_dir = snapshot['snaps_dir']
+            self.store_connected = snapshot.get('store_connected', False)
+        else:
+            self.snaps_dir = str(Path('/home', self.user)) if self.user else str(Path.home())
         self.button_source_offline.set_current_folder(self.snaps_dir)
 
         # Get ListBox "panes" from other module, add to sub-windows, & show.
@@ -184,12 +189,120 @@ class WSMApp(Gtk.Application):
         self.window_available_snaps.add(self.avail_lb_pane.vp)
         self.window_available_snaps.show_all()
 
+        if snapshot:
+            self.render_snapshot(snapshot)
+        # The last session's offline files may be gone; update only once they're checked.
+        self.button_update_snaps.set_sensitive(False)
+
         # Connect GUI signals to Handler class.
         self.builder.connect_signals(handler.Handler())
+        self.prefetch_refresh = self.button_source_online.get_active() or self.store_connected
+        self.t_reconcile = threading.Thread(target=self.reconcile_session, daemon=True)
+        self.t_reconcile.start()
         logging.debug(f"End of function: app.do_activate")
 
+    def do_shutdown(self):
+        if self.session_ready:
+            self.save_session()
+        Gtk.Application.do_shutdown(self)
+
+    def render_snapshot(self, snapshot):
+        logging.debug(f"Showing saved session for {snapshot['snaps_dir']}")
+        installed = {s['name']: s for s in snapshot.get('installed', [])}
+        self.installed_shown = installed
+        self.apply_installed_changes(installed, sorted(installed.keys()), [], [])
+        available = {s['name']: s for s in snapshot.get('available', [])}
+        self.available_shown = {n: {'file_path': s['file_path']} for n, s in available.items()}
+        self.apply_available_changes(available, sorted(available.keys()), [], [])
+        self.apply_offline_updates(snapshot.get('updatable_offline', []), init=True)
+
+    def reconcile_session(self):
+        """Bring the shown session up to date. Runs in a background thread."""
+        logging.debug(f"Start of function: app.reconcile_session")
+        ui = dispatch.get_dispatcher()
+        shown_dir = self.snaps_dir
+        user, snaps_dir = util.guess_offline_source_folder()
+        self.populate_listbox_installed(self.installed_snaps_list)
+        ui.call(self.reconcile_offline_folder, shown_dir, snaps_dir)
+        # Warm the refresh list in the background so that switching to online
+        #   updates is instant, but not at sites where the store wasn't reachable.
+        if self.prefetch_refresh:
+            refresh.get_refresh_cache().prefetch()
+        logging.debug(f"End of function: app.reconcile_session")
+
+    def reconcile_offline_folder(self, shown_dir, snaps_dir):
+        if self.scan_cancel:
+            # The user has already chosen another folder.
+            return
+        if snaps_dir != shown_dir:
+            self.snaps_dir = snaps_dir
+            self.button_source_offline.set_current_folder(snaps_dir)
+        self.start_offline_scan(snaps_dir, init=True)
+
+    def start_offline_scan(self, folder, init=False):
+        """Scan folder in a background thread, cancelling any scan in progress."""
+        if self.scan_cancel:
+            self.scan_cancel.set()
+        self.scan_cancel = threading.Event()
+        self.t_scan = threading.Thread(
+            target=worker.scan_offline_folder,
+            args=(folder, self.scan_cancel, self.t_scan, init),
+            daemon=True,
+        )
+        self.t_scan.start()
+
+    def set_session_ready(self):
+        self.session_ready = True
+        self.button_update_snaps.set_sensitive(True)
+        self.save_session()
+
+    def save_session(self):
+        installed = []
+        for i in range(self.installed_store.get_n_items()):
+            item = self.installed_store.get_item(i)
+            installed.append({
+                'name': item.name,
+                'revision': item.revision,
+                'summary': item.summary,
+                'confinement': item.confinement,
+                'icon': item.icon,
+            })
+        available = []
+        for i in range(self.available_store.get_n_items()):
+            item = self.available_store.get_item(i)
+            available.append({
+                'name': item.name,
+                'summary': item.summary,
+                'file_path': item.file_path,
+                'note': item.note,
+            })
+        connected = refresh.get_refresh_cache().last_connected
+        if connected is not None:
+            self.store_connected = connected
+        snapshot = session.new_snapshot(
+            self.snaps_dir, installed, available, self.updatable_offline_list,
+            self.store_connected,
+        )
+        session.save_snapshot(snapshot)
+
+    def apply_offline_updates(self, updatable_offline, init=False):
+        # Unselect snaps that no longer have an offline update.
+        names = [e['name'] for e in updatable_offline]
+        items = guiparts.get_store_items(self.installed_store)
+        for name, item in items.items():
+            if item.selected and name not in names and name not in self.updatable_online_dict:
+                item.selected = False
+        self.updatable_offline_list = updatable_offline
+        self.select_offline_update_rows(self.snaps_dir, init=init)
+        self.update_selection_mode()
+
+    def update_selection_mode(self):
+        if len(self.updatable_online_dict.keys()) > 0 or len(self.updatable_offline_list) > 0:
+            self.listbox_installed.set_selection_mode(Gtk.SelectionMode.MULTIPLE)
+        else:
+            self.listbox_installed.set_selection_mode(Gtk.SelectionMode.NONE)
+
     def select_offline_update_rows(self, source_folder, init=False):
-        rows = self.rows
         # Determine if it's a wasta-offline folder.
         basename = Path(source_folder).name
         if init and basename != 'wasta-offline':
@@ -199,107 +312,191 @@ class WSMApp(Gtk.Application):
         updatable_offline = self.updatable_offline_list
         if len(updatable_offline) > 0:
             self.listbox_installed.set_selection_mode(Gtk.SelectionMode.MULTIPLE)
+            items = guiparts.get_store_items(self.installed_store)
             for entry in updatable_offline:
-                index = rows[entry['name']]
-                row = self.listbox_installed.get_row_at_index(index)
-                self.listbox_installed.select_row(row)
+                item = items.get(entry['name'])
+                if item:
+                    item.selected = True
         return updatable_offline
 
     def select_online_update_rows(self):
-        installed_snaps = self.installed_snaps_list
-        rows = self.rows
         if len(self.updatable_online_dict.keys()) > 0:
             self.listbox_installed.set_selection_mode(Gtk.SelectionMode.MULTIPLE)
-            for snap in self.updatable_online_dict.keys():
-                index = rows[snap]
-                row = self.listbox_installed.get_row_at_index(index)
-                self.listbox_installed.select_row(row)
-                box_row = row.get_child()
-                label_note = box_row.get_children()[2]
-                bytes = self.updatable_online_dict[snap]
+            items = guiparts.get_store_items(self.installed_store)
+            for snap, bytes in self.updatable_online_dict.items():
+                item = items.get(snap)
+                if not item:
+                    continue
+                item.selected = True
                 size_str = util.convert_filesize(bytes)
-                text = ' '.join(['<', size_str])
-                label_note.set_text(text)
-                label_note.show()
+                item.note = ' '.join(['<', size_str])
 
     def deselect_online_update_rows(self):
-        installed_snaps = self.installed_snaps_list
-        rows = self.rows
+        items = guiparts.get_store_items(self.installed_store)
         for snap in self.updatable_online_dict.keys():
-            index = rows[snap]
-            row = self.listbox_installed.get_row_at_index(index)
-            self.listbox_installed.unselect_row(row)
+            item = items.get(snap)
+            if item:
+                item.selected = False
+                item.note = ''
         if len(self.updatable_offline_list) == 0:
             self.listbox_installed.set_selection_mode(Gtk.SelectionMode.NONE)
 
-    def populate_listbox_installed(self, list_box, snaps_list):
+    def create_installed_row(self, item):
+        return guiparts.InstalledSnapRow(item, self.pixbuf_cache)
+
+    def create_available_row(self, item):
+        row = guiparts.AvailableSnapRow(item)
+        row.button_install_offline.connect(
+            "clicked", handler.Handler().on_install_button_clicked, item.name
+        )
+        return row
+
+    def on_installed_selection_changed(self, list_box):
+        # Keep model items in step with rows the user (de)selects.
+        for i in range(self.installed_store.get_n_items()):
+            row = list_box.get_row_at_index(i)
+            item = self.installed_store.get_item(i)
+            if row and item.selected != row.is_selected():
+                item.selected = row.is_selected()
+
+    def set_available_placeholder(self, text):
+        label = Gtk.Label()
+        label.set_markup(f"<span style=\"italic\">{GLib.markup_escape_text(text)}</span>")
+        label.show()
+        self.listbox_available.set_placeholder(label)
+
+    def populate_listbox_installed(self, snaps_list):
         logging.debug(f"Start of function: populate_listbox_installed")
 
         # Check thread status.
         main_thread = util.get_thread_status()
         logging.debug(f"Function running in main thread?: {main_thread}")
 
+        # Only snaps that are new or changed since the last call need rows.
+        new_shown = {s['name']: s for s in snaps_list}
+        added, changed, removed = state.diff_snaps(self.installed_shown, new_shown)
+        self.installed_shown = new_shown
+        logging.debug(f"installed list changes: added {added}, changed {changed}, removed {removed}")
+
         # Create dictionary of relevant info: icon, name, description, revision.
-        contents_dict = util.snaps_list_to_dict(snaps_list, self)
-        logging.debug(f"installed snaps to show: {contents_dict}")
-
-        # Remove any existing rows.
-        try:
-            children = list_box.get_children()
-            for c in children:
-                if main_thread:
-                    list_box.remove(c)
-                else:
-                    GLib.idle_add(list_box.remove, c)
-        except AttributeError:
-            pass
-
-        # Build each new listbox row.
-        rows = {}
-        count = 0
-        for snap in sorted(contents_dict.keys()):
-            row = guiparts.InstalledSnapRow(contents_dict[snap])
-            if main_thread:
-                list_box.add(row)
-                row.show()
-            else:
-                GLib.idle_add(list_box.add, row)
-                GLib.idle_add(row.show)
-            rows[snap] = count
-            count += 1
+        contents_dict = guiparts.snaps_list_to_dict(
+            [new_shown[n] for n in added + changed], self.icon_resolver
+        )
         if main_thread:
-            list_box.show()
+            self.apply_installed_changes(contents_dict, added, changed, removed)
         else:
-            GLib.idle_add(list_box.show)
+            dispatch.get_dispatcher().call(
+                self.apply_installed_changes, contents_dict, added, changed, removed
+            )
         logging.debug(f"End of function: populate_listbox_installed")
-        return rows
-
-    def populate_listbox_available(self, list_box, snaps_list):
-        rows = {}
-        if len(snaps_list) == 0:
-            if len(self.updatable_online_dict.keys()) == 0 and len(self.updatable_offline_list) == 0:
-                self.listbox_installed.set_selection_mode(Gtk.SelectionMode.NONE)
-            return rows
-        if len(self.updatable_offline_list) > 0:
-            self.listbox_installed.set_selection_mode(Gtk.SelectionMode.MULTIPLE)
-        # Create a dictionary of useful snap details.
-        contents_dict = {}
-        for entry in snaps_list:
-            contents_dict[entry['name']] = entry['file_path']
-        index = 0
-        for snap in sorted(contents_dict.keys()):
-            file = contents_dict[snap]
-            details = util.get_offline_snap_details(file)
-            summary = details['summary']
-            row = guiparts.AvailableSnapRow(snap, summary)
-            list_box.add(row)
-            install_button = row.button_install_offline
-            install_button.connect("clicked", handler.Handler().on_install_button_clicked, snap)
-            rows[snap] = index
-            index += 1
-            row.show_all()
-        list_box.show()
-        return rows
-
-
-app = WSMApp()
+
+    def apply_installed_changes(self, contents_dict, added, changed, removed):
+        store = self.installed_store
+        for name in removed:
+            position, item = guiparts.find_store_item(store, name)
+            if item:
+                store.remove(position)
+        items = guiparts.get_store_items(store)
+        for name in changed:
+            # Existing rows follow their item's properties.
+            item = items.get(name)
+            entry = contents_dict[name]
+            if item:
+                item.set_property('summary', entry['summary'])
+                item.set_property('icon', entry['icon'])
+                item.set_property('revision', str(entry['revision']))
+                item.set_property('confinement', entry['confinement'])
+        for name in added:
+            entry = contents_dict[name]
+            item = guiparts.SnapItem(
+                name=entry['name'],
+                summary=entry['summary'],
+                icon=entry['icon'],
+                revision=str(entry['revision']),
+                confinement=entry['confinement'],
+            )
+            store.insert_sorted(item, guiparts.compare_items)
+        return False
+
+    def populate_listbox_available(self, snaps_list, cancel=None):
+        """
+        Show snaps_list in the Available list. Rows for new or changed snaps
+        are added one at a time as their details are read, until cancel (a
+        threading.Event) is set.
+        """
+        # Check thread status.
+        main_thread = util.get_thread_status()
+        def apply(*args):
+            if main_thread:
+                self.apply_available_changes(*args)
+            else:
+                dispatch.get_dispatcher().call(self.apply_available_changes, *args)
+
+        # Only snaps that are new or whose file changed need their details read.
+        new_shown = {e['name']: {'file_path': str(e['file_path'])} for e in snaps_list}
+        added, changed, removed = state.diff_snaps(
+            self.available_shown, new_shown, fields=('file_path',)
+        )
+        for name in removed:
+            del self.available_shown[name]
+        apply({}, [], [], removed)
+
+        names = added + changed
+        files = [new_shown[n]['file_path'] for n in names]
+        details_iter = util.iter_offline_snap_details(files, cancel)
+        for name, file_path, details in zip(names, files, details_iter):
+            entry = {
+                'name': name,
+                'summary': details.get('summary') or '',
+                'file_path': file_path,
+                'note': '',
+            }
+            # Only the size is checked here; hashing waits until install.
+            error = verify.check_size(file_path)
+            if error:
+                logging.warning(f"Damaged snap file {file_path}: {error}")
+                entry['note'] = guiparts.DAMAGED_NOTE
+            self.available_shown[name] = new_shown[name]
+            if name in changed:
+                apply({name: entry}, [], [name], [])
+            else:
+                apply({name: entry}, [name], [], [])
+
+    def apply_available_changes(self, contents_dict, added, changed, removed):
+        store = self.available_store
+        for name in removed:
+            position, item = guiparts.find_store_item(store, name)
+            if item:
+                store.remove(position)
+        for name in changed + added:
+            entry = contents_dict[name]
+            item = guiparts.SnapItem(
+                name=entry['name'],
+                summary=entry['summary'],
+                file_path=entry['file_path'],
+                note=entry.get('note', ''),
+            )
+            position, old_item = guiparts.find_store_item(store, name)
+            if old_item:
+                store.splice(position, 1, [item])
+            else:
+                store.insert_sorted(item, guiparts.compare_items)
+        self.update_selection_mode()
+        return False
+
+    def remove_available_item(self, name):
+        # Called once a snap from the available list has been installed.
+        self.available_shown.pop(name, None)
+        position, item = guiparts.find_store_item(self.available_store, name)
+        if item:
+            self.available_store.remove(position)
+        return False
+
+# Created by get_app() so that importing this module has no side effects.
+app = None
+
+def get_app():
+    global app
+    if app is None:
+        app = WSMApp()
+    return app